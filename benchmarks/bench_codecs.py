@@ -0,0 +1,47 @@
+"""Encode/decode throughput of the stream wire codecs, side by side.
+
+    python benchmarks/bench_codecs.py --batch 100 --rounds 2000
+"""
+
+import argparse
+import time
+
+from plotune_sdk.src.workers.codecs import CODECS, get_codec
+
+
+def samples(n: int):
+    return [{"key": f"sensor_{i % 8}", "time": 1_700_000_000.0 + i * 0.001, "value": i * 0.25} for i in range(n)]
+
+
+def measure(fn, arg, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(arg)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=100, help="samples per frame")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    batch = samples(args.batch)
+    total = args.batch * args.rounds
+    print(f"{args.batch} samples per frame, {args.rounds} frames")
+    print(f"{'codec':>8} {'bytes/frame':>12} {'encode samples/s':>18} {'decode samples/s':>18}")
+    for name in CODECS[1:]:
+        try:
+            codec = get_codec(name)
+        except ValueError as exc:
+            print(f"{name:>8}  skipped: {exc}")
+            continue
+        frame = codec.encode(batch)
+        decode = codec.decode_records if codec.binary else codec.decode
+        encode_s = measure(codec.encode, batch, args.rounds)
+        decode_s = measure(decode, frame, args.rounds)
+        print(f"{name:>8} {len(frame):>12} {total / encode_s:>18,.0f} {total / decode_s:>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
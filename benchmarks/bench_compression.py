@@ -0,0 +1,99 @@
+"""Compression ratio and speed of the gorilla codec on realistic signals.
+
+Every signal is one frame per key with ``--batch`` samples, encoded with the
+plain ``binary`` codec, ``binary`` followed by zlib (for reference), the fastest
+JSON codec and ``gorilla``. Ratios are relative to ``binary``.
+
+    python benchmarks/bench_compression.py --batch 1000 --rounds 50
+"""
+
+import argparse
+import math
+import random
+import time
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+from plotune_sdk.src.workers.codecs import BinaryCodec, GorillaCodec, fastest_json_codec
+
+START = 1_700_000_000.0
+
+
+def sine_noise(n: int) -> List[Tuple[float, float]]:
+    """1 kHz sine with gaussian noise, regular timestamps."""
+    return [(START + i * 0.001, math.sin(i * 0.01) + random.gauss(0, 0.01)) for i in range(n)]
+
+
+def sensor(n: int) -> List[Tuple[float, float]]:
+    """100 Hz temperature-like random walk quantized to 0.01, wall-clock jitter of up to 50 us."""
+    out, value = [], 21.5
+    for i in range(n):
+        value = round(value + random.choice((-0.01, 0.0, 0.0, 0.01)), 2)
+        out.append((START + i * 0.01 + random.uniform(0, 5e-5), value))
+    return out
+
+
+def steps(n: int) -> List[Tuple[float, float]]:
+    """Setpoint held for a few hundred samples at a time, regular timestamps."""
+    out, value = [], 0.0
+    for i in range(n):
+        if random.random() < 0.005:
+            value = float(random.randint(0, 100))
+        out.append((START + i * 0.001, value))
+    return out
+
+
+def counter(n: int) -> List[Tuple[float, float]]:
+    """Monotonic integer counter sampled once per second."""
+    return [(START + i, float(i * 3)) for i in range(n)]
+
+
+SIGNALS: Dict[str, Callable[[int], List[Tuple[float, float]]]] = {
+    "sine+noise": sine_noise,
+    "sensor": sensor,
+    "steps": steps,
+    "counter": counter,
+}
+
+
+def measure(fn, arg, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(arg)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=1000, help="samples per frame")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    random.seed(1)
+
+    binary, gorilla, text = BinaryCodec(), GorillaCodec(), fastest_json_codec()
+    codecs = {
+        "binary": (binary.encode, binary.decode_records),
+        "binary+zlib": (lambda s: zlib.compress(binary.encode(s)), lambda f: binary.decode_records(zlib.decompress(f))),
+        text.name: (lambda s: text.encode(s).encode("utf-8"), text.decode),
+        "gorilla": (gorilla.encode, gorilla.decode_records),
+    }
+    total = args.batch * args.rounds
+    print(f"{args.batch} samples per frame, {args.rounds} frames")
+    print(
+        f"{'signal':>11} {'codec':>12} {'B/sample':>9} {'ratio':>6} {'encode samples/s':>17} {'decode samples/s':>17}"
+    )
+    for signal, make in SIGNALS.items():
+        batch = [{"key": signal, "time": t, "value": v} for t, v in make(args.batch)]
+        base = len(binary.encode(batch))
+        for name, (encode, decode) in codecs.items():
+            frame = encode(batch)
+            encode_s = measure(encode, batch, args.rounds)
+            decode_s = measure(decode, frame, args.rounds)
+            print(
+                f"{signal:>11} {name:>12} {len(frame) / args.batch:>9.2f} {base / len(frame):>6.1f} "
+                f"{total / encode_s:>17,.0f} {total / decode_s:>17,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
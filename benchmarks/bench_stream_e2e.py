@@ -0,0 +1,198 @@
+"""End-to-end stream benchmark: aproduce -> producer worker -> broker -> consumer worker -> handler.
+
+Runs ``PlotuneStream`` against a ``LocalBroker`` and sweeps the offered message rate,
+the number of consumer groups and the number of handlers per group. Every sample
+carries its wall-clock send time, so each handler call yields one end-to-end latency.
+
+Reported per run: delivered handler messages per second, p50/p99 latency, and CPU
+and RSS of the extension process and of every worker process (CPU and RSS need
+``psutil``; without it only the extension's own CPU time is shown).
+
+    python benchmarks/bench_stream_e2e.py --rates 1000 10000 --groups 1 4 --handlers 1 --modes process shared
+    python benchmarks/bench_stream_e2e.py --json results.json   # keep for comparing releases
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Dict, List
+
+from plotune_sdk.src.runtime import PlotuneRuntime
+from plotune_sdk.testing import LocalBroker
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+TICK = 0.01
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ProcessMeter:
+    """CPU seconds and peak RSS of a set of processes over one run."""
+
+    def __init__(self):
+        self._procs: Dict[str, "psutil.Process"] = {}
+        self._cpu_start: Dict[str, float] = {}
+        self.rss: Dict[str, float] = {}
+        self._self_cpu = sum(os.times()[:2])
+
+    def track(self, label: str, pid: int):
+        if psutil is None or pid is None or label in self._procs:
+            return
+        proc = psutil.Process(pid)
+        self._procs[label] = proc
+        cpu = proc.cpu_times()
+        self._cpu_start[label] = cpu.user + cpu.system
+
+    def sample(self):
+        for label, proc in self._procs.items():
+            try:
+                self.rss[label] = max(self.rss.get(label, 0.0), proc.memory_info().rss / 1e6)
+            except psutil.Error:
+                pass
+
+    def cpu(self, elapsed: float) -> Dict[str, float]:
+        """CPU use per process as a percentage of one core."""
+        if psutil is None:
+            return {"extension": 100 * (sum(os.times()[:2]) - self._self_cpu) / elapsed}
+        out = {}
+        for label, proc in self._procs.items():
+            try:
+                cpu = proc.cpu_times()
+                out[label] = 100 * (cpu.user + cpu.system - self._cpu_start[label]) / elapsed
+            except psutil.Error:
+                pass
+        return out
+
+
+async def run_case(broker: LocalBroker, mode: str, rate: int, groups: int, handlers: int, duration: float) -> dict:
+    runtime = PlotuneRuntime(
+        ext_name="plotune-bench",
+        tray_icon=False,
+        api_url=broker.url,
+        stream_url=broker.url,
+        stream_worker_mode=mode,
+    )
+    stream = runtime.create_stream(f"bench-{mode}-{rate}-{groups}-{handlers}")
+    stream.username = "bench"
+    stream.producer_batch_size = 1000
+    stream.producer_linger = 0.005
+
+    latencies: List[float] = []
+    delivered = 0
+
+    def make_handler():
+        async def handler(batch):
+            nonlocal delivered
+            now = time.time()
+            delivered += len(batch)
+            latencies.extend(now - t for t in batch.times)
+
+        return handler
+
+    for g in range(groups):
+        for _ in range(handlers):
+            stream.on_consume_batch(f"g{g}", max_size=1000, max_wait=0.001, columnar=True)(make_handler())
+
+    meter = ProcessMeter()
+    meter.track("extension", os.getpid())
+    await stream.start(broker.token)
+    await stream.enable_producer()
+    deadline = time.monotonic() + 5
+    while len(broker.stats()["consumers"]) < groups and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+    for label, proc in stream.workers.items():
+        meter.track(label, proc.pid)
+    if mode == "shared":
+        meter.track("hub", runtime._get_stream_hub().pid)
+
+    per_tick = max(1, int(rate * TICK))
+    sent = 0
+    started = time.monotonic()
+    next_tick = started
+    counter = itertools.count()
+    while time.monotonic() - started < duration:
+        now = time.time()
+        t0 = next(counter) * per_tick
+        await stream.aproduce_many({"K": ([now] * per_tick, list(range(t0, t0 + per_tick)))})
+        sent += per_tick
+        meter.sample()
+        next_tick += TICK
+        await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    expected = sent * groups * handlers
+    drain_deadline = time.monotonic() + 5
+    while delivered < expected and time.monotonic() < drain_deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - started
+    meter.sample()
+    cpu = meter.cpu(elapsed)
+
+    await runtime._stop_all_streams()
+
+    return {
+        "mode": mode,
+        "rate": rate,
+        "groups": groups,
+        "handlers": handlers,
+        "sent": sent,
+        "delivered": delivered,
+        "lost": max(0, expected - delivered),
+        "msgs_per_sec": delivered / elapsed,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+        "cpu_percent": cpu,
+        "rss_mb": dict(meter.rss),
+    }
+
+
+def format_row(r: dict) -> str:
+    cpu = " ".join(f"{k}={v:.0f}%" for k, v in r["cpu_percent"].items())
+    rss = " ".join(f"{k}={v:.0f}MB" for k, v in r["rss_mb"].items())
+    return (
+        f"{r['mode']:>8} {r['rate']:>7} {r['groups']:>3} {r['handlers']:>3} "
+        f"{r['msgs_per_sec']:>11,.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['lost']:>7}  {cpu}  {rss}"
+    )
+
+
+async def main_async(args) -> List[dict]:
+    results = []
+    async with LocalBroker() as broker:
+        print(f"{'mode':>8} {'rate':>7} {'grp':>3} {'hdl':>3} {'msgs/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'lost':>7}")
+        for mode, rate, groups, handlers in itertools.product(args.modes, args.rates, args.groups, args.handlers):
+            result = await run_case(broker, mode, rate, groups, handlers, args.duration)
+            results.append(result)
+            print(format_row(result), flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", type=int, nargs="+", default=[1000, 10000, 50000], help="offered samples/s")
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--handlers", type=int, nargs="+", default=[1, 4], help="handlers per group")
+    parser.add_argument("--modes", nargs="+", default=["process", "shared", "inline"])
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds of producing per run")
+    parser.add_argument("--json", help="write all results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Compare one worker process per group against the shared stream hub.
+
+Starts a local broker fed with samples, subscribes ``--groups`` consumer groups in
+each mode and reports the time until every group has received its first message,
+plus the total resident memory of the worker processes.
+
+    python benchmarks/bench_worker_modes.py --groups 8
+"""
+
+import argparse
+import asyncio
+import os
+import queue
+import threading
+import time
+from multiprocessing import Event, Process, Queue
+
+import aiohttp
+
+from plotune_sdk.src.stream_hub import StreamHub
+from plotune_sdk.src.workers import consumer_worker_entry
+from plotune_sdk.testing import LocalBroker
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def feed(broker: LocalBroker, stop: threading.Event, rate: float = 100.0):
+    """Produce one sample every 1/rate seconds into stream "s" until stopped."""
+
+    async def run():
+        headers = {"Authorization": f"Bearer {broker.token}"}
+        url = broker.url.replace("http", "ws", 1) + "/ws/producer/bench/s"
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(url, headers=headers) as ws:
+                t = 0
+                while not stop.is_set():
+                    await ws.send_json({"key": "K", "time": t, "value": t * 0.5})
+                    t += 1
+                    await asyncio.sleep(1 / rate)
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+
+
+def rss_mb(pids) -> float:
+    total = 0
+    for pid in pids:
+        if psutil is not None:
+            total += psutil.Process(pid).memory_info().rss
+            continue
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+    return total / 1e6
+
+
+def wait_first(queues, timeout: float = 30.0) -> float:
+    started = time.perf_counter()
+    for q in queues:
+        q.get(timeout=timeout)
+    return time.perf_counter() - started
+
+
+def run_process_mode(broker: LocalBroker, groups: int):
+    stop = Event()
+    queues = [Queue() for _ in range(groups)]
+    started = time.perf_counter()
+    procs = [
+        Process(
+            target=consumer_worker_entry,
+            args=("bench", "s", f"g{i}", broker.token, q, stop),
+            kwargs={"stream_url": broker.url},
+            daemon=True,
+        )
+        for i, q in enumerate(queues)
+    ]
+    for p in procs:
+        p.start()
+    wait_first(queues)
+    elapsed = time.perf_counter() - started
+    memory = rss_mb([p.pid for p in procs])
+    stop.set()
+    for p in procs:
+        p.join(2)
+        if p.is_alive():
+            p.kill()
+    return elapsed, memory, len(procs)
+
+
+def run_shared_mode(broker: LocalBroker, groups: int):
+    stop = Event()
+    hub = StreamHub(stop)
+    queues = [queue.Queue() for _ in range(groups)]
+    started = time.perf_counter()
+    for i, q in enumerate(queues):
+        hub.subscribe("s", f"g{i}", "bench", broker.token, q, {"stream_url": broker.url})
+    wait_first(queues)
+    elapsed = time.perf_counter() - started
+    memory = rss_mb([hub.pid])
+    hub.stop()
+    return elapsed, memory, 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=8)
+    args = parser.parse_args()
+
+    broker = LocalBroker()
+    broker.start_in_thread()
+    feeding = threading.Event()
+    feed(broker, feeding)
+
+    print(f"{args.groups} groups, pid {os.getpid()}")
+    for name, run in (("process", run_process_mode), ("shared", run_shared_mode)):
+        elapsed, memory, processes = run(broker, args.groups)
+        print(
+            f"{name:>8}: {processes:3d} processes  first message in {elapsed * 1000:8.1f} ms  worker RSS {memory:8.1f} MB"
+        )
+
+    feeding.set()
+    broker.stop_thread()
+
+
+if __name__ == "__main__":
+    main()
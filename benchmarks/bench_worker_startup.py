@@ -0,0 +1,115 @@
+"""Start-up cost of stream worker processes per multiprocessing start method.
+
+Starts ``--workers`` consumer worker processes against a local broker fed with
+samples, with each start method, and reports the time until every worker has
+delivered its first message and the resident memory per worker. Workers start
+through ``plotune_sdk.src.workers.bootstrap`` when it is available, and through
+the consumer worker entry point otherwise, so the same script measures older trees.
+
+    python benchmarks/bench_worker_startup.py --workers 8
+
+Only the standard library is imported at module level: spawn and forkserver
+children import this file again as their ``__main__``.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+
+def feed(broker, stop: threading.Event, rate: float = 200.0):
+    """Produce one sample every 1/rate seconds into stream "s" until stopped."""
+    import aiohttp
+
+    async def run():
+        headers = {"Authorization": f"Bearer {broker.token}"}
+        url = broker.url.replace("http", "ws", 1) + "/ws/producer/bench/s"
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(url, headers=headers) as ws:
+                t = 0
+                while not stop.is_set():
+                    await ws.send_json({"key": "K", "time": t, "value": t * 0.5})
+                    t += 1
+                    await asyncio.sleep(1 / rate)
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def worker_target(method: str):
+    """Process target and leading arguments of a consumer worker, plus the context to start it with."""
+    try:
+        from plotune_sdk.src.workers import bootstrap
+    except ImportError:
+        from plotune_sdk.src.workers import consumer_worker_entry
+
+        return consumer_worker_entry, (), multiprocessing.get_context(method)
+    return bootstrap.worker_main, ("consume",), bootstrap.set_start_method(method)
+
+
+def run(method: str, workers: int, broker):
+    target, lead, ctx = worker_target(method)
+    stop = ctx.Event()
+    queues = [ctx.Queue() for _ in range(workers)]
+    procs = [
+        ctx.Process(
+            target=target,
+            args=lead + ("bench", "s", f"{method}{i}", broker.token, q, stop),
+            kwargs={"stream_url": broker.url},
+            daemon=True,
+        )
+        for i, q in enumerate(queues)
+    ]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    launched = time.perf_counter() - started
+    for q in queues:
+        q.get(timeout=60)
+    elapsed = time.perf_counter() - started
+    memory = sum(rss_mb(p.pid) for p in procs) / workers
+    stop.set()
+    for p in procs:
+        p.join(2)
+        if p.is_alive():
+            p.kill()
+    return launched, elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--methods", default="fork,spawn,forkserver")
+    args = parser.parse_args()
+
+    from plotune_sdk.testing import LocalBroker
+
+    broker = LocalBroker()
+    broker.start_in_thread()
+    feeding = threading.Event()
+    feed(broker, feeding)
+
+    print(f"{args.workers} consumer workers, pid {os.getpid()}")
+    for method in args.methods.split(","):
+        launched, elapsed, memory = run(method, args.workers, broker)
+        print(
+            f"{method:>10}: start() {launched * 1000:7.1f} ms  all delivering in {elapsed * 1000:7.1f} ms"
+            f"  RSS {memory:6.1f} MB/worker"
+        )
+
+    feeding.set()
+    broker.stop_thread()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,20 @@
 
 __version__ = "0.1.2"
 
-from plotune_sdk.src import PlotuneRuntime, FormLayout
-from plotune_sdk.utils import AVAILABLE_PORT
+# Exports are imported on first use, so stream worker processes, which import
+# plotune_sdk.src.workers only, do not load the runtime, server and tray stack.
+_EXPORTS = {
+    "PlotuneRuntime": "plotune_sdk.src",
+    "FormLayout": "plotune_sdk.src",
+    "AVAILABLE_PORT": "plotune_sdk.utils",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
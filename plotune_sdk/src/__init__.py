@@ -1,7 +1,20 @@
 """Core module exports for Plotune SDK."""
 
-from .core import CoreClient
-from .server import PlotuneServer
-from .runtime import PlotuneRuntime
-from .forms import FormLayout
-from .streams import PlotuneStream
+# Imported on first use, see plotune_sdk/__init__.py
+_EXPORTS = {
+    "CoreClient": ".core",
+    "PlotuneServer": ".server",
+    "PlotuneRuntime": ".runtime",
+    "FormLayout": ".forms",
+    "PlotuneStream": ".streams",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,199 @@
+"""Incremental time alignment of several keyed series.
+
+The variables an expression combines (``NewVariable.ref_variables``) arrive from
+different sources with their own timestamps. :class:`Aligner` buffers them and
+emits rows ``(time, (value_of_key_0, value_of_key_1, ...))`` on a common time
+base:
+
+* ``method="asof"``: each key's value is its latest sample at or before the row
+  time (as-of join), or nan if that sample is older than ``tolerance``.
+* ``method="linear"``: each key's value is linearly interpolated between the
+  samples around the row time.
+
+Row times are the sample times of the ``on`` key (the first key by default), or a
+fixed grid of ``rate`` rows per second when ``rate`` is given (resampling).
+
+A row is emitted once every key has a sample at or after its time, so it never
+changes when a slower source catches up. ``max_delay`` bounds how long a key
+that stopped sending can hold rows back; :meth:`Aligner.flush` emits what is
+still pending. Keys without a sample before a row time give nan.
+
+Each key's samples must not go backwards in time; samples that do are dropped
+and counted in :attr:`Aligner.dropped`. Buffers only ever shrink from the front
+as rows are emitted, so every sample costs amortized O(1) (times the number of
+keys, for the readiness check).
+
+``max_buffer`` bounds each key's samples and the pending row times, so a key that
+stops sending cannot make the others grow without bound. When a buffer is full,
+the rows that still need its oldest entry are emitted early with what is known,
+as ``max_delay`` would. Samples that still do not fit (a key running ahead while
+no row is pending) are discarded and counted in :attr:`Aligner.evicted`.
+"""
+
+import math
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Row = Tuple[float, Tuple[float, ...]]
+
+METHODS = ("asof", "linear")
+
+
+class Aligner:
+    """Align samples of ``keys`` into rows, see the module docstring.
+
+    At most ``max_buffer`` samples per key and pending row times are kept; a full
+    buffer emits its rows early, and samples discarded anyway are counted in ``evicted``.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        method: str = "asof",
+        on: Optional[str] = None,
+        rate: Optional[float] = None,
+        tolerance: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        max_buffer: int = 100_000,
+    ):
+        keys = list(keys)
+        if not keys or len(set(keys)) != len(keys):
+            raise ValueError("keys must be a non-empty sequence of distinct names")
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+        if on is not None and on not in keys:
+            raise ValueError(f"on={on!r} is not one of the keys")
+        if rate is not None and on is not None:
+            raise ValueError("Use either on= or rate=, not both")
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        if max_buffer < 2:
+            raise ValueError("max_buffer must be at least 2")
+
+        self.keys = tuple(keys)
+        self.method = method
+        self.on = None if rate is not None else (on or keys[0])
+        self.rate = rate
+        self.tolerance = tolerance
+        self.max_delay = max_delay
+        self.dropped = 0
+        self.evicted = 0
+
+        self._index = {key: i for i, key in enumerate(keys)}
+        self._samples: List[Deque[Tuple[float, float]]] = [deque(maxlen=max_buffer) for _ in keys]
+        self._latest = [-math.inf] * len(keys)
+        self._newest = -math.inf
+        self._pending: Deque[float] = deque(maxlen=max_buffer)  # row times of the "on" key
+        self._tick: Optional[int] = None  # next grid index when resampling
+
+    # -----------------------------------------------------------------
+    # Input
+    # -----------------------------------------------------------------
+    def push(self, key: str, t: float, v: float) -> List[Row]:
+        """Add one sample; returns the rows it completes (often none)."""
+        rows: List[Row] = []
+        if self._add(key, t, v, rows):
+            self._emit(self._watermark(), rows)
+        return rows
+
+    def extend(self, records: Iterable[Tuple[str, float, float]]) -> List[Row]:
+        """Add ``(key, time, value)`` records; returns the rows they complete."""
+        rows: List[Row] = []
+        for key, t, v in records:
+            if self._add(key, t, v, rows):
+                self._emit(self._watermark(), rows)
+        return rows
+
+    def flush(self) -> List[Row]:
+        """Emit every pending row with what is known now (up to the newest sample when resampling)."""
+        rows: List[Row] = []
+        self._emit(self._newest, rows)
+        return rows
+
+    def _add(self, key: str, t: float, v: float, rows: List[Row]) -> bool:
+        i = self._index.get(key)
+        if i is None:
+            return False
+        t, v = float(t), float(v)
+        if t < self._latest[i]:
+            self.dropped += 1
+            return False
+        samples = self._samples[i]
+        if len(samples) == samples.maxlen:
+            # emit the rows that still need the oldest sample rather than lose it under them
+            self._emit(samples[1][0], rows)
+            if len(samples) == samples.maxlen:
+                self.evicted += 1
+        samples.append((t, v))
+        self._latest[i] = t
+        if t > self._newest:
+            self._newest = t
+        if key == self.on:
+            if len(self._pending) == self._pending.maxlen:
+                self._emit(self._pending[0], rows)
+            self._pending.append(t)
+        elif self._tick is None and self.rate is not None:
+            self._tick = math.ceil(t * self.rate)
+        return True
+
+    # -----------------------------------------------------------------
+    # Output
+    # -----------------------------------------------------------------
+    def _watermark(self) -> float:
+        """Rows up to this time are final: every key has reached it (or waited ``max_delay`` for)."""
+        watermark = min(self._latest)
+        if self.max_delay is not None:
+            watermark = max(watermark, self._newest - self.max_delay)
+        return watermark
+
+    def _emit(self, watermark: float, rows: List[Row]):
+        if self.rate is None:
+            pending = self._pending
+            while pending and pending[0] <= watermark:
+                t = pending.popleft()
+                rows.append((t, self._row(t)))
+            return
+        if self._tick is None:
+            return
+        while self._tick / self.rate <= watermark:
+            t = self._tick / self.rate
+            rows.append((t, self._row(t)))
+            self._tick += 1
+
+    def _row(self, t: float) -> Tuple[float, ...]:
+        return tuple(self._value(samples, t) for samples in self._samples)
+
+    def _value(self, samples: Deque[Tuple[float, float]], t: float) -> float:
+        # row times only grow, so samples before the one at or before t are no longer needed
+        while len(samples) > 1 and samples[1][0] <= t:
+            samples.popleft()
+        if not samples or samples[0][0] > t:
+            return math.nan
+        t0, v0 = samples[0]
+        if self.method == "linear":
+            if t0 == t or len(samples) == 1:
+                return v0
+            t1, v1 = samples[1]
+            return v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+        if self.tolerance is not None and t - t0 > self.tolerance:
+            return math.nan
+        return v0
+
+    def columns(self, rows: Sequence[Row]) -> Tuple[Any, Dict[str, Any]]:
+        """Rows as a time column and one value column per key, ready for ``Expression.evaluate``.
+
+        Columns are NumPy arrays when NumPy is installed and ``array('d')`` otherwise.
+        """
+        keys = self.keys
+        if np is not None:
+            times = np.fromiter((t for t, _ in rows), dtype=np.float64, count=len(rows))
+            values = np.array([v for _, v in rows], dtype=np.float64).reshape(len(rows), len(keys))
+            return times, {key: values[:, i] for i, key in enumerate(keys)}
+        times = array("d", (t for t, _ in rows))
+        return times, {key: array("d", (v[i] for _, v in rows)) for i, key in enumerate(keys)}
@@ -0,0 +1,298 @@
+import asyncio
+import math
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from plotune_sdk.utils import get_logger
+
+logger = get_logger("plotune_stream")
+
+DISPATCH_MODES = ("concurrent", "inline", "bounded", "ordered")
+
+
+def message_key(message: Any) -> Any:
+    """Key used for ordered dispatch: the payload key of a consumed message."""
+    if isinstance(message, dict):
+        payload = message.get("payload")
+        if isinstance(payload, dict):
+            return payload.get("key")
+    return None
+
+
+class HandlerDispatcher:
+    """Runs one consume handler under a dispatch mode and tracks what is in flight.
+
+    * ``concurrent`` — one task per message (the original behaviour), tracked so
+      shutdown can wait for or cancel them.
+    * ``inline`` — messages are handled one at a time, in arrival order.
+    * ``bounded`` — at most ``max_concurrency`` messages are handled at once.
+    * ``ordered`` — up to ``max_concurrency`` lanes; messages with the same key always
+      go to the same lane, so per-key order is preserved.
+
+    Queued modes use a fixed set of lane tasks, so a burst does not create one
+    pending task per message. They bound concurrency, not the backlog: messages
+    waiting for a lane are held in memory (see :attr:`in_flight`); the stream's
+    queue capacity and overflow policy are what bound the intake.
+
+    After :meth:`close` the dispatcher refuses new messages; they are dropped and
+    counted in :attr:`rejected`.
+    """
+
+    def __init__(self, group: str, func: Callable[[Any], Any], mode: str = "concurrent", max_concurrency: int = 16):
+        if mode not in DISPATCH_MODES:
+            raise ValueError(f"Unknown dispatch mode {mode!r}, expected one of {DISPATCH_MODES}")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.group = group
+        self.func = func
+        self.mode = mode
+        self.max_concurrency = 1 if mode == "inline" else max_concurrency
+
+        self.handled = 0
+        self.errors = 0
+        self.rejected = 0
+        self._closed = False
+        self._tasks: Set[asyncio.Task] = set()
+        self._queued = 0
+        self._lanes: List[asyncio.Queue] = []
+        self._lane_tasks: List[asyncio.Task] = []
+
+    # -----------------------------------------------------------------
+    # Submission (runs on the event loop)
+    # -----------------------------------------------------------------
+    def submit(self, message: Any):
+        if self._closed:
+            # nothing would cancel tasks or lanes started after close()
+            self.rejected += 1
+            return
+        if self.mode == "concurrent":
+            task = asyncio.create_task(self.func(message))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+            return
+
+        if not self._lanes:
+            self._start_lanes()
+        if self.mode == "ordered":
+            lane = self._lanes[hash(message_key(message)) % len(self._lanes)]
+        else:
+            lane = self._lanes[0]
+        self._queued += 1
+        lane.put_nowait(message)
+
+    def _start_lanes(self):
+        if self.mode == "ordered":
+            # one queue and one runner per lane
+            self._lanes = [asyncio.Queue() for _ in range(self.max_concurrency)]
+            self._lane_tasks = [asyncio.create_task(self._run_lane(lane)) for lane in self._lanes]
+        else:
+            # inline / bounded: runners share a single queue
+            self._lanes = [asyncio.Queue()]
+            self._lane_tasks = [
+                asyncio.create_task(self._run_lane(self._lanes[0])) for _ in range(self.max_concurrency)
+            ]
+
+    async def _run_lane(self, lane: asyncio.Queue):
+        while True:
+            message = await lane.get()
+            try:
+                await self.func(message)
+                self.handled += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.errors += 1
+                logger.exception(f"[{self.group}] Handler error: {exc}")
+            finally:
+                self._queued -= 1
+                lane.task_done()
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            self.errors += 1
+            logger.error(f"[{self.group}] Handler error: {exc!r}")
+        else:
+            self.handled += 1
+
+    # -----------------------------------------------------------------
+    # Introspection and shutdown
+    # -----------------------------------------------------------------
+    @property
+    def in_flight(self) -> int:
+        """Messages accepted but not yet fully handled."""
+        if self.mode == "concurrent":
+            return len(self._tasks)
+        return self._queued
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "in_flight": self.in_flight,
+            "handled": self.handled,
+            "errors": self.errors,
+            "rejected": self.rejected,
+        }
+
+    async def close(self, timeout: Optional[float] = None):
+        """Stop accepting messages, wait up to ``timeout`` seconds for in-flight ones, then cancel the rest."""
+        self._closed = True
+        if timeout:
+            if self.mode == "concurrent":
+                pending = list(self._tasks)
+                waiter = asyncio.gather(*pending, return_exceptions=True) if pending else None
+            else:
+                waiter = asyncio.gather(*(lane.join() for lane in self._lanes)) if self._lanes else None
+            if waiter is not None:
+                try:
+                    await asyncio.wait_for(waiter, timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"[{self.group}] {self.in_flight} handler messages still in flight, cancelling")
+
+        remaining = list(self._tasks) + self._lane_tasks
+        for task in remaining:
+            task.cancel()
+        if remaining:
+            await asyncio.gather(*remaining, return_exceptions=True)
+        self._tasks.clear()
+        self._lane_tasks = []
+        self._lanes = []
+        self._queued = 0
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class ColumnBatch:
+    """Consumed messages laid out as parallel ``keys``, ``times`` and ``values`` columns.
+
+    ``times`` and ``values`` are NumPy float64 arrays when NumPy is installed and
+    ``array('d')`` otherwise. Values that are not numbers become NaN.
+    """
+
+    def __init__(self, messages: List[Any]):
+        payloads = [m.get("payload", m) if isinstance(m, dict) else None for m in messages]
+        # same rule as message_key(): anything but a dict payload has no key, time or value
+        payloads = [p if isinstance(p, dict) else {} for p in payloads]
+        self.keys: List[str] = [p.get("key") for p in payloads]
+        times = [_to_float(p.get("time")) for p in payloads]
+        values = [_to_float(p.get("value")) for p in payloads]
+        if np is not None:
+            self.times = np.asarray(times, dtype=np.float64)
+            self.values = np.asarray(values, dtype=np.float64)
+        else:
+            self.times = array("d", times)
+            self.values = array("d", values)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def by_key(self) -> Dict[str, Tuple[Any, Any]]:
+        """Split the batch into ``{key: (times, values)}``, keeping arrival order within each key."""
+        if np is not None:
+            keys = np.asarray(self.keys, dtype=object)
+            return {key: (self.times[keys == key], self.values[keys == key]) for key in dict.fromkeys(self.keys)}
+        out: Dict[str, Tuple[Any, Any]] = {}
+        for key, t, v in zip(self.keys, self.times, self.values):
+            times, values = out.setdefault(key, (array("d"), array("d")))
+            times.append(t)
+            values.append(v)
+        return out
+
+
+class BatchDispatcher:
+    """Collects messages for a batch handler and calls it with up to ``max_size`` at a time.
+
+    A batch is flushed when it reaches ``max_size`` or ``max_wait`` seconds after its
+    first message arrived. Batches are handled one at a time, in order. With
+    ``columnar`` the handler receives a :class:`ColumnBatch` instead of a list.
+    """
+
+    def __init__(
+        self,
+        group: str,
+        func: Callable[[Any], Any],
+        max_size: int = 1000,
+        max_wait: float = 0.05,
+        columnar: bool = False,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.group = group
+        self.func = func
+        self.mode = "batch"
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.columnar = columnar
+
+        self.batches = 0
+        # messages in batches the handler returned from without an error
+        self.messages_handled = 0
+        self._buffer: List[Any] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._runner = HandlerDispatcher(group, self._call, "inline")
+
+    async def _call(self, batch: List[Any]):
+        self.batches += 1
+        await self.func(ColumnBatch(batch) if self.columnar else batch)
+        self.messages_handled += len(batch)
+
+    def submit(self, message: Any):
+        if self._runner._closed:
+            self._runner.rejected += 1
+            return
+        self._buffer.append(message)
+        if len(self._buffer) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._runner.submit(batch)
+
+    @property
+    def in_flight(self) -> int:
+        """Messages waiting in the open batch plus batches not yet handled."""
+        return len(self._buffer) + self._runner.in_flight
+
+    def stats(self) -> dict:
+        """Counters like :meth:`HandlerDispatcher.stats`; "handled" counts messages, "handled_batches" and
+        "errors" count batches."""
+        return {
+            "mode": self.mode,
+            "in_flight": self.in_flight,
+            "batches": self.batches,
+            "handled": self.messages_handled,
+            "handled_batches": self._runner.handled,
+            "errors": self._runner.errors,
+            "rejected": self._runner.rejected,
+        }
+
+    async def close(self, timeout: Optional[float] = None):
+        """Hand over the open batch, then wait up to ``timeout`` like :class:`HandlerDispatcher`."""
+        self.flush()
+        await self._runner.close(timeout)
+
+
+def make_dispatcher(group: str, func: Callable[[Any], Any], options: Dict[str, Any]):
+    """Build the dispatcher described by the options a handler was registered with."""
+    if options.get("batch"):
+        return BatchDispatcher(group, func, options["max_size"], options["max_wait"], options["columnar"])
+    return HandlerDispatcher(group, func, options.get("dispatch", "concurrent"), options.get("max_concurrency", 16))
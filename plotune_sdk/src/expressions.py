@@ -0,0 +1,329 @@
+"""Derived-variable expressions, compiled once and evaluated over whole columns.
+
+``/add-variable/{variable_name}`` hands an extension a ``NewVariable`` whose
+``expr`` combines its ``ref_variables``, e.g. ``"sqrt(ax**2 + ay**2) * 9.81"``.
+:func:`compile_expression` parses the string, checks every node against a
+whitelist of arithmetic, comparisons and math functions, and compiles it; the
+result is cached per expression string. :meth:`Expression.evaluate` then runs
+the compiled code once over NumPy arrays of the referenced variables instead of
+once per sample. Without NumPy it falls back to evaluating row by row with
+:mod:`math`.
+
+Both backends follow IEEE float rules for division by zero, overflow and invalid
+powers: ``x / 0`` is ``inf`` (``nan`` for ``0 / 0``), ``9**9**9`` is ``inf`` and
+``(-8)**0.5`` is ``nan``. ``&`` and ``|`` combine comparisons, e.g.
+``where((x > 0) & (x < 10), x, 0)``.
+
+Variables are referenced by name. Names that are not Python identifiers
+(``"engine.rpm"``, ``"Var 1"``), or that clash with a function or constant such
+as ``e``, are written in backticks: ``"`engine.rpm` / 60"``.
+"""
+
+import ast
+import functools
+import math
+import re
+from array import array
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr)
+_BOOLEAN_OPS = (ast.BitAnd, ast.BitOr)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+_COMPARE_OPS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+_BACKTICKS = re.compile(r"`([^`]*)`")
+_QUOTED_PREFIX = "__var_"
+
+MAX_LENGTH = 4096
+
+
+def _py_where(condition, a, b):
+    return a if condition else b
+
+
+def _py_clip(x, low, high):
+    return min(max(x, low), high)
+
+
+def _py_sign(x):
+    return float((x > 0) - (x < 0))
+
+
+def _py_div(a, b):
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _py_floordiv(a, b):
+    try:
+        return a // b
+    except ZeroDivisionError:
+        return _py_div(a, b)
+
+
+def _py_mod(a, b):
+    try:
+        return a % b
+    except ZeroDivisionError:
+        return math.nan
+
+
+def _py_pow(a, b):
+    try:
+        result = a**b
+    except (OverflowError, ZeroDivisionError):
+        negative = math.copysign(1.0, a) < 0 and b % 2 == 1
+        return -math.inf if negative else math.inf
+    return math.nan if isinstance(result, complex) else result
+
+
+# function name -> (numpy implementation, per-sample implementation)
+FUNCTIONS: Dict[str, Tuple[Optional[Callable], Callable]] = {
+    "abs": (np and np.abs, abs),
+    "sqrt": (np and np.sqrt, math.sqrt),
+    "exp": (np and np.exp, math.exp),
+    "log": (np and np.log, math.log),
+    "log10": (np and np.log10, math.log10),
+    "log2": (np and np.log2, math.log2),
+    "sin": (np and np.sin, math.sin),
+    "cos": (np and np.cos, math.cos),
+    "tan": (np and np.tan, math.tan),
+    "asin": (np and np.arcsin, math.asin),
+    "acos": (np and np.arccos, math.acos),
+    "atan": (np and np.arctan, math.atan),
+    "atan2": (np and np.arctan2, math.atan2),
+    "sinh": (np and np.sinh, math.sinh),
+    "cosh": (np and np.cosh, math.cosh),
+    "tanh": (np and np.tanh, math.tanh),
+    "hypot": (np and np.hypot, math.hypot),
+    "degrees": (np and np.degrees, math.degrees),
+    "radians": (np and np.radians, math.radians),
+    "floor": (np and np.floor, math.floor),
+    "ceil": (np and np.ceil, math.ceil),
+    "sign": (np and np.sign, _py_sign),
+    "min": (np and (lambda *xs: functools.reduce(np.minimum, xs)), min),
+    "max": (np and (lambda *xs: functools.reduce(np.maximum, xs)), max),
+    "clip": (np and np.clip, _py_clip),
+    "where": (np and np.where, _py_where),
+}
+
+# operators that raise on Python floats -> (name in the compiled code, numpy implementation,
+# per-sample implementation); both give inf or nan instead, so the backends agree
+OPERATORS: Dict[type, Tuple[str, Optional[Callable], Callable]] = {
+    ast.Div: ("__div", np and np.true_divide, _py_div),
+    ast.FloorDiv: ("__floordiv", np and np.floor_divide, _py_floordiv),
+    ast.Mod: ("__mod", np and np.mod, _py_mod),
+    ast.Pow: ("__pow", np and np.power, _py_pow),
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "inf": math.inf, "nan": math.nan}
+
+_ARITY = {"atan2": 2, "hypot": 2, "clip": 3, "where": 3}
+
+
+class Expression:
+    """A validated, compiled expression; build it with :func:`compile_expression`.
+
+    :attr:`names` are the variables it references, in order of first use.
+    """
+
+    def __init__(self, source: str, names: Tuple[str, ...], code, aliases: Dict[str, str]):
+        self.source = source
+        self.names = names
+        self._code = code
+        self._aliases = aliases  # identifier in the compiled code -> variable name
+
+    def evaluate(self, values: Mapping[str, Any]) -> Any:
+        """Evaluate over ``values`` (variable name -> column or scalar), all columns at once.
+
+        Columns must have the same length; scalars are broadcast. Returns a float64
+        NumPy array (an ``array("d")`` without NumPy, a float when every input is a scalar).
+        """
+        missing = [name for name in self.names if name not in values]
+        if missing:
+            raise KeyError(f"Expression {self.source!r} needs values for {missing}")
+        if np is None:
+            return self._evaluate_rows(values)
+
+        namespace: Dict[str, Any] = {name: fn for name, (fn, _) in FUNCTIONS.items()}
+        namespace.update((ident, fn) for ident, fn, _ in OPERATORS.values())
+        namespace.update(CONSTANTS)
+        for ident, name in self._aliases.items():
+            namespace[ident] = np.asarray(values[name], dtype=np.float64)
+        try:
+            with np.errstate(all="ignore"):
+                result = eval(self._code, {"__builtins__": {}}, namespace)
+        except ArithmeticError:
+            # same as a failing row in the fallback: nan, shaped like the inputs
+            shape = np.broadcast(*(namespace[ident] for ident in self._aliases)).shape if self._aliases else ()
+            result = np.full(shape, math.nan)
+        result = np.asarray(result, dtype=np.float64)
+        if result.ndim == 0 and not any(np.ndim(values[name]) for name in self.names):
+            return float(result)
+        return result
+
+    def _evaluate_rows(self, values: Mapping[str, Any]) -> Any:
+        namespace: Dict[str, Any] = {name: fn for name, (_, fn) in FUNCTIONS.items()}
+        namespace.update((ident, fn) for ident, _, fn in OPERATORS.values())
+        namespace.update(CONSTANTS)
+        columns = {ident: values[name] for ident, name in self._aliases.items()}
+        lengths = {len(v) for v in columns.values() if not isinstance(v, (int, float))}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns of {self.names} have different lengths {sorted(lengths)}")
+        if not lengths:
+            namespace.update(columns)
+            return float(self._eval_row(namespace))
+        out = array("d")
+        for i in range(lengths.pop()):
+            for ident, column in columns.items():
+                namespace[ident] = column if isinstance(column, (int, float)) else column[i]
+            out.append(self._eval_row(namespace))
+        return out
+
+    def _eval_row(self, namespace: Dict[str, Any]) -> float:
+        try:
+            return float(eval(self._code, {"__builtins__": {}}, namespace))
+        except (ArithmeticError, ValueError):
+            return math.nan
+
+    def __call__(self, **values: Any) -> Any:
+        return self.evaluate(values)
+
+    def __reduce__(self):
+        return compile_expression, (self.source,)
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+def _is_condition(node: ast.AST) -> bool:
+    # a comparison, or comparisons combined with & and | (each of which is validated in turn)
+    return isinstance(node, ast.Compare) or (isinstance(node, ast.BinOp) and isinstance(node.op, _BOOLEAN_OPS))
+
+
+class _CallOperators(ast.NodeTransformer):
+    """Rewrite the operators in :data:`OPERATORS` as calls to their backend's implementation."""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        operator = OPERATORS.get(type(node.op))
+        if operator is None:
+            return node
+        call = ast.Call(func=ast.Name(id=operator[0], ctx=ast.Load()), args=[node.left, node.right], keywords=[])
+        return ast.copy_location(call, node)
+
+
+def _validate(tree: ast.AST, source: str, aliases: Dict[str, str]) -> Tuple[str, ...]:
+    names: Dict[str, Tuple[int, int]] = {}
+    callees = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+
+    def fail(node: ast.AST, what: str):
+        raise ValueError(f"{what} is not allowed in expression {source!r} (column {getattr(node, 'col_offset', 0)})")
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Expression, ast.Load)) or isinstance(node, _BINARY_OPS + _UNARY_OPS + _COMPARE_OPS):
+            continue
+        if isinstance(node, ast.BinOp):
+            if not isinstance(node.op, _BINARY_OPS):
+                fail(node, f"Operator {type(node.op).__name__}")
+            if isinstance(node.op, _BOOLEAN_OPS) and not (_is_condition(node.left) and _is_condition(node.right)):
+                fail(node, f"Operator {type(node.op).__name__} on something other than comparisons")
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, _UNARY_OPS):
+                fail(node, f"Operator {type(node.op).__name__}")
+        elif isinstance(node, ast.Compare):
+            if len(node.ops) != 1:
+                fail(node, "A chained comparison")
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                fail(node, f"Constant {node.value!r}")
+        elif isinstance(node, ast.Call):
+            func = node.func
+            if not isinstance(func, ast.Name) or func.id not in FUNCTIONS:
+                fail(node, f"Calling {ast.unparse(func)!r}")
+            if node.keywords:
+                fail(node, f"Passing keyword arguments to {func.id}()")
+            arity = _ARITY.get(func.id, 1)
+            if func.id in ("min", "max"):
+                if len(node.args) < 2:
+                    fail(node, f"{func.id}() with fewer than two arguments")
+            elif len(node.args) != arity:
+                fail(node, f"{func.id}() with {len(node.args)} arguments")
+        elif isinstance(node, ast.Name):
+            if node.id in FUNCTIONS:
+                if id(node) not in callees:
+                    fail(node, f"Using {node.id!r} without calling it")
+                continue
+            if node.id in CONSTANTS:
+                continue
+            if node.id.startswith("__") and node.id not in aliases:
+                fail(node, f"Name {node.id!r}")
+            aliases.setdefault(node.id, node.id)
+            position = (node.lineno, node.col_offset)
+            names[aliases[node.id]] = min(position, names.get(aliases[node.id], position))
+        else:
+            fail(node, type(node).__name__)
+    return tuple(sorted(names, key=names.get))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(source: str) -> Expression:
+    """Parse, validate and compile ``source``; the result is cached per string.
+
+    Raises ValueError for syntax errors and for anything outside the whitelist:
+    attribute access, subscripts, lambdas, comprehensions, strings, calls to
+    functions other than :data:`FUNCTIONS`, and so on, and for expressions nested
+    too deeply to compile.
+    """
+    if not isinstance(source, str):
+        raise TypeError("expression must be a string")
+    if len(source) > MAX_LENGTH:
+        raise ValueError(f"Expression is longer than {MAX_LENGTH} characters")
+
+    aliases: Dict[str, str] = {}
+
+    def quote(match: "re.Match") -> str:
+        name = match.group(1)
+        if not name:
+            raise ValueError(f"Empty `` variable name in expression {source!r}")
+        ident = next((i for i, n in aliases.items() if n == name), f"{_QUOTED_PREFIX}{len(aliases)}")
+        aliases[ident] = name
+        return ident
+
+    text = _BACKTICKS.sub(quote, source.strip())
+    if "`" in text:
+        raise ValueError(f"Unbalanced backtick in expression {source!r}")
+    try:
+        tree = ast.parse(text, mode="eval")
+        names = _validate(tree, source, aliases)
+        for node in ast.walk(tree):
+            # float arithmetic overflows to inf instead of growing integers without bound, e.g. 9**9**9
+            if isinstance(node, ast.Constant):
+                node.value = float(node.value)
+        tree = ast.fix_missing_locations(_CallOperators().visit(tree))
+        code = compile(tree, "<expression>", "eval")
+    except SyntaxError as exc:
+        raise ValueError(f"Invalid expression {source!r}: {exc.msg}") from None
+    except (RecursionError, MemoryError):
+        raise ValueError(f"Expression {source!r} is nested too deeply") from None
+    aliases = {ident: name for ident, name in aliases.items() if name in names}
+    return Expression(source, names, code, aliases)
+
+
+def compile_variable(variable: Any) -> Expression:
+    """Compile a ``NewVariable``'s ``expr``, checking it only references its ``ref_variables``."""
+    expression = compile_expression(variable.expr)
+    known = {ref.name for ref in variable.ref_variables}
+    unknown = [name for name in expression.names if name not in known]
+    if unknown:
+        raise ValueError(f"Expression {variable.expr!r} references {unknown}, which are not among its ref_variables")
+    return expression
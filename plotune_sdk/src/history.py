@@ -0,0 +1,142 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Sample = Tuple[float, float]
+
+
+class KeyHistory:
+    """Ring buffer of the last ``depth`` samples of one key.
+
+    Every sample is written twice, at ``i`` and ``i + depth``, so the newest
+    ``depth`` samples are always one contiguous slice of the storage and
+    :meth:`window` can return views instead of copies. Storage is NumPy when it
+    is installed and ``array('d')`` behind a memoryview otherwise.
+
+    Windows assume the key's times do not go backwards. A returned view is only
+    valid until ``depth`` more samples arrive; copy it to keep it longer.
+    """
+
+    def __init__(self, depth: int):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.depth = depth
+        self.count = 0
+        self._next = 0
+        if np is not None:
+            self._times = np.zeros(2 * depth)
+            self._values = np.zeros(2 * depth)
+        else:
+            self._times = memoryview(array("d", bytes(16 * depth)))
+            self._values = memoryview(array("d", bytes(16 * depth)))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, t: float, v: float):
+        i = self._next
+        self._times[i] = self._times[i + self.depth] = t
+        self._values[i] = self._values[i + self.depth] = v
+        self._next = (i + 1) % self.depth
+        if self.count < self.depth:
+            self.count += 1
+
+    def extend(self, times: Sequence[float], values: Sequence[float]):
+        n = len(times)
+        if np is None or n < 16:
+            for t, v in zip(times, values):
+                self.append(t, v)
+            return
+        if n > self.depth:
+            times, values, n = times[-self.depth :], values[-self.depth :], self.depth
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        idx = (self._next + np.arange(n)) % self.depth
+        for offset in (0, self.depth):
+            self._times[idx + offset] = times
+            self._values[idx + offset] = values
+        self._next = (self._next + n) % self.depth
+        self.count = min(self.depth, self.count + n)
+
+    def _span(self) -> Tuple[int, int]:
+        end = self._next + self.depth
+        return end - self.count, end
+
+    def latest(self) -> Optional[Sample]:
+        if not self.count:
+            return None
+        i = self._next - 1 + self.depth
+        return float(self._times[i]), float(self._values[i])
+
+    def window(self, t0: Optional[float] = None, t1: Optional[float] = None) -> Tuple[Any, Any]:
+        """Times and values with ``t0 <= time <= t1`` (either bound may be None), oldest first."""
+        start, end = self._span()
+        times = self._times[start:end]
+        lo = 0 if t0 is None else _search(times, t0, "left")
+        hi = len(times) if t1 is None else _search(times, t1, "right")
+        hi = max(lo, hi)
+        return times[lo:hi], self._values[start + lo : start + hi]
+
+
+def _search(times, t: float, side: str) -> int:
+    if np is not None:
+        return int(np.searchsorted(times, t, side=side))
+    return bisect_left(times, t) if side == "left" else bisect_right(times, t)
+
+
+class StreamHistory:
+    """Last value and recent history per key of the messages a stream consumes.
+
+    Fed from the stream's delivery callback on the event loop, so handlers and
+    request handlers running on that loop read a consistent state.
+    """
+
+    def __init__(self, depth: int = 1000):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.depth = depth
+        self._keys: Dict[str, KeyHistory] = {}
+
+    def _key(self, key: str) -> KeyHistory:
+        history = self._keys.get(key)
+        if history is None:
+            history = self._keys[key] = KeyHistory(self.depth)
+        return history
+
+    def add(self, key: str, t: float, v: float):
+        self._key(key).append(t, v)
+
+    def add_message(self, message: Any):
+        """Record a consumed ``{"payload": {"key", "time", "value"}}`` message; others are ignored."""
+        payload = message.get("payload") if isinstance(message, dict) else None
+        if not isinstance(payload, dict):
+            return
+        try:
+            self._key(str(payload["key"])).append(float(payload["time"]), float(payload["value"]))
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    def extend(self, key: str, times: Sequence[float], values: Sequence[float]):
+        self._key(key).extend(times, values)
+
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    def latest(self, key: str) -> Optional[Sample]:
+        history = self._keys.get(key)
+        return history.latest() if history is not None else None
+
+    def window(self, key: str, t0: Optional[float] = None, t1: Optional[float] = None) -> Tuple[Any, Any]:
+        history = self._keys.get(key)
+        if history is None:
+            empty = np.zeros(0) if np is not None else memoryview(array("d"))
+            return empty, empty
+        return history.window(t0, t1)
+
+    def clear(self):
+        self._keys.clear()
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from queue import Empty
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+from plotune_sdk.src.workers.common import is_stop
+from plotune_sdk.utils import get_logger
+
+logger = get_logger("plotune_stream")
+
+
+class QueueDrainer:
+    """Blocking reader thread that hands queue items to an event loop in bulk.
+
+    The thread sleeps in ``q.get`` until data arrives, drains whatever else is already
+    queued, and appends the batch to an inbox. The loop is woken with
+    ``call_soon_threadsafe`` only when the inbox goes from empty to non-empty, so a
+    burst costs one wakeup rather than one thread-pool hop per item.
+
+    A stop message put behind the worker's last items ends the thread; ``done``
+    resolves on the loop once everything before it has been delivered.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        q,
+        loop: asyncio.AbstractEventLoop,
+        deliver: Callable[[List[Any], float], None],
+        max_batch: int = 4096,
+        poll_timeout: float = 0.5,
+    ):
+        self.name = name
+        self.q = q
+        self.loop = loop
+        self.deliver = deliver
+        self.max_batch = max_batch
+        self.poll_timeout = poll_timeout
+
+        self._inbox: Deque[Tuple[List[Any], float]] = deque()
+        self._lock = threading.Lock()
+        self._wakeup_pending = False
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.done: "asyncio.Future[None]" = loop.create_future()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"plotune-reader-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def is_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        q = self.q
+        while not self._stopping.is_set():
+            try:
+                items = [q.get(timeout=self.poll_timeout)]
+            except Empty:
+                continue
+            except (ValueError, OSError, EOFError):
+                # queue closed underneath us
+                break
+            except Exception as exc:
+                logger.exception(f"[{self.name}] Unexpected queue error: {exc}")
+                time.sleep(0.5)
+                continue
+
+            while len(items) < self.max_batch and not is_stop(items[-1]):
+                try:
+                    items.append(q.get_nowait())
+                except Exception:
+                    break
+
+            if is_stop(items[-1]):
+                items.pop()
+                self._hand_over(items)
+                try:
+                    self.loop.call_soon_threadsafe(self._finish)
+                except RuntimeError:
+                    pass
+                break
+            if not self._hand_over(items):
+                break
+
+    def _hand_over(self, items: List[Any]) -> bool:
+        """Queue ``items`` for the loop and wake it if needed; False once the loop is closed."""
+        if not items:
+            return True
+        with self._lock:
+            self._inbox.append((items, time.perf_counter()))
+            if self._wakeup_pending:
+                return True
+            self._wakeup_pending = True
+        try:
+            self.loop.call_soon_threadsafe(self._flush)
+        except RuntimeError:
+            # event loop closed
+            return False
+        return True
+
+    def _flush(self):
+        """Runs on the event loop: deliver every batch received since the last wakeup."""
+        with self._lock:
+            batches = list(self._inbox)
+            self._inbox.clear()
+            self._wakeup_pending = False
+        for items, received_at in batches:
+            self.deliver(items, received_at)
+
+    def _finish(self):
+        """Runs on the event loop after the stop message: deliver what is left and resolve ``done``."""
+        self._flush()
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+class InlineQueue:
+    """Queue-like sink for consumers running as tasks on the stream's own event loop.
+
+    ``put`` hands the item straight to ``deliver``, so an in-process consumer reaches
+    the handlers without a queue, a drain thread or a loop wakeup in between. It must
+    only be called from that event loop.
+    """
+
+    # tells the consume worker it may call put() directly instead of from an executor
+    on_loop = True
+
+    def __init__(self, name: str, deliver: Callable[[List[Any], float], None]):
+        self.name = name
+        self.deliver = deliver
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None):
+        self.deliver([item], time.perf_counter())
+
+    def put_nowait(self, item: Any):
+        self.put(item)
+
+    def close(self):
+        pass
+
+    def join_thread(self):
+        pass
@@ -0,0 +1,313 @@
+import math
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Columns = Tuple[array, array]
+
+REDUCERS = ("decimate", "minmax", "lttb")
+
+# seconds a reducer may hold samples before they are flushed anyway
+DEFAULT_MAX_LATENCY = 1.0
+
+
+class Decimate:
+    """Keep every ``factor``-th sample."""
+
+    def __init__(self, factor: int):
+        if factor < 1:
+            raise ValueError("factor must be at least 1")
+        self.factor = factor
+        self._skip = 0
+
+    def push(self, times: array, values: array) -> Columns:
+        start = self._skip
+        out_t, out_v = times[start :: self.factor], values[start :: self.factor]
+        self._skip = (start - len(times)) % self.factor
+        return out_t, out_v
+
+    @property
+    def holding(self) -> bool:
+        return False
+
+    def flush(self) -> Columns:
+        return array("d"), array("d")
+
+
+class MinMax:
+    """Emit the minimum and maximum sample of each ``bucket``-second time bucket, in time order.
+
+    A bucket is emitted when the first sample of a later bucket arrives (or on flush),
+    so the output lags the input by at most one bucket.
+    """
+
+    def __init__(self, bucket: float):
+        if bucket <= 0:
+            raise ValueError("bucket must be positive")
+        self.bucket = bucket
+        self._id: Optional[int] = None
+        self._min: Tuple[float, float] = (0.0, math.inf)
+        self._max: Tuple[float, float] = (0.0, -math.inf)
+
+    def push(self, times: array, values: array) -> Columns:
+        out_t, out_v = array("d"), array("d")
+        for t, v in zip(times, values):
+            bucket_id = math.floor(t / self.bucket)
+            if bucket_id != self._id:
+                self._emit(out_t, out_v)
+                self._id = bucket_id
+                self._min = self._max = (t, v)
+                continue
+            if v < self._min[1]:
+                self._min = (t, v)
+            if v > self._max[1]:
+                self._max = (t, v)
+        return out_t, out_v
+
+    @property
+    def holding(self) -> bool:
+        return self._id is not None
+
+    def _emit(self, out_t: array, out_v: array):
+        if self._id is None:
+            return
+        points = sorted({self._min, self._max})
+        for t, v in points:
+            out_t.append(t)
+            out_v.append(v)
+        self._id = None
+
+    def flush(self) -> Columns:
+        out_t, out_v = array("d"), array("d")
+        self._emit(out_t, out_v)
+        return out_t, out_v
+
+
+def lttb_indices(times: Sequence[float], values: Sequence[float], threshold: int) -> Sequence[int]:
+    """Indices picked by Largest-Triangle-Three-Buckets to keep ``threshold`` points."""
+    n = len(times)
+    if threshold >= n:
+        return range(n)
+    if threshold < 3:
+        # too few points for triangles: keep the ends
+        return [0, n - 1][: max(threshold, 1)]
+
+    every = (n - 2) / (threshold - 2)
+    picked = [0]
+    a = 0
+    if np is not None:
+        t = np.asarray(times, dtype=np.float64)
+        v = np.asarray(values, dtype=np.float64)
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        nxt_start, nxt_end = end, min(int((i + 2) * every) + 1, n)
+        if np is not None:
+            avg_t = t[nxt_start:nxt_end].mean()
+            avg_v = v[nxt_start:nxt_end].mean()
+            areas = np.abs((t[a] - avg_t) * (v[start:end] - v[a]) - (t[a] - t[start:end]) * (avg_v - v[a]))
+            best = start + int(areas.argmax())
+        else:
+            span = nxt_end - nxt_start
+            avg_t = sum(times[nxt_start:nxt_end]) / span
+            avg_v = sum(values[nxt_start:nxt_end]) / span
+            best, best_area = start, -1.0
+            for j in range(start, end):
+                area = abs((times[a] - avg_t) * (values[j] - values[a]) - (times[a] - times[j]) * (avg_v - values[a]))
+                if area > best_area:
+                    best, best_area = j, area
+        picked.append(best)
+        a = best
+    picked.append(n - 1)
+    return picked
+
+
+class LTTB:
+    """Largest-Triangle-Three-Buckets over consecutive windows of ``window`` samples.
+
+    Each full window is reduced to ``window // ratio`` points that keep the visual
+    shape of the signal; a partial window is reduced on flush.
+    """
+
+    def __init__(self, ratio: int = 10, window: int = 1000):
+        if ratio < 1:
+            raise ValueError("ratio must be at least 1")
+        if window < 3 * ratio:
+            raise ValueError("window must hold at least three output points")
+        self.ratio = ratio
+        self.window = window
+        self._times = array("d")
+        self._values = array("d")
+
+    def push(self, times: array, values: array) -> Columns:
+        self._times.extend(times)
+        self._values.extend(values)
+        out_t, out_v = array("d"), array("d")
+        while len(self._times) >= self.window:
+            self._reduce(self.window, out_t, out_v)
+        return out_t, out_v
+
+    @property
+    def holding(self) -> bool:
+        return len(self._times) > 0
+
+    def _reduce(self, count: int, out_t: array, out_v: array):
+        times, values = self._times[:count], self._values[:count]
+        del self._times[:count]
+        del self._values[:count]
+        for i in lttb_indices(times, values, max(count // self.ratio, min(count, 3))):
+            out_t.append(times[i])
+            out_v.append(values[i])
+
+    def flush(self) -> Columns:
+        out_t, out_v = array("d"), array("d")
+        if self._times:
+            self._reduce(len(self._times), out_t, out_v)
+        return out_t, out_v
+
+
+def make_reducer(kind: str, **options) -> Any:
+    """Create a reducer by name: ``decimate(factor)``, ``minmax(bucket)`` or ``lttb(ratio, window)``."""
+    if kind == "decimate":
+        return Decimate(**options)
+    if kind == "minmax":
+        return MinMax(**options)
+    if kind == "lttb":
+        return LTTB(**options)
+    raise ValueError(f"Unknown reducer {kind!r}, expected one of {REDUCERS}")
+
+
+class ReductionStage:
+    """Per-key reducers applied to produced samples before they reach the producer queue.
+
+    A reducer configured for a key takes precedence over the stream-wide one; keys
+    without either pass through unchanged. Each key gets its own reducer instance.
+
+    Reducers hold samples until a bucket or window closes. What a reducer has held
+    for ``max_latency`` seconds (wall clock) is flushed on the next :meth:`apply`, or
+    by :meth:`flush_expired` for keys that stopped receiving samples.
+    """
+
+    def __init__(self):
+        # reducer factory and max_latency per key, None for the stream-wide default
+        self._factories: Dict[Optional[str], Tuple[Callable[[], Any], Optional[float]]] = {}
+        self._reducers: Dict[str, Any] = {}
+        # monotonic time each key's reducer started holding samples
+        self._held_since: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._factories)
+
+    def configure(
+        self,
+        kind: Optional[str],
+        key: Optional[str] = None,
+        max_latency: Optional[float] = DEFAULT_MAX_LATENCY,
+        **options,
+    ) -> Dict[str, Columns]:
+        """Reduce ``key`` (or every key) with ``kind``; ``kind=None`` removes the reducer.
+
+        Held samples are flushed once they are ``max_latency`` seconds old; ``None``
+        holds them until their bucket or window closes.
+        Returns what the replaced reducers still held, so the caller can send it on.
+        """
+        if kind is not None:
+            make_reducer(kind, **options)  # validate now rather than on the first sample
+            if max_latency is not None and max_latency <= 0:
+                raise ValueError("max_latency must be positive")
+        with self._lock:
+            if kind is None:
+                self._factories.pop(key, None)
+            else:
+                self._factories[key] = (lambda: make_reducer(kind, **options), max_latency)
+            # reducers are rebuilt with the new settings on the next sample
+            if key is None:
+                replaced, self._reducers = self._reducers, {}
+            else:
+                reducer = self._reducers.pop(key, None)
+                replaced = {key: reducer} if reducer is not None else {}
+            return self._flush_reducers(replaced)
+
+    def _settings(self, key: str):
+        return self._factories.get(key) or self._factories.get(None)
+
+    def _reducer(self, key: str):
+        reducer = self._reducers.get(key)
+        if reducer is None:
+            settings = self._settings(key)
+            if settings is None:
+                return None
+            reducer = self._reducers[key] = settings[0]()
+        return reducer
+
+    def apply(self, columns: Mapping[str, Columns]) -> Dict[str, Columns]:
+        """Reduce ``{key: (times, values)}``; keys with nothing to emit yet are left out."""
+        out: Dict[str, Columns] = {}
+        now = time.monotonic()
+        with self._lock:
+            for key, (times, values) in columns.items():
+                self.samples_in += len(times)
+                reducer = self._reducer(key)
+                if reducer is not None:
+                    times, values = reducer.push(times, values)
+                    if not reducer.holding:
+                        self._held_since.pop(key, None)
+                    elif key not in self._held_since:
+                        self._held_since[key] = now
+                if len(times):
+                    self.samples_out += len(times)
+                    out[key] = (times, values)
+            for key, (times, values) in self._flush_expired(now).items():
+                if key in out:
+                    times, values = out[key][0] + times, out[key][1] + values
+                out[key] = (times, values)
+        return out
+
+    def flush(self) -> Dict[str, Columns]:
+        """Emit whatever the reducers still hold."""
+        with self._lock:
+            return self._flush_reducers(self._reducers)
+
+    def flush_expired(self) -> Dict[str, Columns]:
+        """Emit what reducers have held for longer than their ``max_latency``."""
+        with self._lock:
+            return self._flush_expired(time.monotonic())
+
+    def flush_interval(self) -> Optional[float]:
+        """How often :meth:`flush_expired` should run, None when nothing is flushed by age."""
+        latencies = [latency for _, latency in self._factories.values() if latency is not None]
+        return min(latencies) / 2 if latencies else None
+
+    def _flush_expired(self, now: float) -> Dict[str, Columns]:
+        expired = {}
+        for key, since in self._held_since.items():
+            settings = self._settings(key)
+            if settings is not None and settings[1] is not None and now - since >= settings[1]:
+                expired[key] = self._reducers[key]
+        return self._flush_reducers(expired)
+
+    def _flush_reducers(self, reducers: Mapping[str, Any]) -> Dict[str, Columns]:
+        out: Dict[str, Columns] = {}
+        for key, reducer in reducers.items():
+            self._held_since.pop(key, None)
+            times, values = reducer.flush()
+            if len(times):
+                self.samples_out += len(times)
+                out[key] = (times, values)
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "samples_in": self.samples_in,
+            "samples_out": self.samples_out,
+            "ratio": self.samples_in / self.samples_out if self.samples_out else 0.0,
+        }
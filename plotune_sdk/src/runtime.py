@@ -1,8 +1,8 @@
 import asyncio
 import threading
-import multiprocessing
 import signal
 import sys
+import time
 from typing import Optional, Dict
 
 from importlib.resources import files, as_file
@@ -10,7 +10,10 @@ from PIL import Image, ImageDraw
 
 from plotune_sdk.src import PlotuneServer, CoreClient
 from plotune_sdk.src.streams import PlotuneStream
-from plotune_sdk.utils import get_logger, get_cache, API_URL, PYSTRAY_HEADLESS
+from plotune_sdk.src.stream_hub import StreamHub
+from plotune_sdk.src.workers.bootstrap import mp_context, set_start_method
+from plotune_sdk.src.workers.credentials import SharedToken, token_expiry
+from plotune_sdk.utils import get_logger, get_cache, API_URL, STREAM_URL, PYSTRAY_HEADLESS
 
 
 Icon = None
@@ -35,15 +38,27 @@ class PlotuneRuntime:
         port: int = None,
         config: Optional[dict] = None,
         tray_icon: bool = True,
+        stream_worker_mode: str = "process",
+        api_url: Optional[str] = None,
+        stream_url: Optional[str] = None,
+        stream_start_method: Optional[str] = None,
     ):
         self.ext_name = ext_name
+        # Plotune API (stream tokens) and stream service endpoints; point both at a
+        # plotune_sdk.testing.LocalBroker to run streams offline
+        self.api_url = (api_url or API_URL).rstrip("/")
+        self.stream_url = (stream_url or STREAM_URL).rstrip("/")
         self.core_url = core_url
         self.host = host
         self.port = port
         self.tray_icon_enabled = tray_icon and not PYSTRAY_HEADLESS
         self.config = config or {"id": ext_name}
         self.cache = get_cache(ext_name)
-        self._stop_event = multiprocessing.Event()
+        # how stream worker processes start: "fork", "spawn" or "forkserver" (workers
+        # forked from a server with the worker modules preloaded); None = platform default
+        if stream_start_method is not None:
+            set_start_method(stream_start_method)
+        self._stop_event = mp_context().Event()
         self.end_signal = asyncio.Event()
         self.server = PlotuneServer(self, host=self.host, port=self.port)
 
@@ -66,7 +81,18 @@ class PlotuneRuntime:
         self._streams: Dict[str, PlotuneStream] = {}
         self._stream_token_cache: Optional[str] = None
         self._stream_username_cache: Optional[str] = None
+        # current stream token, shared with every stream worker so renewals reach them
+        self.stream_credentials = SharedToken()
+        # the token is renewed stream_token_refresh_margin seconds (at most a fifth of
+        # its lifetime) before it expires; tokens without a known expiry are kept
+        self.stream_token_refresh_margin = 60.0
+        self._stream_token_expires: Optional[float] = None
+        self._stream_token_refresh_at: Optional[float] = None
+        self._token_refresh_task: Optional[asyncio.Task] = None
         self._stream_loops = []
+        # default worker mode for streams: "process", "shared" (one hub process for all streams) or "inline"
+        self.stream_worker_mode = stream_worker_mode
+        self._stream_hub: Optional[StreamHub] = None
 
     def tray(self, label: str):
         def decorator(func):
@@ -123,11 +149,18 @@ class PlotuneRuntime:
                 logger.exception("Error while stopping core client: %s", e)
 
     async def _stop_all_streams(self):
-        self._stop_event.set()
+        if self._token_refresh_task is not None:
+            self._token_refresh_task.cancel()
         if not self._streams:
+            self._stop_event.set()
             return
+        # streams stop their workers cooperatively first, so producers can send what
+        # is still queued; the stop event is for whatever is left after that
         tasks = [stream.stop() for stream in self._streams.values()]
         await asyncio.gather(*tasks, return_exceptions=True)
+        self._stop_event.set()
+        if self._stream_hub:
+            await asyncio.to_thread(self._stream_hub.stop)
         logger.info("All managed streams stopped.")
         self.end_signal.set()
 
@@ -174,17 +207,25 @@ class PlotuneRuntime:
         self._stop_tray_icon()
         sys.exit(0)
 
-    def create_stream(self, stream_name: str) -> PlotuneStream:
+    def create_stream(self, stream_name: str, worker_mode: Optional[str] = None) -> PlotuneStream:
         if stream_name in self._streams:
             return self._streams[stream_name]
 
-        stream = PlotuneStream(self, stream_name)
+        stream = PlotuneStream(self, stream_name, worker_mode=worker_mode)
         self._streams[stream_name] = stream
         logger.info(f"Stream '{stream_name}' created and managed by runtime")
         return stream
 
-    async def _get_stream_auth(self) -> tuple[str, str]:
-        if self._stream_token_cache and self._stream_username_cache:
+    def _get_stream_hub(self) -> StreamHub:
+        """Return the shared stream worker used by streams in "shared" worker mode."""
+        if self._stream_hub is None:
+            self._stream_hub = StreamHub(self._stop_event, self.stream_credentials)
+        return self._stream_hub
+
+    async def _get_stream_auth(self, force: bool = False) -> tuple[str, str]:
+        """Return the stream username and token, fetching a new token when it is due for renewal."""
+        due = self._stream_token_refresh_at is not None and time.time() >= self._stream_token_refresh_at
+        if self._stream_token_cache and self._stream_username_cache and not force and not due:
             return self._stream_username_cache, self._stream_token_cache
 
         username, license_token = await self.core_client.authenticator.get_license_token()
@@ -192,19 +233,60 @@ class PlotuneRuntime:
         logger.debug(f"{username}, {license_token}")
         for _ in range(3):
             resp = await self.core_client.session.get(
-                f"{API_URL}/auth/stream",
+                f"{self.api_url}/auth/stream",
                 headers={"Authorization": f"Bearer {license_token}"},
             )
             resp.raise_for_status()
-            token = resp.json()["token"]
+            body = resp.json()
+            token = body["token"]
             logger.debug(token)
             if token:
                 break
 
         self._stream_username_cache = username
-        self._stream_token_cache = token
+        self._set_stream_token(token, token_expiry(body))
         return username, token
 
+    def _set_stream_token(self, token: str, expires: Optional[float]):
+        """Cache a stream token, push it to every stream's workers and schedule its renewal."""
+        self._stream_token_cache = token
+        self._stream_token_expires = expires
+        self._stream_token_refresh_at = None
+        if expires is not None:
+            lifetime = max(expires - time.time(), 0.0)
+            self._stream_token_refresh_at = expires - min(self.stream_token_refresh_margin, lifetime / 5)
+            logger.info(f"Stream token valid for {lifetime:.0f}s")
+        for stream in self._streams.values():
+            stream.update_token(token)
+        self.stream_credentials.set(token)
+
+        if expires is not None and (self._token_refresh_task is None or self._token_refresh_task.done()):
+            try:
+                self._token_refresh_task = asyncio.get_running_loop().create_task(self._refresh_stream_token())
+            except RuntimeError:
+                pass
+
+    async def _refresh_stream_token(self):
+        """Renew the stream token ahead of its expiry for as long as the runtime runs."""
+        retry = 1.0
+        while not self._stop_event.is_set() and self._stream_token_refresh_at is not None:
+            wait = self._stream_token_refresh_at - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            try:
+                await self._get_stream_auth(force=True)
+                if self._stream_token_refresh_at is not None and self._stream_token_refresh_at <= time.time():
+                    # the service handed out a token that is already due, do not spin
+                    await asyncio.sleep(retry)
+                    retry = min(retry * 2, 60.0)
+                else:
+                    retry = 1.0
+            except Exception as e:
+                logger.warning(f"Stream token renewal failed, retrying in {retry:.0f}s: {e}")
+                await asyncio.sleep(retry)
+                retry = min(retry * 2, 60.0)
+
     async def _ensure_stream_running(self, stream: PlotuneStream):
         try:
             username, token = await self._get_stream_auth()
@@ -0,0 +1,295 @@
+import threading
+import time
+from collections import deque
+from multiprocessing import Queue
+from multiprocessing.process import BaseProcess
+from queue import Empty, Full
+from typing import Any, Deque, Dict, Optional
+
+from plotune_sdk.src.workers.bootstrap import mp_context, start_worker
+from plotune_sdk.src.workers.common import is_stop
+from plotune_sdk.src.workers.counters import SharedCounters
+from plotune_sdk.src.workers.credentials import SharedToken
+from plotune_sdk.src.workers.hub_worker import (
+    EXIT_ROUTE,
+    STATS_ROUTE,
+    Route,
+    RoutedQueue,
+    consumer_route,
+    producer_route,
+)
+from plotune_sdk.utils import get_logger
+
+logger = get_logger("plotune_stream")
+
+# items the hub process may have in flight to the demultiplexer before its consumers wait
+OUT_QUEUE_SIZE = 1024
+
+
+class StreamHub:
+    """Parent side of the shared stream worker: one process for every stream of a runtime.
+
+    Streams created with ``worker_mode="shared"`` subscribe their groups and producer
+    here instead of spawning their own processes. A demultiplexer thread hands
+    consumed items to each group's local queue, where the stream's usual queue
+    reader picks them up. A group whose queue is full under the "block" policy does
+    not hold back the others at first: its items wait in the group's backlog, in
+    order, while the other groups keep receiving (the backlog shows as the queue's
+    "pending" counter). The backlog holds at most the queue's capacity; once it is
+    full the demultiplexer waits for the group's reader, the hub's output queue
+    fills up and the hub's consumers wait in turn, so a stuck group costs bounded
+    memory rather than an ever-growing backlog.
+
+    The hub remembers the command that started each route, so a route whose task
+    ended (see :meth:`route_alive`) or a whole hub process that died can be started
+    again with :meth:`restart_route` and :meth:`restart`.
+    """
+
+    def __init__(self, stop_event, credentials: Optional[SharedToken] = None):
+        self.stop_event = stop_event
+        # runtime's stream token, read by every route of the hub at connect time
+        self.credentials = credentials
+        self.control_q: Queue = mp_context().Queue()
+        self.out_q: Queue = mp_context().Queue(maxsize=OUT_QUEUE_SIZE)
+        self.produce_q: Queue = mp_context().Queue()
+        self.process: Optional[BaseProcess] = None
+        self.startup_time: Optional[float] = None
+
+        self._routes: Dict[Route, Any] = {}
+        self._counters: Dict[Route, SharedCounters] = {}
+        self._commands: Dict[Route, tuple] = {}
+        # routes whose task ended by itself, with the reason reported by the hub
+        self.exited: Dict[Route, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._closing = threading.Event()
+
+    def start(self):
+        if self.process is not None:
+            return
+        started = time.perf_counter()
+        self.process = start_worker(
+            "hub",
+            (self.control_q, self.out_q, self.produce_q, self.stop_event, self.credentials),
+            daemon=True,
+        )
+        self.startup_time = time.perf_counter() - started
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._demux, name="plotune-stream-hub", daemon=True)
+            self._thread.start()
+        logger.info(f"[hub] Shared stream worker started PID={self.process.pid}")
+
+    def restart(self) -> bool:
+        """Start a new hub process if the current one died and resume every route; True if restarted."""
+        if self.process is None or self.process.is_alive():
+            return False
+        logger.warning(
+            f"[hub] Shared stream worker PID={self.process.pid} exited ({self.process.exitcode}), restarting"
+        )
+        self.process.join(0)
+        self.process = None
+        self.exited.clear()
+        self.start()
+        for cmd in self._commands.values():
+            self.control_q.put(cmd)
+        return True
+
+    def route_alive(self, route: Route) -> bool:
+        return self.is_alive() and route not in self.exited
+
+    def restart_route(self, route: Route, token: Optional[str] = None):
+        """Start a route again after its task ended, optionally with a new token."""
+        cmd = self._commands.get(route)
+        if cmd is None:
+            return
+        if token is not None:
+            cmd = self._commands[route] = self._with_token(cmd, token)
+        self.exited.pop(route, None)
+        self.control_q.put(cmd)
+
+    @staticmethod
+    def _with_token(cmd: tuple, token: str) -> tuple:
+        if cmd[0] == "consume":
+            return cmd[:4] + (token,) + cmd[5:]
+        return cmd[:3] + (token,) + cmd[4:]
+
+    def is_alive(self) -> bool:
+        return bool(self.process and self.process.is_alive())
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    # -----------------------------------------------------------------
+    # Routes
+    # -----------------------------------------------------------------
+    def subscribe(
+        self,
+        stream_name: str,
+        group: str,
+        username: str,
+        token: str,
+        local_q,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Route:
+        """Start consuming ``group`` in the hub; items are delivered into ``local_q``.
+
+        ``options`` are keyword arguments for the hub's ``consume`` task (codec, chunking).
+        """
+        route = consumer_route(stream_name, group)
+        self._routes[route] = local_q
+        self.start()
+        cmd = self._commands[route] = ("consume", stream_name, group, username, token, options or {})
+        self.control_q.put(cmd)
+        return route
+
+    def producer(
+        self,
+        stream_name: str,
+        username: str,
+        token: str,
+        options: Dict[str, Any],
+        counters: SharedCounters,
+    ) -> RoutedQueue:
+        """Start a producer in the hub and return the queue that feeds it.
+
+        Every producer of the hub shares one unbounded queue, so per-stream limits
+        from ``set_queue_limit`` do not apply here.
+        """
+        route = producer_route(stream_name)
+        self._counters[route] = counters
+        self.start()
+        cmd = self._commands[route] = ("produce", stream_name, username, token, options)
+        self.control_q.put(cmd)
+        return RoutedQueue(self.produce_q, route)
+
+    def cancel(self, route: Route):
+        """Stop a route. A consumer route's local queue still gets what the route flushes
+        on its way out, then the stop message, and is dropped after that."""
+        self._counters.pop(route, None)
+        self._commands.pop(route, None)
+        self.exited.pop(route, None)
+        if self.is_alive():
+            self.control_q.put(("cancel", route))
+            if route in self._routes:
+                return
+        self._routes.pop(route, None)
+
+    def _demux(self):
+        backlog: Dict[Route, Deque[Any]] = {}
+        while not self._closing.is_set():
+            if backlog:
+                self._drain_backlog(backlog)
+            try:
+                item = self.out_q.get(timeout=0.01 if backlog else 0.5)
+            except Empty:
+                continue
+            except (ValueError, OSError, EOFError):
+                break
+
+            if item[0] == STATS_ROUTE:
+                _, route, snapshot = item
+                counters = self._counters.get(route)
+                if counters is not None:
+                    for name, value in snapshot.items():
+                        if name != "started_at":
+                            counters.set(name, value)
+                continue
+            if item[0] == EXIT_ROUTE:
+                _, route, reason = item
+                if route in self._commands:
+                    self.exited[route] = reason
+                continue
+
+            route, payload = item
+            self._wait_for_backlog_room(backlog, route)
+            local_q = self._routes.get(route)
+            if local_q is None:
+                continue
+            pending = backlog.get(route)
+            if pending is not None:
+                # keep the route's order behind what is already waiting
+                pending.append(payload)
+                self._set_pending(local_q, len(pending))
+                continue
+            try:
+                local_q.put_nowait(payload)
+            except Full:
+                backlog[route] = deque([payload])
+                self._set_pending(local_q, 1)
+                continue
+            except Exception as exc:
+                logger.warning(f"[hub] Dropped item for {route}: {exc}")
+            if is_stop(payload):
+                self._routes.pop(route, None)
+
+    def _drain_backlog(self, backlog: Dict[Route, Deque[Any]]):
+        """Move waiting items into their group queues while there is room."""
+        for route, pending in list(backlog.items()):
+            local_q = self._routes.get(route)
+            if local_q is None:
+                del backlog[route]
+                continue
+            while pending:
+                try:
+                    local_q.put_nowait(pending[0])
+                except Full:
+                    break
+                except Exception as exc:
+                    logger.warning(f"[hub] Dropped item for {route}: {exc}")
+                if is_stop(pending.popleft()):
+                    self._routes.pop(route, None)
+            self._set_pending(local_q, len(pending))
+            if not pending:
+                del backlog[route]
+
+    def _wait_for_backlog_room(self, backlog: Dict[Route, Deque[Any]], route: Route):
+        """Wait, draining every backlog, while ``route``'s backlog holds a full queue's worth of items."""
+        while not self._closing.is_set():
+            pending = backlog.get(route)
+            local_q = self._routes.get(route)
+            if pending is None or local_q is None or len(pending) < self._backlog_limit(local_q):
+                return
+            time.sleep(0.005)
+            self._drain_backlog(backlog)
+
+    @staticmethod
+    def _backlog_limit(local_q) -> int:
+        # BoundedQueue capacity, or the maxsize of a plain queue
+        return max(getattr(local_q, "capacity", 0) or getattr(local_q, "maxsize", 0), 1)
+
+    @staticmethod
+    def _set_pending(local_q, count: int):
+        counters = getattr(local_q, "counters", None)
+        if counters is not None:
+            counters.set("pending", count)
+
+    # -----------------------------------------------------------------
+    # Stop
+    # -----------------------------------------------------------------
+    def stop(self, timeout: float = 2.0):
+        """Ask the hub process to close its sockets and exit, then clean up."""
+        if self.process is None:
+            return
+        try:
+            self.control_q.put(("stop",))
+        except Exception:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            logger.warning(f"Killing stubborn hub worker PID {self.process.pid}")
+            self.process.kill()
+            self.process.join(1)
+
+        self._closing.set()
+        for q in (self.control_q, self.out_q, self.produce_q):
+            try:
+                q.close()
+                q.join_thread()
+            except Exception:
+                pass
+        self._routes.clear()
+        self._counters.clear()
+        self._commands.clear()
+        self.exited.clear()
+        self.process = None
+        logger.info("[hub] Shared stream worker stopped")
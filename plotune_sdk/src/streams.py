@@ -1,47 +1,218 @@
 import asyncio
+import numbers
+import os
+import pickle
 import secrets
-from multiprocessing import Process, Queue
-from typing import Callable, Any, Dict, List, Optional
-from queue import Empty
+import time
+from array import array
+from multiprocessing import Queue
+from multiprocessing.process import BaseProcess
+from queue import Full
+from typing import Callable, Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
 
-from plotune_sdk.src.workers import consumer_worker_entry, producer_worker_entry
-from plotune_sdk.utils import get_logger
+from plotune_sdk.src.workers.consume_worker import consume
+from plotune_sdk.src.workers.producer_worker import producer_worker
+from plotune_sdk.src.dispatch import DISPATCH_MODES, make_dispatcher
+from plotune_sdk.src.history import StreamHistory
+from plotune_sdk.src.queue_reader import InlineQueue, QueueDrainer
+from plotune_sdk.src.reducers import ReductionStage
+from plotune_sdk.src.supervisor import WorkerHealth
+from plotune_sdk.src.workers.bootstrap import start_worker
+from plotune_sdk.src.workers.codecs import get_codec
+from plotune_sdk.src.workers.common import STOP_MESSAGE
+from plotune_sdk.src.workers.filters import KeyFilter, KeySpec
+from plotune_sdk.src.workers.operators import Operator, Pipeline
+from plotune_sdk.src.workers.hub_worker import Route
+from plotune_sdk.src.workers.credentials import SharedToken
+from plotune_sdk.src.workers.counters import (
+    SharedCounters,
+    producer_counters,
+    reader_counters,
+    summarize_producer,
+    summarize_reader,
+)
+from plotune_sdk.src.workers.bounded_queue import OVERFLOW_POLICIES, BoundedQueue, make_bounded_queue
+from plotune_sdk.utils import get_logger, get_spool_dir, STREAM_URL
 
 logger = get_logger("plotune_stream")
 
+# "process": one worker process per group and producer; "shared": the runtime's single stream hub process;
+# "inline": the consume/producer coroutines run as tasks on the runtime's event loop (for low-rate streams)
+WORKER_MODES = ("process", "shared", "inline")
+
+
+def _as_float_array(values) -> array:
+    """Convert a sequence or NumPy array to a compact ``array('d')`` that pickles as raw bytes."""
+    if isinstance(values, array) and values.typecode == "d":
+        return values
+    if hasattr(values, "__array__"):
+        import numpy as np
+
+        out = array("d")
+        out.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        return out
+    return array("d", values)
+
 
 class PlotuneStream:
     """Handles streams for Plotune SDK: manages producers, consumers, and async handlers."""
 
-    def __init__(self, runtime, stream_name: str, username: str = Optional[str]):
+    def __init__(
+        self,
+        runtime,
+        stream_name: str,
+        username: str = Optional[str],
+        worker_mode: Optional[str] = None,
+    ):
         self.runtime = runtime
         self.stream_name = stream_name
         self.username: Optional[str] = username
+        self.worker_mode = worker_mode or getattr(runtime, "stream_worker_mode", "process")
+        if self.worker_mode not in WORKER_MODES:
+            raise ValueError(f"Unknown worker mode {self.worker_mode!r}, expected one of {WORKER_MODES}")
 
         # handlers[group] = [async_handler_func, ...]
         self.handlers: Dict[str, List[Callable[[Any], Any]]] = {}
+        # _handler_options[group][func] = options passed to make_dispatcher()
+        self._handler_options: Dict[str, Dict[Callable[[Any], Any], Dict[str, Any]]] = {}
+        self._dispatchers: Dict[str, List[Any]] = {}
+        # seconds stop() waits for in-flight handler calls before cancelling them (0 = cancel at once)
+        self.handler_drain_timeout = 2.0
+        # seconds stop() gives workers to exit on their own, the producer to send what is
+        # still queued, before they are terminated; the outcome is kept in last_shutdown
+        self.shutdown_timeout = 5.0
+        self.last_shutdown: Optional[Dict[str, Any]] = None
+
+        # wire codec of the WebSocket frames: "json" (stdlib, the default), "auto" (fastest JSON
+        # backend, binary if the server accepts it), "orjson", "msgspec", "binary" or "gorilla"
+        # (compressed binary), see workers.codecs
+        self.codec = "json"
+        # consumer workers coalesce up to consume_chunk_size frames per queue put, waiting
+        # at most consume_chunk_wait seconds after the first one
+        self.consume_chunk_size = 256
+        self.consume_chunk_wait = 0.005
+
+        # "queue" (multiprocessing.Queue) or "shm" (shared-memory ring of numeric samples)
+        self.transport = "queue"
+        self.ring_capacity = 65536
+
+        # default bound for every queue of this stream (0 = unbounded), see set_queue_limit()
+        self.queue_capacity = 0
+        self.overflow_policy = "block"
+        self._queue_limits: Dict[str, Tuple[int, str]] = {}
+        self._queue_counters: Dict[str, SharedCounters] = {}
 
         # per-group state
-        self.workers: Dict[str, Process] = {}
+        self.workers: Dict[str, BaseProcess] = {}
         self.queues: Dict[str, Queue] = {}
         self._queue_tasks: Dict[str, asyncio.Task] = {}
+        self._reader_counters: Dict[str, SharedCounters] = {}
+        # routes of this stream in the runtime's stream hub (worker_mode="shared")
+        self._hub_routes: Dict[str, Route] = {}
+        # consume/producer tasks on the event loop (worker_mode="inline")
+        self._inline_tasks: Dict[str, asyncio.Task] = {}
+
+        # the supervisor restarts workers that died, and groups without messages for
+        # stall_timeout seconds (None = never), with exponential backoff between
+        # restart_backoff and restart_backoff_max seconds, see supervisor.WorkerHealth
+        self.supervise = True
+        self.supervise_interval = 1.0
+        self.restart_backoff = 0.5
+        self.restart_backoff_max = 30.0
+        self.stall_timeout: Optional[float] = None
+        self._health: Dict[str, WorkerHealth] = {}
+        self._supervisor_task: Optional[asyncio.Task] = None
+        # operators run on each group's samples inside its consumer worker, see set_pipeline()
+        self._pipelines: Dict[str, Pipeline] = {}
+        # last value and recent samples per consumed key, see enable_history()
+        self.history: Optional[StreamHistory] = None
+        self._history_group: Optional[str] = None
 
         self.producer_enabled = False
         self.producer_interval = 0.2
+        # batching mode is enabled when producer_batch_size > 1; aproduce_many blocks go as arrays either way
+        self.producer_batch_size = 1
+        self.producer_linger = 0.05
         self.producer_queue: Optional[Queue] = None
+        # per-key reducers in front of the producer queue, see set_reducer()
+        self._reduction = ReductionStage()
+        # puts of samples released by set_reducer(), kept referenced until done
+        self._held_puts: Set[asyncio.Task] = set()
+        # sends what reducers held past their max_latency for keys that went quiet
+        self._reduction_task: Optional[asyncio.Task] = None
+        # ProducerSpool arguments when the producer spools to disk, see enable_spool()
+        self.producer_spool: Optional[Dict[str, Any]] = None
+        self._producer_counters: Optional[SharedCounters] = None
         self.stream_token: Optional[str] = None
+        # token every worker reads when it (re)connects; shared with the runtime so
+        # renewed tokens reach running workers, see update_token()
+        credentials = getattr(runtime, "stream_credentials", None)
+        self.credentials = credentials if isinstance(credentials, SharedToken) else SharedToken()
 
     # -----------------------------------------------------------------
     # API for registering consume handlers
     # -----------------------------------------------------------------
-    def on_consume(self, group_name: Optional[str] = None):
-        """Decorator to register an async consume handler for a group."""
+    def on_consume(
+        self,
+        group_name: Optional[str] = None,
+        dispatch: str = "concurrent",
+        max_concurrency: int = 16,
+        keys: KeySpec = None,
+    ):
+        """Decorator to register an async consume handler for a group.
+
+        ``dispatch`` selects how messages reach the handler: "concurrent" (a task per
+        message), "inline" (one at a time, in order), "bounded" (at most
+        ``max_concurrency`` at once) or "ordered" (per-key order across
+        ``max_concurrency`` lanes).
+
+        ``keys`` subscribes the handler to a key name, a glob pattern such as
+        ``"motor.*"``, or an iterable of them. The group's worker drops samples that
+        no handler of the group subscribes to before they cross the process boundary.
+        """
+        if dispatch not in DISPATCH_MODES:
+            raise ValueError(f"Unknown dispatch mode {dispatch!r}, expected one of {DISPATCH_MODES}")
+        return self._register_handler(
+            group_name,
+            {"dispatch": dispatch, "max_concurrency": max_concurrency, "keys": KeyFilter.from_spec(keys)},
+        )
+
+    def on_consume_batch(
+        self,
+        group_name: Optional[str] = None,
+        max_size: int = 1000,
+        max_wait: float = 0.05,
+        columnar: bool = False,
+        keys: KeySpec = None,
+    ):
+        """Decorator to register an async handler that receives messages in batches.
+
+        The handler is called with a list of up to ``max_size`` messages, collected for
+        at most ``max_wait`` seconds. With ``columnar`` it gets a ``ColumnBatch`` holding
+        ``keys``, ``times`` and ``values`` columns instead. ``keys`` filters as in
+        :meth:`on_consume`.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        return self._register_handler(
+            group_name,
+            {
+                "batch": True,
+                "max_size": max_size,
+                "max_wait": max_wait,
+                "columnar": columnar,
+                "keys": KeyFilter.from_spec(keys),
+            },
+        )
+
+    def _register_handler(self, group_name: Optional[str], options: Dict[str, Any]):
         group = group_name or secrets.token_hex(4)
 
         def decorator(func: Callable[[Any], Any]):
             if not asyncio.iscoroutinefunction(func):
                 raise TypeError("Handler must be an async function (async def).")
             self.handlers.setdefault(group, []).append(func)
+            self._handler_options.setdefault(group, {})[func] = options
             logger.info(f"Registered handler for group={group}: {func}")
             return func
 
@@ -52,31 +223,249 @@ class PlotuneStream:
     # -----------------------------------------------------------------
     async def start(self, token: str):
         """Start workers for all registered groups."""
-        self.stream_token = token
+        self.update_token(token)
         if not self.username:
             raise RuntimeError("Username must be assigned before calling start()")
+        get_codec(self.codec)
 
         for group in list(self.handlers.keys()):
-            if group in self.workers:
+            if group in self.workers or group in self._hub_routes or group in self._inline_tasks:
                 logger.debug(f"Worker for group={group} already running, skipping")
                 continue
             await self._start_worker_for_group(group, token)
+        self._ensure_supervisor()
+
+    def update_token(self, token: str):
+        """Hand a renewed stream token to running workers; they use it from their next connect.
+
+        Consumers whose connection the server closes or rejects after the change
+        reconnect in place, and producers keep their queue and spool.
+        """
+        self.stream_token = token
+        self.credentials.set(token)
+
+    def set_queue_limit(self, capacity: int, policy: str = "block", group: Optional[str] = None):
+        """Bound the queue of one group (or the producer, group="@producer@"), or the stream default.
+
+        ``policy`` decides what happens when the queue is full: "block", "drop-oldest",
+        "drop-newest" or "keep-latest-per-key". Takes effect for workers started afterwards.
+
+        ``capacity`` and the queue's "puts" and "dropped" counters count queue items.
+        A consumer worker puts up to ``consume_chunk_size`` messages per item, so for
+        a consume group they count chunks; set ``consume_chunk_size`` to 1 to bound
+        and count single messages.
+
+        With ``worker_mode="shared"`` the producers of all streams share the hub's
+        queue, which cannot be bounded per stream; limiting "@producer@" raises
+        ValueError there.
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        if group == "@producer@" and self.worker_mode == "shared":
+            raise ValueError("The producer queue cannot be limited with worker_mode='shared'")
+        if group is None:
+            self.queue_capacity = capacity
+            self.overflow_policy = policy
+        else:
+            self._queue_limits[group] = (capacity, policy)
+
+    def enable_spool(
+        self,
+        directory: Optional[str] = None,
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        """Spool produced samples to disk until they are sent, so disconnects and restarts lose nothing.
+
+        Unsent samples are replayed in bulk on reconnect and when a new producer starts
+        on the same ``directory`` (by default one per stream in the extension's cache
+        directory). Past ``max_bytes`` the oldest segment is dropped. Takes effect for a
+        producer started afterwards.
+        """
+        ext_name = getattr(self.runtime, "ext_name", "plotune")
+        self.producer_spool = {
+            "directory": directory or get_spool_dir(ext_name, self.stream_name),
+            "segment_bytes": segment_bytes,
+            "max_bytes": max_bytes,
+        }
+
+    def set_pipeline(self, group: str, *operators: Operator):
+        """Run ``operators`` on every sample ``group`` consumes, inside its consumer worker.
+
+        Operators from :mod:`plotune_sdk.src.workers.operators` map, filter or
+        aggregate samples (e.g. ``Scale(0.1), Window(1.0, "mean")``) before they
+        cross to this process; handlers and the history get their output. Applies
+        from the group's next worker start. No operators removes the pipeline.
+        """
+        pipeline = Pipeline(*operators)
+        if not pipeline:
+            self._pipelines.pop(group, None)
+            return
+        if self.worker_mode != "inline":
+            try:
+                pickle.dumps(pipeline)
+            except Exception as exc:
+                raise TypeError(
+                    f"Operators must pickle to run in a worker process ({exc}); "
+                    "use module-level functions instead of lambdas or closures"
+                ) from exc
+        self._pipelines[group] = pipeline
+
+    def enable_history(self, depth: int = 1000, group: Optional[str] = None):
+        """Keep the last ``depth`` consumed samples of every key for :meth:`latest` and :meth:`window`.
+
+        Without ``group`` every consuming group feeds the history; name one group when
+        several of them receive the same data. Calling it again resets the history.
+        A group feeding the history receives every key, whatever its handlers subscribe to.
+        """
+        self.history = StreamHistory(depth)
+        self._history_group = group
+
+    def latest(self, key: str) -> Optional[Tuple[float, float]]:
+        """Most recent ``(time, value)`` consumed for ``key``, or None."""
+        if self.history is None:
+            raise RuntimeError("History is not enabled, call enable_history() first")
+        return self.history.latest(key)
+
+    def window(self, key: str, t0: Optional[float] = None, t1: Optional[float] = None) -> Tuple[Any, Any]:
+        """Views of the kept times and values of ``key`` between ``t0`` and ``t1``, oldest first.
+
+        The views share memory with the history and are overwritten as new samples
+        arrive; copy them to keep them past the current callback.
+        """
+        if self.history is None:
+            raise RuntimeError("History is not enabled, call enable_history() first")
+        return self.history.window(key, t0, t1)
 
     async def enable_producer(self):
         """Start producer worker for this stream if not already started."""
         await self._start_worker_for_producer(self.stream_token)
 
+    def set_reducer(self, kind: Optional[str], key: Optional[str] = None, **options):
+        """Reduce produced samples per key before they are queued for sending.
+
+        ``kind`` is "decimate" (``factor``), "minmax" (``bucket`` seconds) or "lttb"
+        (``ratio``, ``window``); see :mod:`plotune_sdk.src.reducers`. Without ``key`` it
+        applies to every key that has no reducer of its own. ``kind=None`` removes it.
+        Samples the replaced reducers still held are queued for sending.
+
+        ``max_latency`` (seconds, default 1.0) bounds how long a reducer holds samples
+        waiting for its bucket or window to close; ``None`` holds them until it does.
+        """
+        held = self._reduction.configure(kind, key, **options)
+        if not held:
+            return
+        coro = self._put_block(self._held_block(held))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            task = loop.create_task(coro)
+            self._held_puts.add(task)
+            task.add_done_callback(self._held_puts.discard)
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(coro, self.runtime.loop)
+        except (AttributeError, RuntimeError):
+            coro.close()
+            logger.warning(f"{self.stream_name}: samples held by the replaced reducer were dropped, no event loop")
+
+    @staticmethod
+    def _held_block(held: Mapping[str, Tuple[Any, Any]]) -> dict:
+        return {"columns": [(key, times, values) for key, (times, values) in held.items()]}
+
     async def aproduce(self, key: str, timestamp: float, value: float):
-        """Async produce a value to the stream."""
+        """Async produce a value to the stream.
+
+        Reducers only take numbers; other values are sent as they are.
+        """
+        if self._reduction and isinstance(value, numbers.Real):
+            await self.aproduce_many({key: ((timestamp,), (value,))})
+            return
+
         if not self.producer_enabled:
             await self.enable_producer()
 
         data = {"key": key, "time": timestamp, "value": value}
+        await self._producer_put(data)
+
+    async def aproduce_array(self, key: str, timestamps: Sequence[float], values: Sequence[float]):
+        """Async produce many samples of one key, given as sequences or NumPy arrays."""
+        await self.aproduce_many({key: (timestamps, values)})
+
+    async def aproduce_many(self, columns: Mapping[str, Tuple[Sequence[float], Sequence[float]]]):
+        """Async produce samples for one or more keys as a single queue item.
+
+        ``columns`` maps each key to ``(timestamps, values)``. The whole mapping is
+        handed to the producer worker in one put, so the per-sample cost is only the
+        array copy.
+        """
+        await self._put_block(self._column_block(columns))
+
+    async def _put_block(self, block: dict):
+        if not self.producer_enabled:
+            await self.enable_producer()
+
+        if self._reduction and (self._reduction_task is None or self._reduction_task.done()):
+            self._reduction_task = asyncio.create_task(self._flush_held_samples())
+        if block["columns"]:
+            await self._producer_put(block)
+
+    async def _flush_held_samples(self):
+        """Send what reducers held past their max_latency, also for keys no sample arrives for."""
+        while not self.runtime._stop_event.is_set():
+            interval = self._reduction.flush_interval()
+            if interval is None:
+                return
+            await asyncio.sleep(interval)
+            held = self._reduction.flush_expired()
+            if held:
+                await self._producer_put(self._held_block(held))
+
+    async def _producer_put(self, item):
+        """Put on the producer queue; under the "block" policy wait for room off the event loop."""
         try:
-            self.producer_queue.put_nowait(data)
+            self.producer_queue.put_nowait(item)
+        except Full:
+            try:
+                await asyncio.to_thread(self.producer_queue.put, item)
+            except Exception as exc:
+                logger.warning(f"Producer error on {self.stream_name}: {exc}")
         except Exception as exc:
             logger.warning(f"Producer error on {self.stream_name}: {exc}")
 
+    def produce_many(self, columns: Mapping[str, Tuple[Sequence[float], Sequence[float]]]):
+        """Thread-safe bulk produce from sync code.
+
+        Once the producer is running the block is put on the queue directly from the
+        calling thread, without an event-loop round-trip.
+        """
+        if self.producer_enabled and self.producer_queue is not None:
+            block = self._column_block(columns)
+            if not block["columns"]:
+                return
+            try:
+                self.producer_queue.put(block)
+            except Exception as exc:
+                logger.warning(f"Producer error on {self.stream_name}: {exc}")
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.aproduce_many(columns), self.runtime.loop)
+        except RuntimeError:
+            logger.warning(f"{self.stream_name}: produce_many() ignored because event loop is shutting down")
+
+    def _column_block(self, columns: Mapping[str, Tuple[Sequence[float], Sequence[float]]]) -> dict:
+        arrays = {}
+        for key, (timestamps, values) in columns.items():
+            times, vals = _as_float_array(timestamps), _as_float_array(values)
+            if len(times) != len(vals):
+                raise ValueError(f"{key}: got {len(times)} timestamps for {len(vals)} values")
+            arrays[key] = (times, vals)
+        if self._reduction:
+            arrays = self._reduction.apply(arrays)
+        return {"columns": [(key, times, vals) for key, (times, vals) in arrays.items()]}
+
     def produce(self, key: str, timestamp: float, value: float):
         """Thread-safe wrapper to produce a value from sync code."""
         try:
@@ -87,131 +476,567 @@ class PlotuneStream:
     # -----------------------------------------------------------------
     # Internal worker management
     # -----------------------------------------------------------------
+    def _make_queue(self, name: str, local: bool = False) -> BoundedQueue:
+        """Create the transport between this stream and one worker process, with its overflow policy.
+
+        ``local`` queues stay inside this process; the shared stream hub feeds them.
+        """
+        if self.transport not in ("queue", "shm"):
+            raise ValueError(f"Unknown stream transport: {self.transport!r}")
+        if local and self.transport == "shm":
+            raise ValueError(f"The shm transport is not available with worker_mode={self.worker_mode!r}")
+        capacity, policy = self._queue_limits.get(name, (self.queue_capacity, self.overflow_policy))
+        q = make_bounded_queue(capacity, policy, self.ring_capacity if self.transport == "shm" else None, local)
+        self._queue_counters[name] = q.counters
+        return q
+
+    def _consume_options(self, group: str) -> Dict[str, Any]:
+        """Keyword arguments for the consume coroutine of each worker mode."""
+        return {
+            "codec": self.codec,
+            "chunk_size": self.consume_chunk_size,
+            "chunk_wait": self.consume_chunk_wait,
+            "stream_url": self.stream_url,
+            "key_filter": self._group_key_filter(group),
+            "pipeline": self._pipelines.get(group),
+        }
+
+    def _group_key_filter(self, group: str) -> Optional[KeyFilter]:
+        """Keys any handler of the group subscribes to; None if one of them takes every key."""
+        if self.history is not None and self._history_group in (None, group):
+            return None
+        options = self._handler_options.get(group, {})
+        return KeyFilter.union(options.get(h, {}).get("keys") for h in self.handlers.get(group, []))
+
+    @property
+    def stream_url(self) -> str:
+        """Base URL of the stream service, taken from the runtime."""
+        return getattr(self.runtime, "stream_url", None) or STREAM_URL
+
     async def _start_worker_for_producer(self, token: str):
-        q = Queue()
-        p = Process(
-            target=producer_worker_entry,
-            args=(
+        if self.worker_mode == "shared":
+            await self._start_hub_producer(token)
+            return
+        if self.worker_mode == "inline":
+            await self._start_inline_producer(token)
+            return
+
+        q = self._make_queue("@producer@")
+        counters = producer_counters()
+        p = self._spawn_producer_process(q, counters)
+        self.producer_enabled = True
+        self.producer_queue = q
+        self._producer_counters = counters
+        self.workers["@producer@"] = p
+        self._ensure_supervisor()
+        logger.info(f"[producer] Worker started PID={p.pid}")
+
+    def _spawn_producer_process(self, q: Queue, counters: SharedCounters) -> BaseProcess:
+        return start_worker(
+            "produce",
+            (
                 self.username,
                 self.stream_name,
-                token,
+                self.credentials,
                 q,
                 self.runtime._stop_event,
                 self.producer_interval,
             ),
+            {
+                "batch_size": self.producer_batch_size,
+                "linger": self.producer_linger,
+                "counters": counters,
+                "codec": self.codec,
+                "spool": self.producer_spool,
+                "stream_url": self.stream_url,
+            },
         )
-        p.start()
+
+    async def _start_hub_producer(self, token: str):
+        """Run this stream's producer in the runtime's shared stream hub."""
+        hub = self.runtime._get_stream_hub()
+        counters = producer_counters()
+        options = {
+            "interval": self.producer_interval,
+            "batch_size": self.producer_batch_size,
+            "linger": self.producer_linger,
+            "codec": self.codec,
+            "spool": self.producer_spool,
+            "stream_url": self.stream_url,
+        }
+        self.producer_queue = hub.producer(self.stream_name, self.username, token, options, counters)
+        self.producer_enabled = True
+        self._producer_counters = counters
+        self._hub_routes["@producer@"] = self.producer_queue.route
+        self._ensure_supervisor()
+        logger.info(f"[producer] Running in shared stream worker PID={hub.pid}")
+
+    async def _start_hub_group(self, group: str, token: str):
+        """Consume a group through the runtime's shared stream hub."""
+        hub = self.runtime._get_stream_hub()
+        q = self._make_queue(group, local=True)
+        self._hub_routes[group] = hub.subscribe(
+            self.stream_name, group, self.username, token, q, self._consume_options(group)
+        )
+        self.queues[group] = q
+        self._queue_tasks[group] = asyncio.create_task(self._queue_reader(group, q))
+        logger.info(f"[{group}] Consuming in shared stream worker PID={hub.pid}")
+
+    async def _start_inline_producer(self, token: str):
+        """Run the producer coroutine as a task on the event loop instead of in a process."""
+        q = self._make_queue("@producer@", local=True)
+        counters = producer_counters()
+        self._inline_tasks["@producer@"] = self._inline_producer_task(q, counters)
         self.producer_enabled = True
         self.producer_queue = q
-        self.workers["@producer@"] = p
-        logger.info(f"[producer] Worker started PID={p.pid}")
+        self._producer_counters = counters
+        self._ensure_supervisor()
+        logger.info("[producer] Running in-process")
 
-    async def _start_worker_for_group(self, group: str, token: str):
-        """Start a consumer worker for a group and its async queue reader."""
-        q = Queue()
-        p = Process(
-            target=consumer_worker_entry,
-            args=(
+    def _inline_producer_task(self, q, counters: SharedCounters) -> asyncio.Task:
+        return asyncio.create_task(
+            producer_worker(
+                self.username,
+                self.stream_name,
+                self.credentials,
+                q,
+                self.runtime._stop_event,
+                self.producer_interval,
+                batch_size=self.producer_batch_size,
+                linger=self.producer_linger,
+                counters=counters,
+                codec=self.codec,
+                spool=self.producer_spool,
+                stream_url=self.stream_url,
+            )
+        )
+
+    async def _start_inline_group(self, group: str, token: str):
+        """Run the consume coroutine as a task on the event loop; messages reach handlers directly."""
+        q = InlineQueue(group, self._make_deliver(group))
+        self.queues[group] = q
+        self._inline_tasks[group] = self._inline_consume_task(group, q)
+        logger.info(f"[{group}] Consuming in-process")
+
+    def _inline_consume_task(self, group: str, q) -> asyncio.Task:
+        return asyncio.create_task(
+            consume(
                 self.username,
                 self.stream_name,
                 group,
-                token,
+                self.credentials,
                 q,
                 self.runtime._stop_event,
-            ),
-            daemon=True,
+                **self._consume_options(group),
+            )
         )
-        p.start()
 
+    async def _start_worker_for_group(self, group: str, token: str):
+        """Start a consumer worker for a group and its async queue reader."""
+        if self.worker_mode == "shared":
+            await self._start_hub_group(group, token)
+            return
+        if self.worker_mode == "inline":
+            await self._start_inline_group(group, token)
+            return
+
+        q = self._make_queue(group)
+        p = self._spawn_group_process(group, q)
         self.queues[group] = q
         self.workers[group] = p
         task = asyncio.create_task(self._queue_reader(group, q))
         self._queue_tasks[group] = task
         logger.info(f"[{group}] Worker started PID={p.pid}")
 
+    def _spawn_group_process(self, group: str, q: Queue) -> BaseProcess:
+        return start_worker(
+            "consume",
+            (
+                self.username,
+                self.stream_name,
+                group,
+                self.credentials,
+                q,
+                self.runtime._stop_event,
+            ),
+            self._consume_options(group),
+            daemon=True,
+        )
+
+    def _make_deliver(self, group: str) -> Callable[[List[Any], float], None]:
+        """Build the group's dispatchers and return the callback that feeds them consumed items."""
+        options = self._handler_options.get(group, {})
+        dispatchers = [make_dispatcher(group, h, options.get(h, {})) for h in self.handlers.get(group, [])]
+        self._dispatchers[group] = dispatchers
+        # the worker filters by the union of the keys; each handler still gets only its own
+        routes = [(d, options.get(h, {}).get("keys")) for d, h in zip(dispatchers, self.handlers.get(group, []))]
+        counters = self._reader_counters.setdefault(group, reader_counters())
+
+        def deliver(items: List[Any], received_at: float):
+            history = self.history
+            if self._history_group not in (None, group):
+                history = None
+
+            latency = time.perf_counter() - received_at
+            counters.add("batches")
+            counters.set("last_dispatch_latency", latency)
+            counters.add("total_dispatch_latency", latency)
+            counters.max("max_dispatch_latency", latency)
+
+            for item in items:
+                for message in self._expand_consumed(item):
+                    counters.add("messages")
+                    if history is not None:
+                        history.add_message(message)
+                    for dispatcher, keys in routes:
+                        if keys is not None and not keys.passes(message.get("payload")):
+                            continue
+                        try:
+                            dispatcher.submit(message)
+                        except Exception as exc:
+                            logger.exception(f"[{group}] Handler error: {exc}")
+
+        return deliver
+
     async def _queue_reader(self, group: str, q: Queue):
-        """Async queue reader: dispatches messages to registered handlers."""
-        handlers = self.handlers.get(group, [])
+        """Async queue reader: a blocking drain thread wakes the loop, messages go to registered handlers.
+
+        Runs until cancelled, or until the stop message queued behind the group's last
+        items at stop() has been read and everything before it delivered.
+        """
+        drainer = QueueDrainer(group, q, asyncio.get_running_loop(), self._make_deliver(group))
+        drainer.start()
         logger.info(f"[{group}] Queue reader started")
 
-        while True:
-            try:
-                item = await asyncio.to_thread(q.get_nowait)
-            except asyncio.CancelledError:
-                logger.info(f"[{group}] Queue reader cancelled")
-                break
-            except (Empty, ValueError, OSError, EOFError):
-                await asyncio.sleep(0.1)
-                continue
-            except Exception as exc:
-                logger.exception(f"[{group}] Unexpected queue error: {exc}")
-                await asyncio.sleep(0.5)
-                continue
+        try:
+            await drainer.done
+        except asyncio.CancelledError:
+            logger.info(f"[{group}] Queue reader cancelled")
+        finally:
+            drainer.stop()
+
+        logger.info(f"[{group}] Queue reader stopped")
 
-            for h in handlers:
+    @staticmethod
+    def _expand_consumed(item) -> List[dict]:
+        """Turn a transport item into the handler messages it carries."""
+        if isinstance(item, dict) and "chunk" in item:
+            return [message for sub in item["chunk"] for message in PlotuneStream._expand_consumed(sub)]
+        if isinstance(item, dict) and "records" in item:
+            return [
+                {"type": "message", "payload": {"key": key, "time": t, "value": v}} for key, t, v in item["records"]
+            ]
+        return [item]
+
+    # -----------------------------------------------------------------
+    # Supervision
+    # -----------------------------------------------------------------
+    def _ensure_supervisor(self):
+        if self.supervise and (self._supervisor_task is None or self._supervisor_task.done()):
+            self._supervisor_task = asyncio.create_task(self._supervise())
+
+    async def _supervise(self):
+        """Check every worker each supervise_interval seconds and restart the ones that are down."""
+        while not self.runtime._stop_event.is_set():
+            await asyncio.sleep(self.supervise_interval)
+            names = list(self.workers) + list(self._inline_tasks) + list(self._hub_routes)
+            for name in names:
                 try:
-                    asyncio.create_task(h(item))
+                    await self._check_worker(name)
                 except Exception as exc:
-                    logger.exception(f"[{group}] Handler error: {exc}")
-                except asyncio.CancelledError:
-                    logger.info(f"[{group}] Queue reader cancelled gracefully")
-                    break
+                    logger.exception(f"[{name}] Supervisor error: {exc}")
 
-        logger.info(f"[{group}] Queue reader stopped")
+    def _worker_alive(self, name: str) -> bool:
+        if name in self._hub_routes:
+            return self.runtime._get_stream_hub().route_alive(self._hub_routes[name])
+        if name in self._inline_tasks:
+            return not self._inline_tasks[name].done()
+        p = self.workers.get(name)
+        return bool(p and p.is_alive())
+
+    def _worker_progress(self, name: str) -> Optional[float]:
+        """Messages delivered so far by a group, for stall detection; producers are only checked for liveness."""
+        counters = self._reader_counters.get(name)
+        return counters.get("messages") if counters is not None and name != "@producer@" else None
+
+    async def _check_worker(self, name: str):
+        health = self._health.get(name)
+        if health is None:
+            stall_timeout = self.stall_timeout if name != "@producer@" else None
+            health = self._health[name] = WorkerHealth(self.restart_backoff, self.restart_backoff_max, stall_timeout)
+        progress = self._worker_progress(name)
+        alive = self._worker_alive(name)
+        if health.down_since is not None and health.last_reason == "exited" and alive:
+            # brought back from elsewhere, e.g. a restarted stream hub
+            health.restarted(progress)
+            return
+        if not health.observe(alive, progress) or self.runtime._stop_event.is_set():
+            return
+
+        logger.warning(f"[{name}] Worker {health.last_reason}, restarting (restart #{health.restarts + 1})")
+        await self._restart_worker(name)
+        health.restarted(progress)
+
+    async def _restart_worker(self, name: str):
+        """Start a worker again on its existing queue, so nothing queued is lost."""
+        token = self.stream_token
+        if name in self._hub_routes:
+            hub = self.runtime._get_stream_hub()
+            if not hub.restart():
+                hub.restart_route(self._hub_routes[name], token)
+            return
+
+        if name in self._inline_tasks:
+            task = self._inline_tasks[name]
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            if name == "@producer@":
+                self._inline_tasks[name] = self._inline_producer_task(self.producer_queue, self._producer_counters)
+            else:
+                self._inline_tasks[name] = self._inline_consume_task(name, self.queues[name])
+            return
+
+        proc = self.workers[name]
+        if proc.is_alive():
+            proc.terminate()
+        await asyncio.to_thread(proc.join, 1)
+        if proc.is_alive():
+            proc.kill()
+            await asyncio.to_thread(proc.join, 1)
+        if name == "@producer@":
+            self.workers[name] = self._spawn_producer_process(self.producer_queue, self._producer_counters)
+        else:
+            self.workers[name] = self._spawn_group_process(name, self.queues[name])
+        logger.info(f"[{name}] Worker restarted PID={self.workers[name].pid}")
 
     # -----------------------------------------------------------------
     # Stop/cleanup
     # -----------------------------------------------------------------
     async def stop(self):
-        """Stop all workers and cleanup queues/tasks."""
+        """Stop all workers and cleanup queues/tasks.
+
+        Shutdown is cooperative. Consumers are cancelled and close their sockets; their
+        queue readers keep delivering until a stop message behind the last thing each
+        consumer flushed on its way out (what a pipeline held) has been read. In-flight
+        handler calls then get ``handler_drain_timeout`` seconds. The producer gets a
+        stop message behind everything still queued and exits once that is sent.
+        Workers still running ``shutdown_timeout`` seconds after stop() began are
+        terminated, then killed. ``last_shutdown`` records how it went.
+        """
         logger.info("Stopping stream workers...")
+        started = time.monotonic()
+        deadline = started + self.shutdown_timeout
 
-        # Cancel queue reader tasks
+        if self._supervisor_task is not None:
+            self._supervisor_task.cancel()
+            await asyncio.gather(self._supervisor_task, return_exceptions=True)
+            self._supervisor_task = None
+
+        # Consumers first: in-process consumers and shared hub routes are cancelled,
+        # worker processes get SIGTERM; each closes its socket and flushes what it holds
+        for name, task in self._inline_tasks.items():
+            if name != "@producer@":
+                task.cancel()
+        hub = self.runtime._get_stream_hub() if self._hub_routes else None
+        for name, route in self._hub_routes.items():
+            if name != "@producer@":
+                hub.cancel(route)
+        for name, proc in self.workers.items():
+            if name != "@producer@" and proc.is_alive():
+                proc.terminate()
+        await self._drain_consumers(deadline)
         for task in self._queue_tasks.values():
             task.cancel()
 
+        # Let in-flight handler calls finish (up to handler_drain_timeout), cancel the rest;
+        # what they produce still goes out below
+        dispatchers = [d for group in self._dispatchers.values() for d in group]
+        if dispatchers:
+            await asyncio.gather(
+                *(d.close(self.handler_drain_timeout) for d in dispatchers),
+                return_exceptions=True,
+            )
+        self._dispatchers.clear()
+
+        flushed = await self._stop_producer(deadline)
+
+        # Whatever did not exit by the deadline is terminated, then killed
+        forced = await self._force_stop(deadline)
+
+        if hub is not None:
+            # the runtime stops the hub process itself
+            if "@producer@" in self._hub_routes:
+                hub.cancel(self._hub_routes["@producer@"])
+            self._hub_routes.clear()
+
         # Close queues
-        for q in self.queues.values():
+        queues = list(self.queues.values())
+        if self.producer_queue is not None:
+            queues.append(self.producer_queue)
+        for q in queues:
             try:
                 q.close()
-                q.join_thread()
+                if "@producer@" not in forced:
+                    # a killed producer may have left the pipe full
+                    q.join_thread()
             except Exception:
                 pass
 
-        # Terminate worker processes
-        for proc in self.workers.values():
-            if proc.is_alive():
-                proc.terminate()
-
-        # Short wait then force kill remaining workers
-        await asyncio.sleep(0.5)
-        for proc in self.workers.values():
-            if proc.is_alive():
-                logger.warning(f"Killing stubborn worker PID {proc.pid}")
-                proc.kill()
-            proc.join(timeout=1)
-
         # Wait for async tasks to finish
-        if self._queue_tasks:
-            await asyncio.gather(*self._queue_tasks.values(), return_exceptions=True)
+        tasks = list(self._queue_tasks.values()) + list(self._inline_tasks.values())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
         self.workers.clear()
         self.queues.clear()
         self._queue_tasks.clear()
+        self._inline_tasks.clear()
+        self._health.clear()
+        self.producer_enabled = False
+        self.producer_queue = None
+
+        self.last_shutdown = {
+            "duration": time.monotonic() - started,
+            "producer_flushed": flushed,
+            "forced": forced,
+        }
+        logger.info(
+            f"All stream workers fully stopped in {self.last_shutdown['duration']:.3f}s"
+            + (f", forced: {', '.join(forced)}" if forced else "")
+        )
 
-        logger.info("All stream workers fully stopped.")
+    async def _drain_consumers(self, deadline: float):
+        """Wait until the stopping consumers exited and their readers delivered everything they queued.
+
+        A worker process's queue gets the stop message here once the process is gone;
+        the hub sends it for its routes. Readers not done by ``deadline`` are left to be cancelled.
+        """
+        inline = [task for name, task in self._inline_tasks.items() if name != "@producer@"]
+        if inline:
+            await asyncio.wait(inline, timeout=max(deadline - time.monotonic(), 0.0))
+
+        # groups whose queue gets a stop message, so their reader ends by itself
+        stopping = [name for name in self._hub_routes if name != "@producer@" and self._worker_alive(name)]
+        procs = {name: proc for name, proc in self.workers.items() if name != "@producer@"}
+        while any(proc.is_alive() for proc in procs.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        for name, proc in procs.items():
+            q = self.queues.get(name)
+            if proc.is_alive() or q is None:
+                continue
+            try:
+                q.put_stop(max(deadline - time.monotonic(), 0.0))
+            except Exception as exc:
+                logger.warning(f"[{name}] Could not queue the stop message: {exc}")
+                continue
+            stopping.append(name)
+
+        readers = [self._queue_tasks[name] for name in stopping if name in self._queue_tasks]
+        if readers:
+            await asyncio.wait(readers, timeout=max(deadline - time.monotonic(), 0.0))
+
+    async def _stop_producer(self, deadline: float) -> bool:
+        """Send the producer its stop message and wait until it exits; True if it sent everything."""
+        if self.producer_queue is None:
+            return True
+
+        # Hand samples still held by reducers to the producer before it goes away
+        if self._reduction_task is not None:
+            self._reduction_task.cancel()
+            await asyncio.gather(self._reduction_task, return_exceptions=True)
+            self._reduction_task = None
+        if self._held_puts:
+            await asyncio.gather(*self._held_puts, return_exceptions=True)
+        if self._reduction:
+            held = self._reduction.flush()
+            if held:
+                await self._producer_put(self._held_block(held))
+
+        if not self._worker_alive("@producer@"):
+            return False
+        q = self.producer_queue
+        put_stop = getattr(q, "put_stop", None)
+        try:
+            if put_stop is not None:
+                await asyncio.to_thread(put_stop, max(deadline - time.monotonic(), 0.0))
+            else:
+                await asyncio.to_thread(q.put, dict(STOP_MESSAGE), True, max(deadline - time.monotonic(), 0.0))
+        except Exception as exc:
+            logger.warning(f"[producer] Could not queue the stop message: {exc}")
+            return False
+
+        while self._worker_alive("@producer@"):
+            if time.monotonic() >= deadline:
+                logger.warning(f"[producer] Did not drain its queue within {self.shutdown_timeout}s")
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def _force_stop(self, deadline: float) -> List[str]:
+        """Wait for worker processes until ``deadline``, then terminate and kill; return the names forced."""
+        forced = []
+        task = self._inline_tasks.get("@producer@")
+        if task is not None and not task.done():
+            task.cancel()
+            forced.append("@producer@")
+        route = self._hub_routes.get("@producer@")
+        if route is not None and self.runtime._get_stream_hub().route_alive(route):
+            forced.append("@producer@")  # cancelled with the other routes
+
+        while any(p.is_alive() for p in self.workers.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        stubborn = {name: p for name, p in self.workers.items() if p.is_alive()}
+        for name, proc in stubborn.items():
+            forced.append(name)
+            proc.terminate()
+        grace = time.monotonic() + 0.5
+        while any(p.is_alive() for p in stubborn.values()) and time.monotonic() < grace:
+            await asyncio.sleep(0.01)
+        for proc in self.workers.values():
+            if proc.is_alive():
+                logger.warning(f"Killing stubborn worker PID {proc.pid}")
+                proc.kill()
+            await asyncio.to_thread(proc.join, 1)
+        return forced
 
     # -----------------------------------------------------------------
     # Optional helpers
     # -----------------------------------------------------------------
     def is_running(self, group: Optional[str] = None) -> bool:
         """Check if workers are alive."""
+        hub_alive = bool(self._hub_routes) and self.runtime._get_stream_hub().is_alive()
         if group:
+            if group in self._hub_routes:
+                return hub_alive
+            if group in self._inline_tasks:
+                return not self._inline_tasks[group].done()
             p = self.workers.get(group)
             return bool(p and p.is_alive())
-        return any(p.is_alive() for p in self.workers.values() if p)
+        inline_alive = any(not t.done() for t in self._inline_tasks.values())
+        return hub_alive or inline_alive or any(p.is_alive() for p in self.workers.values() if p)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of stream counters, including per-batch producer figures."""
+        stats: Dict[str, Any] = {"stream": self.stream_name}
+        if self._producer_counters:
+            stats["producer"] = summarize_producer(self._producer_counters.snapshot())
+        stats["groups"] = {group: summarize_reader(c.snapshot()) for group, c in self._reader_counters.items()}
+        for group, dispatchers in self._dispatchers.items():
+            stats["groups"].setdefault(group, {})["handlers"] = {d.func.__name__: d.stats() for d in dispatchers}
+        stats["queues"] = {name: c.snapshot() for name, c in self._queue_counters.items()}
+        if self._reduction:
+            stats["reduction"] = self._reduction.stats()
+        if self._health:
+            stats["supervisor"] = {name: health.stats() for name, health in self._health.items()}
+        if self.last_shutdown is not None:
+            stats["shutdown"] = self.last_shutdown
+        return stats
 
     def get_worker_pid(self, group: str) -> Optional[int]:
         """Get the PID of a worker process for a group."""
+        if group in self._hub_routes:
+            return self.runtime._get_stream_hub().pid
+        if group in self._inline_tasks:
+            return os.getpid()
         p = self.workers.get(group)
         return p.pid if p else None
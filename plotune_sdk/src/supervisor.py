@@ -0,0 +1,80 @@
+import time
+from typing import Any, Dict, Optional
+
+
+class WorkerHealth:
+    """Liveness, stall and restart bookkeeping of one supervised stream worker.
+
+    The stream's supervisor calls :meth:`observe` on every check. Once a worker is
+    found dead, or alive but without progress for ``stall_timeout`` seconds, it is
+    marked down and a restart becomes due after an exponential backoff:
+    ``backoff``, ``2 * backoff``, ... up to ``backoff_max`` for consecutive failures.
+    A worker that stays up for ``backoff_max`` seconds starts over at ``backoff``.
+    """
+
+    def __init__(self, backoff: float = 0.5, backoff_max: float = 30.0, stall_timeout: Optional[float] = None):
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.stall_timeout = stall_timeout
+
+        self.restarts = 0
+        self.stalls = 0
+        self.failures = 0
+        self.downtime = 0.0
+        self.down_since: Optional[float] = None
+        self.next_restart = 0.0
+        self.last_reason: Optional[str] = None
+        self._up_since = time.monotonic()
+        self._progress: Any = None
+        self._progress_at = self._up_since
+
+    def observe(self, alive: bool, progress: Any = None, now: Optional[float] = None) -> bool:
+        """Record the worker's state; returns True when it should be restarted now."""
+        now = time.monotonic() if now is None else now
+        if self.down_since is None:
+            reason = None
+            if not alive:
+                reason = "exited"
+            elif progress != self._progress:
+                self._progress, self._progress_at = progress, now
+            elif self.stall_timeout and now - self._progress_at > self.stall_timeout:
+                reason = "stalled"
+                self.stalls += 1
+
+            if reason is None:
+                if self.failures and now - self._up_since >= self.backoff_max:
+                    self.failures = 0
+                return False
+            self.down_since = now
+            self.last_reason = reason
+            self.next_restart = now + self.delay()
+        return now >= self.next_restart
+
+    def delay(self) -> float:
+        """Backoff before the next restart, given the consecutive failures so far."""
+        if not self.failures:
+            return 0.0
+        return min(self.backoff_max, self.backoff * 2 ** (self.failures - 1))
+
+    def restarted(self, progress: Any = None, now: Optional[float] = None):
+        """Record a restart; the worker counts as up again from here."""
+        now = time.monotonic() if now is None else now
+        self.restarts += 1
+        self.failures += 1
+        if self.down_since is not None:
+            self.downtime += now - self.down_since
+        self.down_since = None
+        self._up_since = now
+        self._progress, self._progress_at = progress, now
+
+    def stats(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.monotonic() if now is None else now
+        down_for = now - self.down_since if self.down_since is not None else 0.0
+        return {
+            "up": self.down_since is None,
+            "restarts": self.restarts,
+            "stalls": self.stalls,
+            "downtime": self.downtime + down_for,
+            "next_restart_in": max(0.0, self.next_restart - now) if self.down_since is not None else 0.0,
+            "last_reason": self.last_reason,
+        }
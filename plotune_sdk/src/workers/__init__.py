@@ -1,6 +1,21 @@
-"""Worker entry points for Plotune SDK streams."""
+"""Worker entry points for Plotune SDK streams.
 
-from .consume_worker import worker_entry as consumer_worker_entry
-from .producer_worker import worker_entry as producer_worker_entry
+Worker processes start through :mod:`.bootstrap`, which imports only the module
+of the entry point they run; the names below are imported on first use.
+"""
 
-__all__ = ["consumer_worker_entry", "producer_worker_entry"]
+_EXPORTS = {
+    "consumer_worker_entry": ".consume_worker",
+    "producer_worker_entry": ".producer_worker",
+    "hub_worker_entry": ".hub_worker",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), "worker_entry")
@@ -0,0 +1,74 @@
+"""Start method and entry point of stream worker processes.
+
+Worker processes run :func:`worker_main`, which imports only the module of the
+entry point it is asked for. Together with the lazy package ``__init__`` modules
+this keeps a spawned worker to aiohttp, a codec and its worker module instead of
+the runtime's FastAPI, uvicorn, httpx, PIL and pystray imports.
+
+Every process, queue, event and lock shared with workers is created from
+:func:`mp_context`, so they match the start method chosen with
+:func:`set_start_method`. With "forkserver" the server imports
+:data:`WORKER_PRELOAD` once and each worker is forked from it already loaded.
+"""
+
+import importlib
+import multiprocessing
+from multiprocessing.context import BaseContext
+from multiprocessing.process import BaseProcess
+from typing import Any, Iterable, Optional
+
+# entry point name -> "module:function"
+ENTRIES = {
+    "consume": "plotune_sdk.src.workers.consume_worker:worker_entry",
+    "produce": "plotune_sdk.src.workers.producer_worker:worker_entry",
+    "hub": "plotune_sdk.src.workers.hub_worker:worker_entry",
+}
+
+# modules a forkserver imports before forking workers
+WORKER_PRELOAD = [
+    "aiohttp",
+    "plotune_sdk.src.workers.consume_worker",
+    "plotune_sdk.src.workers.producer_worker",
+    "plotune_sdk.src.workers.hub_worker",
+]
+
+_context: Optional[BaseContext] = None
+
+
+def set_start_method(method: Optional[str] = None, preload: Optional[Iterable[str]] = None) -> BaseContext:
+    """Choose how stream worker processes are started; None is the platform default.
+
+    Call it before any stream starts: queues and events created under another start
+    method cannot be passed to the new workers. ``preload`` replaces
+    :data:`WORKER_PRELOAD` for "forkserver".
+    """
+    global _context
+    if method is not None and method not in multiprocessing.get_all_start_methods():
+        raise ValueError(
+            f"Start method {method!r} is not available here, expected one of {multiprocessing.get_all_start_methods()}"
+        )
+    context = multiprocessing.get_context(method)
+    if context.get_start_method() == "forkserver":
+        context.set_forkserver_preload(list(WORKER_PRELOAD if preload is None else preload))
+    _context = context
+    return context
+
+
+def mp_context() -> BaseContext:
+    """Multiprocessing context of stream workers, see :func:`set_start_method`."""
+    return _context if _context is not None else multiprocessing.get_context()
+
+
+def worker_main(entry: str, *args: Any, **kwargs: Any):
+    """Process target of every stream worker: import the ``entry`` point's module and run it."""
+    module, func = ENTRIES[entry].split(":")
+    getattr(importlib.import_module(module), func)(*args, **kwargs)
+
+
+def start_worker(
+    entry: str, args: tuple = (), kwargs: Optional[dict] = None, daemon: Optional[bool] = None
+) -> BaseProcess:
+    """Start a worker process running the ``entry`` point with ``args`` and ``kwargs``."""
+    process = mp_context().Process(target=worker_main, args=(entry, *args), kwargs=kwargs or {}, daemon=daemon)
+    process.start()
+    return process
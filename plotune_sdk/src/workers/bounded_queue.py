@@ -0,0 +1,287 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from queue import Full
+from typing import Any, List, Optional, Tuple
+
+from .bootstrap import mp_context
+from .common import STOP_MESSAGE
+from .counters import SharedCounters
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest", "keep-latest-per-key")
+
+QUEUE_FIELDS = (
+    "capacity",
+    "puts",
+    "dropped",
+    "high_water",
+    "pending",
+    "rejected",
+)
+
+
+def queue_counters(capacity: int) -> SharedCounters:
+    """Create the counter set for one bounded stream queue."""
+    counters = SharedCounters(QUEUE_FIELDS)
+    counters.set("capacity", capacity)
+    return counters
+
+
+def _latest_per_key(item) -> List[Tuple[str, Any]]:
+    """Reduce a queue item to its newest sample per key, as ``(key, item)`` pairs."""
+    if isinstance(item, dict) and "chunk" in item:
+        latest = {}
+        for sub in item["chunk"]:
+            latest.update(_latest_per_key(sub))
+        return list(latest.items())
+    if isinstance(item, dict) and "columns" in item:
+        return [
+            (key, {"key": key, "time": times[-1], "value": values[-1]})
+            for key, times, values in item["columns"]
+            if len(times)
+        ]
+    if isinstance(item, dict) and "records" in item:
+        latest = {}
+        for key, t, v in item["records"]:
+            latest[key] = {"key": key, "time": t, "value": v}
+        return list(latest.items())
+    data = item.get("payload", item) if isinstance(item, dict) and item.get("type") == "message" else item
+    key = data.get("key") if isinstance(data, dict) else None
+    return [(key, item)]
+
+
+class BoundedQueue:
+    """Put-side overflow policy around a stream transport queue.
+
+    Policies when the queue is full:
+
+    * ``block`` — wait for space (the default, same as a plain bounded queue).
+    * ``drop-oldest`` — discard the oldest queued item to make room.
+    * ``drop-newest`` — discard the item being put.
+    * ``keep-latest-per-key`` — park the newest sample per key and flush it as soon
+      as there is room, so a slow reader sees current values rather than a backlog.
+      Parked samples are retried on every put and, while any are parked, every
+      ``flush_interval`` seconds from a background thread, so the last value of
+      each key is delivered even when puts stop.
+
+    ``capacity`` of 0 leaves the queue unbounded but still records high-water marks.
+    Capacity, puts and drops count queue items; a consumer worker puts a chunk of
+    messages per item. Messages the transport cannot carry (a non-numeric sample on
+    the shm ring) are counted one by one as "rejected" by the worker.
+    Drops, puts and the high-water mark are kept in shared counters so the stream
+    can report them even when the putting side is a worker process.
+    """
+
+    def __init__(
+        self,
+        q,
+        capacity: int = 0,
+        policy: str = "block",
+        counters: Optional[SharedCounters] = None,
+        flush_interval: float = 0.02,
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        self.q = q
+        self.capacity = capacity
+        self.policy = policy
+        self.counters = counters or queue_counters(capacity)
+        self.flush_interval = flush_interval
+        self._pending: "OrderedDict[Any, Any]" = OrderedDict()
+        self._init_flusher()
+
+    def _init_flusher(self):
+        # parked samples are shared by the putting threads and the flusher thread
+        self._lock = threading.RLock()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+    # -----------------------------------------------------------------
+    # Pickling (process arguments): the lock and flusher thread stay behind
+    # -----------------------------------------------------------------
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("_lock", "_flusher", "_closed"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_flusher()
+
+    # -----------------------------------------------------------------
+    # Put side
+    # -----------------------------------------------------------------
+    def put(self, item, block: bool = True, timeout: Optional[float] = None):
+        if self.policy == "keep-latest-per-key":
+            with self._lock:
+                self._put_latest(item)
+            return
+
+        try:
+            self.q.put(item, block and self.policy == "block", timeout)
+        except Full:
+            self._overflow(item)
+            return
+        self._record_put()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def _put_latest(self, item):
+        if self._pending:
+            self.flush()
+        if self._pending:
+            self._park(item)
+            return
+        try:
+            self.q.put_nowait(item)
+        except Full:
+            self._park(item)
+            return
+        self._record_put()
+
+    def _overflow(self, item):
+        if self.policy == "block":
+            raise Full
+        if self.policy == "drop-newest":
+            self.counters.add("dropped")
+            return
+        if self.policy == "keep-latest-per-key":
+            self._park(item)
+            return
+
+        # drop-oldest
+        try:
+            self.q.get_nowait()
+            self.counters.add("dropped")
+        except Exception:
+            pass
+        try:
+            self.q.put_nowait(item)
+            self._record_put()
+        except Full:
+            self.counters.add("dropped")
+
+    def _park(self, item):
+        for key, latest in _latest_per_key(item):
+            if key in self._pending:
+                # an older parked sample for this key is superseded
+                self.counters.add("dropped")
+                del self._pending[key]
+            self._pending[key] = latest
+        self.counters.set("pending", len(self._pending))
+        if self._flusher is None and self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_parked, name="bounded-queue-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_parked(self):
+        """Flusher thread: retry parked samples until none are left, the queue is closed or fails."""
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                try:
+                    if not self._closed:
+                        self.flush()
+                except Exception:
+                    # the transport is gone; what is parked cannot be delivered
+                    self.counters.add("dropped", len(self._pending))
+                    self._pending.clear()
+                    self.counters.set("pending", 0)
+                if self._closed or not self._pending:
+                    self._flusher = None
+                    return
+
+    def flush(self):
+        """Move parked samples into the queue while there is room."""
+        with self._lock:
+            while self._pending:
+                key, item = next(iter(self._pending.items()))
+                try:
+                    self.q.put_nowait(item)
+                except Full:
+                    break
+                del self._pending[key]
+                self._record_put()
+            self.counters.set("pending", len(self._pending))
+
+    def put_stop(self, timeout: Optional[float] = None):
+        """Queue the stop message behind everything queued or parked, whatever the policy.
+
+        Waits for room up to ``timeout`` seconds and raises ``Full`` after that.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.flush()
+            if not self._pending:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise Full
+            time.sleep(0.005)
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        self.q.put(dict(STOP_MESSAGE), True, remaining)
+
+    def _record_put(self):
+        self.counters.add("puts")
+        try:
+            self.counters.max("high_water", self.q.qsize())
+        except NotImplementedError:
+            # multiprocessing.Queue.qsize() is unavailable on macOS
+            pass
+
+    # -----------------------------------------------------------------
+    # Get side and cleanup delegate to the transport
+    # -----------------------------------------------------------------
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        return self.q.get(block, timeout)
+
+    def get_nowait(self):
+        return self.q.get_nowait()
+
+    def qsize(self) -> int:
+        return self.q.qsize()
+
+    def empty(self) -> bool:
+        return self.q.empty()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        # thread-local queues (shared worker mode) have nothing to close
+        if hasattr(self.q, "close"):
+            self.q.close()
+
+    def join_thread(self):
+        if hasattr(self.q, "join_thread"):
+            self.q.join_thread()
+
+    def cancel_join_thread(self):
+        if hasattr(self.q, "cancel_join_thread"):
+            self.q.cancel_join_thread()
+
+
+def make_bounded_queue(
+    capacity: int = 0,
+    policy: str = "block",
+    ring_capacity: Optional[int] = None,
+    local: bool = False,
+) -> BoundedQueue:
+    """Create a bounded queue over a ``multiprocessing.Queue``.
+
+    With ``ring_capacity`` a shared-memory ring is used instead, and with ``local`` a
+    thread-only ``queue.Queue`` for items that never leave this process.
+    """
+    if local:
+        q = queue.Queue(maxsize=capacity)
+    elif ring_capacity:
+        from .shm_ring import ShmRingQueue
+
+        if policy == "drop-oldest":
+            # only the reader may advance a ring's tail
+            raise ValueError("The drop-oldest policy is not supported by the shm transport")
+        # the ring's slot count is the bound
+        q = ShmRingQueue(capacity or ring_capacity)
+    else:
+        q = mp_context().Queue(maxsize=capacity)
+    return BoundedQueue(q, capacity, policy)
@@ -0,0 +1,448 @@
+"""Wire codecs for stream WebSocket frames.
+
+JSON codecs (``json``, ``orjson``, ``msgspec``) all produce text frames in the same
+format, so they can be swapped freely. The ``binary`` codec packs key/time/value
+records into a compact binary frame, and the opt-in ``gorilla`` codec compresses
+them per key. The server has to agree to a binary format, which the workers
+negotiate with a WebSocket subprotocol. The binary codecs only carry numbers; a
+batch with other values is sent as a JSON text frame instead (see :func:`encode_frame`).
+The default, ``json``, keeps the stdlib JSON wire format; ``auto`` opts in to the
+fastest installed JSON backend and binary frames where the server accepts them.
+
+Binary frame layout (little endian)::
+
+    uint16 key_count, uint32 record_count
+    key_count x (uint16 length, utf-8 bytes)
+    record_count x (uint16 key_index, float64 time, float64 value)
+
+Gorilla frame layout (little endian header, big endian bit streams)::
+
+    uint16 key_count
+    key_count x (uint16 length, utf-8 bytes, uint32 count, uint8 time_mode,
+                 uint32 stream_bytes, bit stream)
+
+Timestamps are rounded to whole microseconds and delta-of-delta encoded
+(``time_mode`` 0); a key with a non-finite time falls back to XOR encoding its
+times like the values (``time_mode`` 1). Values are XOR encoded against the
+previous value, as in Facebook's Gorilla paper, and round-trip exactly.
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+CODECS = ("auto", "json", "orjson", "msgspec", "binary", "gorilla")
+
+JSON_SUBPROTOCOL = "plotune.json"
+BINARY_SUBPROTOCOL = "plotune.binary.v1"
+GORILLA_SUBPROTOCOL = "plotune.gorilla.v1"
+
+_HEADER = struct.Struct("<HI")
+_KEY_LEN = struct.Struct("<H")
+_RECORD = struct.Struct("<Hdd")
+
+Record = Tuple[str, float, float]
+
+
+class JsonCodec:
+    """Standard library ``json``; always available."""
+
+    name = "json"
+    binary = False
+
+    def encode(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def encode(self, obj: Any) -> str:
+        # numpy scalars and arrays come from aproduce_array(); orjson handles them natively
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+def _builtin(obj: Any) -> Any:
+    """msgspec fallback for NumPy scalars and arrays."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+
+class MsgspecCodec(JsonCodec):
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder(enc_hook=_builtin)
+        self._decoder = msgspec.json.Decoder()
+
+    def encode(self, obj: Any) -> str:
+        return self._encoder.encode(obj).decode()
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        return self._decoder.decode(data)
+
+
+class BinaryCodec:
+    """Compact key/time/value record frames: 18 bytes per sample plus each key once per frame."""
+
+    name = "binary"
+    binary = True
+
+    def encode(self, obj: Any) -> bytes:
+        samples = obj if isinstance(obj, list) else [obj]
+        return self.encode_records([(s["key"], s["time"], s["value"]) for s in samples])
+
+    def encode_records(self, records: List[Record]) -> bytes:
+        index = {}
+        body = bytearray()
+        for key, t, v in records:
+            i = index.setdefault(key, len(index))
+            body += _RECORD.pack(i, t, v)
+
+        head = bytearray(_HEADER.pack(len(index), len(records)))
+        for key in index:
+            raw = str(key).encode("utf-8")
+            head += _KEY_LEN.pack(len(raw))
+            head += raw
+        return bytes(head + body)
+
+    def decode(self, data: bytes) -> List[dict]:
+        return [{"key": key, "time": t, "value": v} for key, t, v in self.decode_records(data)]
+
+    def decode_records(self, data: bytes) -> List[Record]:
+        key_count, record_count = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        keys = []
+        for _ in range(key_count):
+            (length,) = _KEY_LEN.unpack_from(data, offset)
+            offset += _KEY_LEN.size
+            keys.append(bytes(data[offset : offset + length]).decode("utf-8"))
+            offset += length
+        return [(keys[i], t, v) for i, t, v in _RECORD.iter_unpack(data[offset : offset + record_count * _RECORD.size])]
+
+
+# -----------------------------------------------------------------
+# Gorilla compression
+# -----------------------------------------------------------------
+_GORILLA_KEY = struct.Struct("<IBI")
+_DOUBLE = struct.Struct(">d")
+_U64 = struct.Struct(">Q")
+# keeps every delta-of-delta within 64 bits
+_MAX_MICROS = 1 << 60
+
+# delta-of-delta buckets: (prefix, prefix bits, value bits)
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+class _BitWriter:
+    def __init__(self):
+        self.buf = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, bits: int):
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.buf.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self) -> bytes:
+        if self._bits:
+            return bytes(self.buf) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self.buf)
+
+
+class _BitReader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def read(self, bits: int) -> int:
+        start = self.pos >> 3
+        end = (self.pos + bits + 7) >> 3
+        chunk = int.from_bytes(self.data[start:end], "big")
+        shift = (end - start) * 8 - (self.pos & 7) - bits
+        self.pos += bits
+        return (chunk >> shift) & ((1 << bits) - 1)
+
+
+def _float_bits(x: float) -> int:
+    return _U64.unpack(_DOUBLE.pack(x))[0]
+
+
+def _bits_float(b: int) -> float:
+    return _DOUBLE.unpack(_U64.pack(b))[0]
+
+
+class _XorWriter:
+    """Gorilla XOR encoding of a float sequence."""
+
+    def __init__(self, out: _BitWriter):
+        self.out = out
+        self.prev: Optional[int] = None
+        self.leading = 65
+        self.trailing = 0
+
+    def write(self, x: float):
+        bits = _float_bits(x)
+        out = self.out
+        if self.prev is None:
+            out.write(bits, 64)
+            self.prev = bits
+            return
+        xor = bits ^ self.prev
+        self.prev = bits
+        if xor == 0:
+            out.write(0, 1)
+            return
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if leading >= self.leading and trailing >= self.trailing:
+            # fits in the previous meaningful-bit window
+            out.write(0b10, 2)
+            out.write(xor >> self.trailing, 64 - self.leading - self.trailing)
+            return
+        meaningful = 64 - leading - trailing
+        out.write(0b11, 2)
+        out.write(leading, 5)
+        out.write(meaningful & 0x3F, 6)  # 64 is stored as 0
+        out.write(xor >> trailing, meaningful)
+        self.leading, self.trailing = leading, trailing
+
+
+class _XorReader:
+    def __init__(self, src: _BitReader):
+        self.src = src
+        self.prev: Optional[int] = None
+        self.leading = 0
+        self.trailing = 0
+
+    def read(self) -> float:
+        src = self.src
+        if self.prev is None:
+            self.prev = src.read(64)
+            return _bits_float(self.prev)
+        if src.read(1) == 0:
+            return _bits_float(self.prev)
+        if src.read(1) == 1:
+            self.leading = src.read(5)
+            meaningful = src.read(6) or 64
+            self.trailing = 64 - self.leading - meaningful
+        meaningful = 64 - self.leading - self.trailing
+        self.prev ^= src.read(meaningful) << self.trailing
+        return _bits_float(self.prev)
+
+
+def _write_dod(out: _BitWriter, dod: int):
+    if dod == 0:
+        out.write(0, 1)
+        return
+    for prefix, prefix_bits, value_bits in _DOD_BUCKETS:
+        if -(1 << (value_bits - 1)) <= dod < (1 << (value_bits - 1)):
+            out.write(prefix, prefix_bits)
+            out.write(dod, value_bits)
+            return
+    out.write(0b1111, 4)
+    out.write(dod, 64)
+
+
+def _read_dod(src: _BitReader) -> int:
+    if src.read(1) == 0:
+        return 0
+    for _, _, value_bits in _DOD_BUCKETS:
+        if src.read(1) == 0:
+            return _signed(src.read(value_bits), value_bits)
+    return _signed(src.read(64), 64)
+
+
+def _signed(value: int, bits: int) -> int:
+    return value - (1 << bits) if value >= (1 << (bits - 1)) else value
+
+
+def _as_micros(times: Sequence[float]) -> Optional[List[int]]:
+    """Times rounded to integer microseconds, or None if one is not finite or out of range."""
+    micros = []
+    for t in times:
+        try:
+            m = round(t * 1_000_000)
+        except (OverflowError, ValueError):  # inf / nan
+            return None
+        if abs(m) >= _MAX_MICROS:
+            return None
+        micros.append(m)
+    return micros
+
+
+class GorillaCodec:
+    """Per-key compressed frames: delta-of-delta timestamps and XOR-encoded values.
+
+    Regular timestamps cost about one bit per sample and repeated or slowly changing
+    values a few bits, against 18 bytes per sample for the plain ``binary`` codec.
+    Times are kept to the microsecond, values exactly. Records of one key keep their
+    order; a frame lists its keys one after another.
+    """
+
+    name = "gorilla"
+    binary = True
+
+    def encode(self, obj: Any) -> bytes:
+        samples = obj if isinstance(obj, list) else [obj]
+        return self.encode_records([(s["key"], s["time"], s["value"]) for s in samples])
+
+    def encode_records(self, records: List[Record]) -> bytes:
+        by_key: Dict[str, Tuple[List[float], List[float]]] = {}
+        for key, t, v in records:
+            times, values = by_key.setdefault(key, ([], []))
+            # no float() here: a non-numeric value must fail rather than be parsed
+            times.append(t)
+            values.append(v)
+        return self.encode_columns(by_key)
+
+    def encode_columns(self, columns: Dict[str, Tuple[Sequence[float], Sequence[float]]]) -> bytes:
+        """Encode ``{key: (times, values)}`` without building per-sample records; empty keys are left out."""
+        columns = {key: column for key, column in columns.items() if len(column[0])}
+        frame = bytearray(_KEY_LEN.pack(len(columns)))
+        for key, (times, values) in columns.items():
+            out = _BitWriter()
+            micros = _as_micros(times)
+            if micros is not None:
+                prev, delta = micros[0], 0
+                out.write(prev, 64)
+                for i in range(1, len(micros)):
+                    d = micros[i] - prev
+                    if i == 1:
+                        out.write(d, 64)
+                    else:
+                        _write_dod(out, d - delta)
+                    prev, delta = micros[i], d
+            else:
+                xt = _XorWriter(out)
+                for t in times:
+                    xt.write(t)
+            xv = _XorWriter(out)
+            for v in values:
+                xv.write(v)
+            stream = out.getvalue()
+            raw = str(key).encode("utf-8")
+            frame += _KEY_LEN.pack(len(raw)) + raw
+            frame += _GORILLA_KEY.pack(len(times), 0 if micros is not None else 1, len(stream))
+            frame += stream
+        return bytes(frame)
+
+    def decode(self, data: bytes) -> List[dict]:
+        return [{"key": key, "time": t, "value": v} for key, t, v in self.decode_records(data)]
+
+    def decode_records(self, data: bytes) -> List[Record]:
+        records: List[Record] = []
+        (key_count,) = _KEY_LEN.unpack_from(data, 0)
+        offset = _KEY_LEN.size
+        for _ in range(key_count):
+            (length,) = _KEY_LEN.unpack_from(data, offset)
+            offset += _KEY_LEN.size
+            key = bytes(data[offset : offset + length]).decode("utf-8")
+            offset += length
+            count, time_mode, size = _GORILLA_KEY.unpack_from(data, offset)
+            offset += _GORILLA_KEY.size
+            src = _BitReader(bytes(data[offset : offset + size]))
+            offset += size
+
+            times: List[float] = []
+            if time_mode == 0:
+                prev = _signed(src.read(64), 64)
+                times.append(prev / 1_000_000)
+                delta = 0
+                for i in range(1, count):
+                    delta = _signed(src.read(64), 64) if i == 1 else delta + _read_dod(src)
+                    prev += delta
+                    times.append(prev / 1_000_000)
+            else:
+                xt = _XorReader(src)
+                times = [xt.read() for _ in range(count)]
+            xv = _XorReader(src)
+            records.extend((key, t, xv.read()) for t in times)
+        return records
+
+
+def encode_frame(wire, obj: Any) -> Union[str, bytes]:
+    """Encode ``obj`` for one frame with the negotiated codec.
+
+    A batch a binary codec cannot carry (a non-numeric time or value) is encoded as
+    JSON instead and goes as a text frame, which consumers decode on any connection.
+    """
+    if not wire.binary:
+        return wire.encode(obj)
+    try:
+        return wire.encode(obj)
+    except (TypeError, ValueError, struct.error):
+        return fastest_json_codec().encode(obj)
+
+
+def fastest_json_codec() -> JsonCodec:
+    """The fastest installed JSON backend (see benchmarks/bench_codecs.py)."""
+    if msgspec is not None:
+        return MsgspecCodec()
+    if orjson is not None:
+        return OrjsonCodec()
+    return JsonCodec()
+
+
+def get_codec(name: str):
+    """Return a codec instance by name; ``auto`` picks the fastest installed JSON backend."""
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec {name!r}, expected one of {CODECS}")
+    if name == "auto":
+        return fastest_json_codec()
+    if name == "orjson" and orjson is None:
+        raise ValueError("The orjson codec requires the 'orjson' package")
+    if name == "msgspec" and msgspec is None:
+        raise ValueError("The msgspec codec requires the 'msgspec' package")
+    return {
+        "json": JsonCodec,
+        "orjson": OrjsonCodec,
+        "msgspec": MsgspecCodec,
+        "binary": BinaryCodec,
+        "gorilla": GorillaCodec,
+    }[name]()
+
+
+def offered_subprotocols(name: str) -> Tuple[str, ...]:
+    """WebSocket subprotocols a worker offers for a configured codec, in order of preference."""
+    if name == "gorilla":
+        return (GORILLA_SUBPROTOCOL, BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL)
+    if name in ("auto", "binary"):
+        return (BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL)
+    return (JSON_SUBPROTOCOL,)
+
+
+def negotiated_codec(name: str, accepted: Optional[str]):
+    """Pick the codec once the server has answered the subprotocol offer.
+
+    Servers that do not take part in negotiation accept none of the offered
+    subprotocols; they get JSON, which every server speaks.
+    """
+    if accepted == GORILLA_SUBPROTOCOL:
+        return GorillaCodec()
+    if accepted == BINARY_SUBPROTOCOL:
+        return BinaryCodec()
+    if name in ("auto", "binary", "gorilla"):
+        return fastest_json_codec()
+    return get_codec(name)
@@ -0,0 +1,53 @@
+import asyncio
+import signal
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Optional
+
+from aiohttp import ClientSession
+
+# queued behind everything a stream produced; the producer worker sends what came
+# before it, closes its socket and returns
+STOP_MESSAGE = {"type": "stop"}
+
+
+def is_stop(item: Any) -> bool:
+    return isinstance(item, dict) and item.get("type") == "stop"
+
+
+@asynccontextmanager
+async def session_scope(session: Optional[ClientSession] = None) -> AsyncIterator[ClientSession]:
+    """Yield ``session`` if one is shared with the caller, otherwise a private session closed on exit."""
+    if session is not None:
+        yield session
+        return
+    async with ClientSession() as own:
+        yield own
+
+
+def run_worker(coro: Awaitable[Any]) -> bool:
+    """Run a worker coroutine in a worker process; SIGTERM cancels it instead of killing the process.
+
+    The worker then leaves its ``async with`` blocks as usual, so sockets are closed
+    with a close frame. Where the loop cannot handle signals (Windows) SIGTERM keeps
+    its default, immediate effect. Returns True if the worker was stopped by SIGTERM.
+    """
+    terminated = []
+
+    async def main():
+        task = asyncio.ensure_future(coro)
+
+        def terminate():
+            terminated.append(True)
+            task.cancel()
+
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, terminate)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+    return bool(terminated)
@@ -1,66 +1,259 @@
 import asyncio
-import json
-from aiohttp import ClientSession, WSMsgType
+from aiohttp import ClientSession, WSMsgType, WSServerHandshakeError
 from multiprocessing import Queue, Event as MpEvent
+from typing import Dict, List, Optional
 
+from plotune_sdk.utils.constants import STREAM_URL, websocket_url
 
-def build_url(username: str, stream_name: str, group: str) -> str:
+from .codecs import fastest_json_codec, negotiated_codec, offered_subprotocols
+from .common import run_worker, session_scope
+from .credentials import TokenSource, current_token, token_version, wait_for_new_token
+from .filters import KeyFilter
+from .operators import Pipeline, Record, sample_fields, sample_record
+
+
+def build_url(username: str, stream_name: str, group: str, stream_url: str = STREAM_URL) -> str:
     """Build the WebSocket URL for a specific user, stream, and group."""
-    return f"wss://stream.plotune.net/ws/consumer/{username}/{stream_name}/{group}"
+    return f"{websocket_url(stream_url)}/ws/consumer/{username}/{stream_name}/{group}"
 
 
 async def _put_to_queue_async(q: Queue, item):
     """Put an item into a multiprocessing queue asynchronously."""
+    if getattr(q, "on_loop", False):
+        # in-process consumer: the sink delivers on this loop and never blocks
+        q.put(item)
+        return
     loop = asyncio.get_running_loop()
     await loop.run_in_executor(None, q.put, item)
 
 
+# seconds a consumer rejected by the server waits for the runtime to renew its token
+AUTH_WAIT = 10.0
+
+
+def _count_rejected(q, count: int):
+    counters = getattr(q, "counters", None)
+    if counters is not None and count:
+        counters.add("rejected", count)
+
+
+def chunk_item(chunk: List[dict]) -> dict:
+    """Wrap consumed items for one queue put; a single item is put as is."""
+    return chunk[0] if len(chunk) == 1 else {"chunk": chunk}
+
+
+def pipeline_item(records: List[Record], fields: Dict[str, dict]) -> dict:
+    """Queue item for pipeline output: a record block, or messages when a key's samples carry other fields.
+
+    ``fields`` holds the other payload fields of the latest sample of each key; every
+    output sample of that key gets them back.
+    """
+    if not any(record[0] in fields for record in records):
+        return {"records": records}
+    return chunk_item(
+        [
+            {"type": "message", "payload": {"key": key, "time": t, "value": v, **fields.get(key, {})}}
+            for key, t, v in records
+        ]
+    )
+
+
 async def consume(
     username: str,
     stream_name: str,
     group: str,
-    token: str,
+    token: TokenSource,
     q: Queue,
     stop_event,
+    session: Optional[ClientSession] = None,
+    codec: str = "json",
+    chunk_size: int = 256,
+    chunk_wait: float = 0.005,
+    stream_url: str = STREAM_URL,
+    key_filter: Optional[KeyFilter] = None,
+    pipeline: Optional[Pipeline] = None,
 ):
-    """Consume messages from the WebSocket and push them into the queue."""
-    url = build_url(username, stream_name, group)
+    """Consume messages from the WebSocket and push them into the queue.
+
+    ``session`` lets several consumers share one connection pool; by default the
+    worker opens its own. ``codec`` names the wire codec (see ``codecs.CODECS``);
+    binary frames are only used if the server accepts the binary subprotocol.
+
+    Decoded frames are coalesced into chunks of up to ``chunk_size`` items, put as
+    ``{"chunk": [...]}`` in one executor hop and one pickle. A chunk is flushed at
+    most ``chunk_wait`` seconds after its first item arrived, which bounds the added
+    latency. Sinks on the caller's own loop get every item at once.
+
+    With ``key_filter`` only samples of the subscribed keys are put on the queue;
+    the rest are dropped here, before they cost a pickle and a pipe write.
+    ``pipeline`` (see ``operators``) then transforms the remaining samples here, and
+    only its output is put on the queue; what it holds is flushed when the worker stops.
+    Fields of a text sample other than key, time and value are carried over to the
+    pipeline output of its key (see :func:`pipeline_item`).
+
+    ``token`` is a string or a :class:`SharedToken` read at every connect. When the
+    runtime renews a shared token, a connection that the server closes or rejects is
+    reopened in place with the new one, keeping the worker and its queue. Other
+    connection errors propagate unless ``stop_event`` is set, so a failed consumer
+    ends visibly and the stream's supervisor can restart it.
+    """
+    if getattr(q, "on_loop", False):
+        chunk_size = 1
+    url = build_url(username, stream_name, group, stream_url)
+    loop = asyncio.get_running_loop()
+    chunk: List[dict] = []
+    deadline = 0.0
+    # other payload fields of the latest text sample per key, for the pipeline output
+    fields: Dict[str, dict] = {}
+
+    async def flush():
+        nonlocal chunk
+        if not chunk:
+            return
+        items, chunk = chunk, []
+        try:
+            await _put_to_queue_async(q, chunk_item(items))
+        except (TypeError, ValueError):
+            # the ring transport only carries numeric key/time/value samples and
+            # rejects a whole chunk for one bad item: put the good ones separately
+            rejected = 1 if len(items) == 1 else 0
+            for item in items if len(items) > 1 else ():
+                try:
+                    await _put_to_queue_async(q, item)
+                except (TypeError, ValueError):
+                    rejected += 1
+            _count_rejected(q, rejected)
+
+    async def finish():
+        if pipeline:
+            held = pipeline.flush()
+            if held:
+                chunk.append(pipeline_item(held, fields))
+        await flush()
+
+    cancelled = False
     try:
-        async with ClientSession() as session:
-            async with session.ws_connect(url, headers={"Authorization": f"Bearer {token}"}) as ws:
-                while not stop_event.is_set():
-                    try:
-                        msg = await asyncio.wait_for(ws.receive(), timeout=0.5)
-                    except asyncio.CancelledError:
-                        break
-                    except asyncio.TimeoutError:
-                        continue
-
-                    if msg.type == WSMsgType.TEXT:
-                        data = json.loads(msg.data)
-                        await _put_to_queue_async(q, {"type": "message", "payload": data})
-                    elif msg.type in (
-                        WSMsgType.CLOSED,
-                        WSMsgType.CLOSING,
-                        WSMsgType.ERROR,
-                    ):
-                        break
-    except Exception:
-        if not stop_event.is_set():
-            pass
+        while True:
+            version = token_version(token)
+            try:
+                async with session_scope(session) as client:
+                    async with client.ws_connect(
+                        url,
+                        headers={"Authorization": f"Bearer {current_token(token)}"},
+                        protocols=offered_subprotocols(codec),
+                    ) as ws:
+                        wire = negotiated_codec(codec, ws.protocol)
+                        text = fastest_json_codec() if wire.binary else wire
+                        while not stop_event.is_set():
+                            timeout = deadline - loop.time() if chunk else 0.5
+                            if timeout <= 0:
+                                await flush()
+                                continue
+                            try:
+                                msg = await asyncio.wait_for(ws.receive(), timeout=timeout)
+                            except asyncio.CancelledError:
+                                cancelled = True
+                                break
+                            except asyncio.TimeoutError:
+                                if chunk:
+                                    await flush()
+                                elif hasattr(q, "flush"):
+                                    # idle: release samples parked by a keep-latest-per-key queue
+                                    q.flush()
+                                continue
+
+                            if msg.type == WSMsgType.TEXT:
+                                payload = text.decode(msg.data)
+                                if key_filter is not None and not key_filter.passes(payload):
+                                    continue
+                                record = sample_record(payload) if pipeline else None
+                                if record is not None:
+                                    extra = sample_fields(payload)
+                                    if extra:
+                                        fields[record[0]] = extra
+                                    else:
+                                        fields.pop(record[0], None)
+                                    records = pipeline.process([record])
+                                    if not records:
+                                        continue
+                                    item = pipeline_item(records, fields)
+                                else:
+                                    item = {"type": "message", "payload": payload}
+                            elif msg.type == WSMsgType.BINARY and wire.binary:
+                                # the stream expands records into messages
+                                records = wire.decode_records(msg.data)
+                                if key_filter is not None:
+                                    records = key_filter.records(records)
+                                if pipeline and records:
+                                    records = pipeline.process(records)
+                                if not records:
+                                    continue
+                                item = {"records": records}
+                            elif msg.type in (
+                                WSMsgType.CLOSED,
+                                WSMsgType.CLOSING,
+                                WSMsgType.ERROR,
+                            ):
+                                break
+                            else:
+                                continue
+
+                            if not chunk:
+                                deadline = loop.time() + chunk_wait
+                            chunk.append(item)
+                            if len(chunk) >= chunk_size:
+                                await flush()
+                        await flush()
+            except Exception as exc:
+                if stop_event.is_set():
+                    return
+                rejected = isinstance(exc, WSServerHandshakeError) and exc.status in (401, 403)
+                if token_version(token) != version or (
+                    rejected and await wait_for_new_token(token, version, AUTH_WAIT, stop_event)
+                ):
+                    continue
+                # let the supervisor see why the consumer ended
+                raise
+            if cancelled or stop_event.is_set() or token_version(token) == version:
+                return
+            # closed by the server after a token renewal: reconnect with the new token
     finally:
-        pass
+        # also when cancelled at another await: what the pipeline holds still goes out
+        await finish()
 
 
 def worker_entry(
     username: str,
     stream_name: str,
     group: str,
-    token: str,
+    token: TokenSource,
     q: Queue,
     stop_event=None,
+    codec: str = "json",
+    chunk_size: int = 256,
+    chunk_wait: float = 0.005,
+    stream_url: str = STREAM_URL,
+    key_filter: Optional[KeyFilter] = None,
+    pipeline: Optional[Pipeline] = None,
 ):
     """Entry point for the worker process."""
     if stop_event is None:
         stop_event = MpEvent()
-    asyncio.run(consume(username, stream_name, group, token, q, stop_event))
+    # the stream keeps reading until this worker exits, so what it flushes on the way
+    # out (on SIGTERM too) reaches the queue before the process ends
+    run_worker(
+        consume(
+            username,
+            stream_name,
+            group,
+            token,
+            q,
+            stop_event,
+            codec=codec,
+            chunk_size=chunk_size,
+            chunk_wait=chunk_wait,
+            stream_url=stream_url,
+            key_filter=key_filter,
+            pipeline=pipeline,
+        )
+    )
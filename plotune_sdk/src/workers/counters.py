@@ -0,0 +1,104 @@
+import time
+from multiprocessing import RawArray
+from typing import Dict, Iterable
+
+
+class SharedCounters:
+    """Named float counters shared between a worker process and the stream that started it.
+
+    The backing ``RawArray`` is handed to the worker as a process argument, so the worker
+    writes and the parent reads without any IPC round-trip. Each counter set has a single
+    writer, which is why no lock is needed.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = tuple(fields)
+        self._index = {name: i for i, name in enumerate(self.fields)}
+        self._values = RawArray("d", len(self.fields))
+
+    def add(self, name: str, amount: float = 1.0):
+        self._values[self._index[name]] += amount
+
+    def set(self, name: str, value: float):
+        self._values[self._index[name]] = value
+
+    def max(self, name: str, value: float):
+        i = self._index[name]
+        if value > self._values[i]:
+            self._values[i] = value
+
+    def get(self, name: str) -> float:
+        return self._values[self._index[name]]
+
+    def reset(self):
+        for i in range(len(self.fields)):
+            self._values[i] = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return a copy of all counters as a plain dict."""
+        return dict(zip(self.fields, self._values[:]))
+
+
+PRODUCER_FIELDS = (
+    "started_at",
+    "batches",
+    "samples",
+    "bytes",
+    "last_batch_size",
+    "max_batch_size",
+    "last_fill_time",
+    "last_send_latency",
+    "total_send_latency",
+    "max_send_latency",
+    "send_errors",
+    "reconnects",
+    "spooled",
+    "spool_replayed",
+    "spool_dropped",
+    "spool_rejected",
+)
+
+
+def producer_counters() -> SharedCounters:
+    """Create the counter set written by a producer worker."""
+    counters = SharedCounters(PRODUCER_FIELDS)
+    counters.set("started_at", time.time())
+    return counters
+
+
+def summarize_producer(snapshot: Dict[str, float]) -> Dict[str, float]:
+    """Add derived throughput and latency figures to a producer counter snapshot."""
+    summary = dict(snapshot)
+    batches = snapshot.get("batches", 0.0)
+    elapsed = max(time.time() - snapshot.get("started_at", 0.0), 1e-9)
+    summary["avg_batch_size"] = snapshot.get("samples", 0.0) / batches if batches else 0.0
+    summary["avg_send_latency"] = snapshot.get("total_send_latency", 0.0) / batches if batches else 0.0
+    summary["samples_per_sec"] = snapshot.get("samples", 0.0) / elapsed
+    return summary
+
+
+READER_FIELDS = (
+    "started_at",
+    "batches",
+    "messages",
+    "last_dispatch_latency",
+    "total_dispatch_latency",
+    "max_dispatch_latency",
+)
+
+
+def reader_counters() -> SharedCounters:
+    """Create the counter set kept by a stream's queue reader."""
+    counters = SharedCounters(READER_FIELDS)
+    counters.set("started_at", time.time())
+    return counters
+
+
+def summarize_reader(snapshot: Dict[str, float]) -> Dict[str, float]:
+    """Add derived rate and latency figures to a queue reader counter snapshot."""
+    summary = dict(snapshot)
+    batches = snapshot.get("batches", 0.0)
+    elapsed = max(time.time() - snapshot.get("started_at", 0.0), 1e-9)
+    summary["avg_dispatch_latency"] = snapshot.get("total_dispatch_latency", 0.0) / batches if batches else 0.0
+    summary["messages_per_sec"] = snapshot.get("messages", 0.0) / elapsed
+    return summary
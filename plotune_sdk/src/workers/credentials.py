@@ -0,0 +1,91 @@
+import asyncio
+import base64
+import json
+import time
+from multiprocessing import RawArray, RawValue
+from typing import Any, Dict, Optional, Union
+
+from .bootstrap import mp_context
+
+
+class SharedToken:
+    """Stream token that the runtime can replace while workers are running.
+
+    The token lives in shared memory, so worker processes that received this object
+    as a process argument (and tasks in the same process) read the current value
+    every time they connect. :attr:`version` grows with each :meth:`set`, which lets
+    a worker tell whether a rejected or closed connection is worth retrying.
+    """
+
+    def __init__(self, token: str = "", capacity: int = 8192):
+        self._buf = RawArray("c", capacity)
+        self._length = RawValue("i", 0)
+        self._version = RawValue("L", 0)
+        self._lock = mp_context().Lock()
+        if token:
+            self.set(token)
+
+    def set(self, token: str):
+        raw = token.encode("utf-8")
+        if len(raw) > len(self._buf):
+            raise ValueError(f"Token of {len(raw)} bytes does not fit in {len(self._buf)}")
+        with self._lock:
+            if raw == self._buf[: self._length.value]:
+                return
+            self._buf[: len(raw)] = raw
+            self._length.value = len(raw)
+            self._version.value += 1
+
+    def get(self) -> str:
+        with self._lock:
+            return self._buf[: self._length.value].decode("utf-8")
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+
+TokenSource = Union[str, SharedToken]
+
+
+def current_token(token: TokenSource) -> str:
+    return token if isinstance(token, str) else token.get()
+
+
+def token_version(token: TokenSource) -> int:
+    return 0 if isinstance(token, str) else token.version
+
+
+async def wait_for_new_token(token: TokenSource, version: int, timeout: float, stop_event, poll: float = 0.1) -> bool:
+    """Wait up to ``timeout`` seconds for ``token`` to move past ``version``; False if it did not."""
+    if isinstance(token, str):
+        return False
+    deadline = time.monotonic() + timeout
+    while token.version == version:
+        if stop_event.is_set() or time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(poll)
+    return True
+
+
+def token_expiry(response: Dict[str, Any], now: Optional[float] = None) -> Optional[float]:
+    """Expiry (epoch seconds) of a stream token from an ``/auth/stream`` response.
+
+    Uses ``expires_at`` or ``expires_in`` when the service sends them, else the
+    ``exp`` claim if the token is a JWT. None when the expiry is unknown.
+    """
+    now = time.time() if now is None else now
+    if response.get("expires_at") is not None:
+        return float(response["expires_at"])
+    if response.get("expires_in") is not None:
+        return now + float(response["expires_in"])
+    token = response.get("token") or ""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+    except (ValueError, AttributeError):
+        return None
+    return float(exp) if exp is not None else None
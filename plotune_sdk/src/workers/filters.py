@@ -0,0 +1,72 @@
+import fnmatch
+import re
+from typing import Any, Iterable, List, Optional, Union
+
+KeySpec = Union[str, Iterable[str], None]
+
+_WILDCARDS = re.compile(r"[*?\[]")
+
+
+class KeyFilter:
+    """Set of keys and glob patterns (``"temp.*"``) a consume handler subscribes to.
+
+    Plain names are looked up in a set; patterns are compiled into one regular
+    expression. Filters pickle, so the consumer worker can apply them before
+    putting items on the queue.
+    """
+
+    def __init__(self, keys: Iterable[str] = (), patterns: Iterable[str] = ()):
+        self.keys = frozenset(keys)
+        self.patterns = tuple(sorted(set(patterns)))
+        self._regex = re.compile("|".join(fnmatch.translate(p) for p in self.patterns)) if self.patterns else None
+
+    @classmethod
+    def from_spec(cls, spec: KeySpec) -> Optional["KeyFilter"]:
+        """Build a filter from a key name, glob pattern or iterable of them; None means every key."""
+        if spec is None:
+            return None
+        entries = [spec] if isinstance(spec, str) else list(spec)
+        if not all(isinstance(entry, str) for entry in entries):
+            raise TypeError("keys must be a key name, a glob pattern or an iterable of them")
+        return cls(
+            keys=[e for e in entries if not _WILDCARDS.search(e)],
+            patterns=[e for e in entries if _WILDCARDS.search(e)],
+        )
+
+    @classmethod
+    def union(cls, filters: Iterable[Optional["KeyFilter"]]) -> Optional["KeyFilter"]:
+        """Filter passing what any of ``filters`` passes; None if one of them passes everything."""
+        keys: set = set()
+        patterns: set = set()
+        for f in filters:
+            if f is None:
+                return None
+            keys |= f.keys
+            patterns.update(f.patterns)
+        return cls(keys, patterns)
+
+    def matches(self, key: Any) -> bool:
+        if key in self.keys:
+            return True
+        return self._regex is not None and isinstance(key, str) and self._regex.match(key) is not None
+
+    def passes(self, payload: Any) -> bool:
+        """Whether a decoded text payload should be kept; payloads without a key are kept."""
+        if isinstance(payload, dict) and "key" in payload:
+            return self.matches(payload["key"])
+        return True
+
+    def records(self, records: List[tuple]) -> List[tuple]:
+        return [r for r in records if self.matches(r[0])]
+
+    def __getstate__(self):
+        return {"keys": self.keys, "patterns": self.patterns}
+
+    def __setstate__(self, state):
+        self.__init__(state["keys"], state["patterns"])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, KeyFilter) and (self.keys, self.patterns) == (other.keys, other.patterns)
+
+    def __repr__(self) -> str:
+        return f"KeyFilter(keys={sorted(self.keys)!r}, patterns={list(self.patterns)!r})"
@@ -0,0 +1,210 @@
+"""Single worker process hosting every consumer and producer WebSocket of a runtime.
+
+The parent talks to the hub through three queues:
+
+* ``control_q`` — commands: ``("consume", stream, group, username, token, options)``,
+  ``("produce", stream, username, token, options)``, ``("cancel", route)``, ``("stop",)``.
+* ``out_q`` — consumed items tagged with their route, ``(route, item)``, periodic
+  producer counter snapshots, ``("@stats@", route, snapshot)``, and
+  ``("@exit@", route, reason)`` when a route's task ends on its own. A cancelled
+  consumer route ends with ``(route, STOP_MESSAGE)`` behind its last items.
+  The queue is bounded, so nothing puts to it from the event loop itself: consumers
+  wait in executor threads and a snapshot that does not fit is skipped.
+* ``produce_q`` — items to send, tagged with the producer route, ``(route, item)``.
+
+All WebSockets share one ``ClientSession`` and therefore one connection pool. With
+``credentials`` (the runtime's :class:`SharedToken`) every route connects with the
+current stream token instead of the one in its command, so renewals reach them all.
+"""
+
+import asyncio
+import functools
+import queue
+import threading
+from multiprocessing import Queue, Event as MpEvent
+from typing import Dict, Optional, Tuple
+
+from aiohttp import ClientSession, TCPConnector
+
+from .common import STOP_MESSAGE
+from .consume_worker import consume
+from .counters import SharedCounters, producer_counters
+from .credentials import SharedToken
+from .producer_worker import producer_worker
+
+STATS_ROUTE = "@stats@"
+EXIT_ROUTE = "@exit@"
+STATS_INTERVAL = 1.0
+
+Route = Tuple[str, ...]
+
+
+class RoutedQueue:
+    """Queue-like adapter that tags every put with a route before it enters a shared queue."""
+
+    def __init__(self, q: Queue, route: Route):
+        self.q = q
+        self.route = route
+
+    def put(self, item, block: bool = True, timeout=None):
+        self.q.put((self.route, item), block, timeout)
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+
+def _put_off_loop(out_q: Queue, item):
+    asyncio.get_running_loop().run_in_executor(None, out_q.put, item)
+
+
+def _send_stop(out_q: Queue, route: Route, _task=None):
+    _put_off_loop(out_q, (route, dict(STOP_MESSAGE)))
+
+
+def consumer_route(stream_name: str, group: str) -> Route:
+    return ("consume", stream_name, group)
+
+
+def producer_route(stream_name: str) -> Route:
+    return ("produce", stream_name)
+
+
+async def hub_main(
+    control_q: Queue,
+    out_q: Queue,
+    produce_q: Queue,
+    stop_event,
+    credentials: Optional[SharedToken] = None,
+):
+    loop = asyncio.get_running_loop()
+    commands: asyncio.Queue = asyncio.Queue()
+    tasks: Dict[Route, asyncio.Task] = {}
+    producer_inputs: Dict[Route, queue.Queue] = {}
+    counters: Dict[Route, SharedCounters] = {}
+    closing = threading.Event()
+
+    def read_commands():
+        while not closing.is_set():
+            try:
+                cmd = control_q.get(timeout=0.5)
+            except queue.Empty:
+                if stop_event.is_set():
+                    cmd = ("stop",)
+                else:
+                    continue
+            except (ValueError, OSError, EOFError):
+                cmd = ("stop",)
+            loop.call_soon_threadsafe(commands.put_nowait, cmd)
+            if cmd[0] == "stop":
+                return
+
+    def route_produced():
+        while not closing.is_set():
+            try:
+                route, item = produce_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (ValueError, OSError, EOFError):
+                return
+            # items may arrive before the matching "produce" command is processed
+            producer_inputs.setdefault(route, queue.Queue()).put(item)
+
+    async def publish_stats():
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            for route, c in list(counters.items()):
+                try:
+                    out_q.put_nowait((STATS_ROUTE, route, c.snapshot()))
+                except queue.Full:
+                    # the next snapshot carries the same counters
+                    pass
+
+    def watch(route: Route, task: asyncio.Task):
+        def done(_):
+            # cancelled tasks and replaced routes are not exits
+            if tasks.get(route) is not task or task.cancelled():
+                return
+            exc = task.exception()
+            _put_off_loop(out_q, (EXIT_ROUTE, route, repr(exc) if exc else "closed"))
+
+        task.add_done_callback(done)
+
+    threading.Thread(target=read_commands, daemon=True).start()
+    threading.Thread(target=route_produced, daemon=True).start()
+    stats_task = asyncio.create_task(publish_stats())
+
+    async with ClientSession(connector=TCPConnector(limit=0)) as session:
+        while True:
+            cmd = await commands.get()
+            kind = cmd[0]
+            if kind == "stop":
+                break
+
+            if kind in ("consume", "produce"):
+                # a restarted route replaces its previous task
+                route = consumer_route(*cmd[1:3]) if kind == "consume" else producer_route(cmd[1])
+                previous = tasks.pop(route, None)
+                if previous is not None:
+                    previous.cancel()
+
+            if kind == "consume":
+                _, stream_name, group, username, token, options = cmd
+                token = credentials if credentials is not None else token
+                route = consumer_route(stream_name, group)
+                sink = RoutedQueue(out_q, route)
+                tasks[route] = asyncio.create_task(
+                    consume(username, stream_name, group, token, sink, stop_event, session=session, **options)
+                )
+                watch(route, tasks[route])
+            elif kind == "produce":
+                _, stream_name, username, token, options = cmd
+                token = credentials if credentials is not None else token
+                route = producer_route(stream_name)
+                source = producer_inputs.setdefault(route, queue.Queue())
+                counters[route] = producer_counters()
+                tasks[route] = asyncio.create_task(
+                    producer_worker(
+                        username,
+                        stream_name,
+                        token,
+                        source,
+                        stop_event,
+                        counters=counters[route],
+                        session=session,
+                        **options,
+                    )
+                )
+                watch(route, tasks[route])
+            elif kind == "cancel":
+                route = tuple(cmd[1])
+                task = tasks.pop(route, None)
+                counters.pop(route, None)
+                if task:
+                    task.cancel()
+                if route[0] == "consume":
+                    # behind whatever the consumer flushes on its way out, so the stream
+                    # knows when the group's queue is drained
+                    stopped = functools.partial(_send_stop, out_q, route)
+                    if task:
+                        task.add_done_callback(stopped)
+                    else:
+                        stopped()
+
+        closing.set()
+        stats_task.cancel()
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(stats_task, *tasks.values(), return_exceptions=True)
+
+
+def worker_entry(
+    control_q: Queue,
+    out_q: Queue,
+    produce_q: Queue,
+    stop_event=None,
+    credentials: Optional[SharedToken] = None,
+):
+    """Entry point for the shared stream worker process."""
+    if stop_event is None:
+        stop_event = MpEvent()
+    asyncio.run(hub_main(control_q, out_q, produce_q, stop_event, credentials))
@@ -0,0 +1,249 @@
+"""Operators that transform consumed samples inside the consumer worker.
+
+A :class:`Pipeline` of operators is attached to a consume group with
+``PlotuneStream.set_pipeline``. The group's worker runs it on every
+``(key, time, value)`` sample after decoding and key filtering, so only its output
+is pickled, crosses the process boundary and reaches the handlers. Messages that
+are not samples pass through unchanged. Operators see ``(key, time, value)`` only;
+a sample's other payload fields are given back to the output of its key.
+
+Operators keep per-key state and must pickle, because the pipeline is handed to
+the worker process as an argument: callables given to :class:`Map` and
+:class:`Filter` have to be module-level functions (or ``functools.partial`` of
+them) unless the stream runs with ``worker_mode="inline"``. Every operator takes
+``keys`` (a key name, glob pattern or iterable of them, see ``filters.KeyFilter``)
+to apply to some keys only; other samples pass it untouched.
+"""
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .filters import KeyFilter, KeySpec
+
+Record = Tuple[str, float, float]
+
+AGGREGATES = ("mean", "min", "max", "sum", "count", "first", "last", "rate", "minmax")
+
+
+def sample_fields(payload: dict) -> Dict[str, Any]:
+    """The fields of a sample payload other than key, time and value."""
+    return {name: value for name, value in payload.items() if name not in ("key", "time", "value")}
+
+
+def sample_record(payload: Any) -> Optional[Record]:
+    """The ``(key, time, value)`` of a decoded text payload, or None if it is not a numeric sample."""
+    if not isinstance(payload, dict):
+        return None
+    try:
+        return str(payload["key"]), float(payload["time"]), float(payload["value"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class Operator:
+    """Base of the operators: applies :meth:`apply` to the samples of the selected keys."""
+
+    def __init__(self, keys: KeySpec = None):
+        self.keys = KeyFilter.from_spec(keys)
+
+    def process(self, records: List[Record]) -> List[Record]:
+        keys = self.keys
+        if keys is None:
+            return self.apply(records)
+        out: List[Record] = []
+        for record in records:
+            if keys.matches(record[0]):
+                out.extend(self.apply([record]))
+            else:
+                out.append(record)
+        return out
+
+    def apply(self, records: List[Record]) -> List[Record]:
+        raise NotImplementedError
+
+    def flush(self) -> List[Record]:
+        """Emit whatever the operator still holds; called when the worker stops."""
+        return []
+
+
+class Map(Operator):
+    """Replace each value with ``func(value)``."""
+
+    def __init__(self, func: Callable[[float], float], keys: KeySpec = None):
+        super().__init__(keys)
+        self.func = func
+
+    def apply(self, records: List[Record]) -> List[Record]:
+        func = self.func
+        return [(key, t, func(v)) for key, t, v in records]
+
+
+class Scale(Operator):
+    """Linear map ``value * factor + offset``, e.g. for unit conversion."""
+
+    def __init__(self, factor: float = 1.0, offset: float = 0.0, keys: KeySpec = None):
+        super().__init__(keys)
+        self.factor = factor
+        self.offset = offset
+
+    def apply(self, records: List[Record]) -> List[Record]:
+        factor, offset = self.factor, self.offset
+        return [(key, t, v * factor + offset) for key, t, v in records]
+
+
+class Filter(Operator):
+    """Keep samples with ``low <= value <= high`` (either bound may be None) for which ``predicate`` holds."""
+
+    def __init__(
+        self,
+        predicate: Optional[Callable[[float], bool]] = None,
+        low: Optional[float] = None,
+        high: Optional[float] = None,
+        keys: KeySpec = None,
+    ):
+        super().__init__(keys)
+        self.predicate = predicate
+        self.low = -math.inf if low is None else low
+        self.high = math.inf if high is None else high
+
+    def apply(self, records: List[Record]) -> List[Record]:
+        low, high, predicate = self.low, self.high, self.predicate
+        return [r for r in records if low <= r[2] <= high and (predicate is None or predicate(r[2]))]
+
+
+class Deadband(Operator):
+    """Drop samples within ``threshold`` of the last value passed on for their key."""
+
+    def __init__(self, threshold: float, keys: KeySpec = None):
+        if threshold < 0:
+            raise ValueError("threshold must not be negative")
+        super().__init__(keys)
+        self.threshold = threshold
+        self._last: Dict[str, float] = {}
+
+    def apply(self, records: List[Record]) -> List[Record]:
+        out = []
+        last = self._last
+        for key, t, v in records:
+            previous = last.get(key)
+            if previous is None or abs(v - previous) >= self.threshold:
+                last[key] = v
+                out.append((key, t, v))
+        return out
+
+
+class _Bucket:
+    __slots__ = ("id", "count", "total", "first", "last", "low", "high")
+
+    def __init__(self, bucket_id: int, t: float, v: float):
+        self.id = bucket_id
+        self.count = 1
+        self.total = v
+        self.first = self.last = self.low = self.high = (t, v)
+
+    def add(self, t: float, v: float):
+        self.count += 1
+        self.total += v
+        self.last = (t, v)
+        if v < self.low[1]:
+            self.low = (t, v)
+        if v > self.high[1]:
+            self.high = (t, v)
+
+
+class Window(Operator):
+    """Aggregate each key over tumbling windows of ``seconds``, by sample time.
+
+    ``agg`` is one of :data:`AGGREGATES`. Aggregates are stamped with the start of
+    their window, except "minmax", which passes on the minimum and maximum samples
+    with their own times. "rate" is the change of the value per second between the
+    first and last sample of the window (windows with one sample emit nothing).
+    A window is emitted when the first sample of a later window arrives, or on flush.
+    """
+
+    def __init__(self, seconds: float, agg: str = "mean", keys: KeySpec = None):
+        if seconds <= 0:
+            raise ValueError("seconds must be positive")
+        if agg not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {agg!r}, expected one of {AGGREGATES}")
+        super().__init__(keys)
+        self.seconds = seconds
+        self.agg = agg
+        self._buckets: Dict[str, _Bucket] = {}
+
+    def apply(self, records: List[Record]) -> List[Record]:
+        out: List[Record] = []
+        buckets = self._buckets
+        for key, t, v in records:
+            bucket_id = math.floor(t / self.seconds)
+            bucket = buckets.get(key)
+            if bucket is not None and bucket.id == bucket_id:
+                bucket.add(t, v)
+                continue
+            if bucket is not None:
+                self._emit(key, bucket, out)
+            buckets[key] = _Bucket(bucket_id, t, v)
+        return out
+
+    def _emit(self, key: str, bucket: _Bucket, out: List[Record]):
+        agg = self.agg
+        if agg == "minmax":
+            for t, v in sorted({bucket.low, bucket.high}):
+                out.append((key, t, v))
+            return
+        start = bucket.id * self.seconds
+        if agg == "mean":
+            value = bucket.total / bucket.count
+        elif agg == "min":
+            value = bucket.low[1]
+        elif agg == "max":
+            value = bucket.high[1]
+        elif agg == "sum":
+            value = bucket.total
+        elif agg == "count":
+            value = float(bucket.count)
+        elif agg == "first":
+            value = bucket.first[1]
+        elif agg == "last":
+            value = bucket.last[1]
+        else:  # rate
+            elapsed = bucket.last[0] - bucket.first[0]
+            if elapsed <= 0:
+                return
+            value = (bucket.last[1] - bucket.first[1]) / elapsed
+        out.append((key, start, value))
+
+    def flush(self) -> List[Record]:
+        out: List[Record] = []
+        for key, bucket in self._buckets.items():
+            self._emit(key, bucket, out)
+        self._buckets.clear()
+        return out
+
+
+class Pipeline:
+    """Operators applied one after the other to the samples a consume group receives."""
+
+    def __init__(self, *operators: Operator):
+        for op in operators:
+            if not (callable(getattr(op, "process", None)) and callable(getattr(op, "flush", None))):
+                raise TypeError(f"{op!r} is not an operator: it needs process() and flush()")
+        self.operators = operators
+
+    def __bool__(self) -> bool:
+        return bool(self.operators)
+
+    def process(self, records: List[Record]) -> List[Record]:
+        for op in self.operators:
+            if not records:
+                break
+            records = op.process(records)
+        return records
+
+    def flush(self) -> List[Record]:
+        """Flush every operator; what an operator flushes still goes through the ones after it."""
+        records: List[Record] = []
+        for op in self.operators:
+            records = op.process(records) if records else []
+            records.extend(op.flush())
+        return records
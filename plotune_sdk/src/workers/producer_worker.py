@@ -1,52 +1,359 @@
 import asyncio
-import json
 import time
 from aiohttp import ClientSession
 from multiprocessing import Queue, Event as MpEvent
+from collections import deque
+from queue import Empty
+from typing import Any, Deque, Dict, List, Optional, Tuple
 
+from plotune_sdk.utils.constants import STREAM_URL, websocket_url
 
-def build_producer_url(username: str, stream_name: str) -> str:
+from .codecs import JsonCodec, encode_frame, negotiated_codec, offered_subprotocols
+from .common import is_stop, run_worker, session_scope
+from .counters import SharedCounters
+from .credentials import TokenSource, current_token
+from .spool import Cursor, ProducerSpool
+
+# samples moved from the queue into the spool per executor hop
+SPOOL_FILL_SIZE = 4096
+# samples per frame while replaying a spool backlog
+SPOOL_REPLAY_BATCH = 1000
+# samples per frame when a column or record block is sent without batching
+BLOCK_FRAME_SIZE = 1000
+
+
+def build_producer_url(username: str, stream_name: str, stream_url: str = STREAM_URL) -> str:
     """Build the WebSocket URL for a producer."""
-    return f"wss://stream.plotune.net/ws/producer/{username}/{stream_name}"
+    return f"{websocket_url(stream_url)}/ws/producer/{username}/{stream_name}"
 
 
-def data_from_queue(q: Queue):
-    """Retrieve data from the queue and format it for sending."""
-    try:
-        data = q.get_nowait()
-        if not isinstance(data, dict):
+def format_message(data) -> Optional[dict]:
+    """Format a queued sample for sending, or return None if it is not a sample."""
+    if not isinstance(data, dict):
+        return None
+    return {
+        "key": data.get("key", "Unknown"),
+        "time": data.get("time", int(time.time())),
+        "value": data.get("value", 0),
+    }
+
+
+def expand_item(data) -> List[dict]:
+    """Expand a queued item into samples.
+
+    Items are either a single sample dict, a column block produced by
+    ``PlotuneStream.aproduce_many``: ``{"columns": [(key, times, values), ...]}``,
+    or a record block read from a shared-memory ring: ``{"records": [(key, time, value), ...]}``.
+    The stop message is passed through as is.
+    """
+    if is_stop(data):
+        return [data]
+    if isinstance(data, dict) and "columns" in data:
+        return [
+            {"key": key, "time": t, "value": v} for key, times, values in data["columns"] for t, v in zip(times, values)
+        ]
+    if isinstance(data, dict) and "records" in data:
+        return [{"key": key, "time": t, "value": v} for key, t, v in data["records"]]
+    message = format_message(data)
+    return [message] if message else []
+
+
+def stop_requested(pending: Deque[dict]) -> bool:
+    """Whether every sample queued before the stop message has been taken from ``pending``."""
+    return bool(pending) and is_stop(pending[0])
+
+
+def _take(pending: Deque[dict], batch: List[dict], max_size: int):
+    while pending and len(batch) < max_size and not is_stop(pending[0]):
+        batch.append(pending.popleft())
+
+
+def data_from_queue(q: Queue, pending: Optional[Deque[dict]] = None):
+    """Retrieve data from the queue and format it for sending.
+
+    Returns None when nothing is queued or only the stop message is left.
+    """
+    if pending is None:
+        pending = deque()
+    if not pending:
+        try:
+            pending.extend(expand_item(q.get_nowait()))
+        except Exception:
             return None
-        return {
-            "key": data.get("key", "Unknown"),
-            "time": data.get("time", int(time.time())),
-            "value": data.get("value", 0),
-        }
-    except Exception:
+    if not pending or is_stop(pending[0]):
         return None
+    return pending.popleft()
+
+
+def frame_from_queue(q: Queue, pending: Deque[dict], max_size: int = BLOCK_FRAME_SIZE):
+    """Take what to send next without batching: one sample, or a list of samples from a block.
+
+    A column or record block is sent as array frames of up to ``max_size`` samples
+    rather than one sample per ``interval`` tick. Returns None like ``data_from_queue``.
+    """
+    message = data_from_queue(q, pending)
+    if message is None or not pending or is_stop(pending[0]):
+        return message
+    frame = [message]
+    _take(pending, frame, max_size)
+    return frame
+
+
+def drain_batch(
+    q: Queue,
+    max_size: int,
+    linger: float,
+    first_timeout: float,
+    pending: Optional[Deque[dict]] = None,
+) -> List[dict]:
+    """Block for the first sample, then collect until ``max_size`` or ``linger`` seconds pass.
+
+    Runs in a thread so the event loop pays one executor hop per batch instead of per sample.
+    Samples from column blocks that do not fit in the batch are kept in ``pending``. A batch
+    ends at the stop message, which stays at the head of ``pending``.
+    """
+    if pending is None:
+        pending = deque()
+
+    batch: List[dict] = []
+    _take(pending, batch, max_size)
+    if len(batch) >= max_size or stop_requested(pending):
+        return batch
+
+    if not batch:
+        try:
+            pending.extend(expand_item(q.get(timeout=first_timeout)))
+        except (Empty, ValueError, OSError, EOFError):
+            return batch
+
+    deadline = time.monotonic() + linger
+    while True:
+        _take(pending, batch, max_size)
+        if len(batch) >= max_size or stop_requested(pending):
+            break
+        try:
+            item = q.get_nowait()
+        except Empty:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = q.get(timeout=remaining)
+            except Empty:
+                break
+        except (ValueError, OSError, EOFError):
+            break
+        pending.extend(expand_item(item))
+    return batch
+
+
+async def _send(ws, wire, obj) -> int:
+    """Encode ``obj`` with the negotiated codec, send it as one frame and return the frame size."""
+    frame = encode_frame(wire, obj)
+    if isinstance(frame, bytes):
+        await ws.send_bytes(frame)
+    else:
+        await ws.send_str(frame)
+    return len(frame)
+
+
+def spool_batch(
+    q: Queue,
+    spool: ProducerSpool,
+    max_size: int,
+    linger: float,
+    first_timeout: float,
+    pending: Deque[dict],
+) -> Tuple[List[dict], Cursor]:
+    """Move queued samples into the spool, then read the next batch to send from it.
+
+    While the spool still holds unsent samples the queue is only drained, never waited on.
+    """
+    if spool.has_unread():
+        first_timeout = linger = 0.0
+    samples = drain_batch(q, SPOOL_FILL_SIZE, linger, first_timeout, pending)
+    if samples:
+        spool.append(samples)
+    return spool.read(max_size)
+
+
+def spool_queued(q: Queue, spool: ProducerSpool, pending: Deque[dict]):
+    """Move everything already queued into the spool without waiting."""
+    while True:
+        samples = drain_batch(q, SPOOL_FILL_SIZE, 0.0, 0.0, pending)
+        if not samples:
+            return
+        spool.append(samples)
+
+
+async def _send_batches(
+    ws,
+    q: Queue,
+    stop_event,
+    interval: float,
+    batch_size: int,
+    linger: float,
+    counters: Optional[SharedCounters],
+    pending: Deque[dict],
+    wire=None,
+    spool: Optional[ProducerSpool] = None,
+    replay: int = 0,
+) -> bool:
+    """Send queued samples as arrays encoded by ``wire`` (JSON by default), one WebSocket frame per batch.
+
+    With a ``spool`` samples go to disk first and are acknowledged once their frame is
+    sent. The first ``replay`` samples (left unsent by an earlier connection) are sent
+    in frames of ``SPOOL_REPLAY_BATCH``.
+
+    Returns True once everything queued before the stop message has been sent.
+    """
+    wire = wire or JsonCodec()
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        fill_started = time.monotonic()
+        cursor = None
+        if spool is None:
+            batch = await loop.run_in_executor(None, drain_batch, q, batch_size, linger, interval, pending)
+        else:
+            size = SPOOL_REPLAY_BATCH if replay > 0 else batch_size
+            batch, cursor = await loop.run_in_executor(None, spool_batch, q, spool, size, linger, interval, pending)
+            replay -= len(batch)
+        if not batch:
+            if stop_requested(pending) and (spool is None or not spool.has_unread()):
+                return True
+            # Idle: keep the connection alive
+            await ws.ping()
+            continue
+
+        send_started = time.monotonic()
+        try:
+            size = await _send(ws, wire, batch)
+        except Exception:
+            if counters:
+                counters.add("send_errors")
+            raise
+
+        if counters:
+            latency = time.monotonic() - send_started
+            counters.add("batches")
+            counters.add("samples", len(batch))
+            counters.add("bytes", size)
+            counters.set("last_batch_size", len(batch))
+            counters.max("max_batch_size", len(batch))
+            counters.set("last_fill_time", send_started - fill_started)
+            counters.set("last_send_latency", latency)
+            counters.add("total_send_latency", latency)
+            counters.max("max_send_latency", latency)
+        if spool is not None:
+            spool.ack(cursor)
+    return False
 
 
 async def producer_worker(
     username: str,
     stream_name: str,
-    token: str,
+    token: TokenSource,
     q: Queue,
     stop_event,
     interval: float = 0.2,
+    batch_size: int = 1,
+    linger: float = 0.05,
+    counters: Optional[SharedCounters] = None,
+    session: Optional[ClientSession] = None,
+    codec: str = "json",
+    spool: Optional[Dict[str, Any]] = None,
+    stream_url: str = STREAM_URL,
 ):
-    """Asynchronous producer worker to send queue messages via WebSocket."""
-    url = build_producer_url(username, stream_name)
+    """Asynchronous producer worker to send queue messages via WebSocket.
+
+    With ``batch_size`` of 1 one sample is sent per ``interval`` tick, except that the
+    samples of a column block (``aproduce_many``) are sent back to back as array
+    frames of up to ``BLOCK_FRAME_SIZE``. Larger values switch to batching mode, where
+    up to ``batch_size`` samples collected within ``linger`` seconds are sent together
+    as an array in one frame.
+    ``session`` lets several workers share one connection pool. ``codec`` names the
+    wire codec; binary frames are only sent if the server accepts the binary subprotocol.
+
+    ``spool`` holds :class:`ProducerSpool` arguments. With a spool every sample is
+    written to disk before it is sent, and whatever was not acknowledged is replayed
+    after a reconnect or a restart of the worker. Spooled samples are always sent as
+    array frames.
+
+    ``token`` is a string or a :class:`SharedToken`; a shared token is read again at
+    every reconnect, so a token renewed by the runtime is picked up without a restart.
+
+    The worker returns after it took the stop message (``common.STOP_MESSAGE``) from
+    the queue and sent every sample queued before it, closing the socket cleanly.
+    """
+    url = build_producer_url(username, stream_name, stream_url)
+    pending: Deque[dict] = deque()
+    disk = ProducerSpool(counters=counters, **spool) if spool else None
+
+    try:
+        await _produce(url, token, q, stop_event, interval, batch_size, linger, counters, session, codec, pending, disk)
+    finally:
+        if disk is not None:
+            disk.close()
 
+
+async def _produce(
+    url: str,
+    token: TokenSource,
+    q: Queue,
+    stop_event,
+    interval: float,
+    batch_size: int,
+    linger: float,
+    counters: Optional[SharedCounters],
+    session: Optional[ClientSession],
+    codec: str,
+    pending: Deque[dict],
+    spool: Optional[ProducerSpool],
+):
+    """Connect, send and reconnect until ``stop_event`` is set or the queue is drained up to the stop message."""
+    connected_once = False
     while not stop_event.is_set():
         try:
-            async with ClientSession() as session:
-                async with session.ws_connect(url, headers={"Authorization": f"Bearer {token}"}) as ws:
+            async with session_scope(session) as client:
+                async with client.ws_connect(
+                    url,
+                    headers={"Authorization": f"Bearer {current_token(token)}"},
+                    protocols=offered_subprotocols(codec),
+                ) as ws:
+                    wire = negotiated_codec(codec, ws.protocol)
+                    if counters and connected_once:
+                        counters.add("reconnects")
+                    connected_once = True
+
+                    if spool is not None:
+                        replay = spool.rewind()
+                        if counters:
+                            counters.add("spool_replayed", replay)
+                        if await _send_batches(
+                            ws, q, stop_event, interval, batch_size, linger, counters, pending, wire, spool, replay
+                        ):
+                            return
+                        continue
+
+                    if batch_size > 1:
+                        if await _send_batches(
+                            ws, q, stop_event, interval, batch_size, linger, counters, pending, wire
+                        ):
+                            return
+                        continue
+
                     while not stop_event.is_set():
-                        message = data_from_queue(q)
+                        message = frame_from_queue(q, pending)
                         if message:
                             try:
-                                await ws.send_str(json.dumps(message))
+                                await _send(ws, wire, message)
                             except Exception:
                                 break
+                        elif stop_requested(pending):
+                            return
+                        if pending and not stop_requested(pending):
+                            # the rest of a block goes out without waiting for the next tick
+                            continue
 
                         await asyncio.sleep(interval)
 
@@ -59,6 +366,13 @@ async def producer_worker(
 
         except Exception:
             if not stop_event.is_set():
+                if spool is not None:
+                    # keep queued samples safe on disk while disconnected
+                    try:
+                        await asyncio.get_running_loop().run_in_executor(None, spool_queued, q, spool, pending)
+                    except Exception:
+                        # e.g. a full disk: what was drained is lost, but the producer keeps reconnecting
+                        pass
                 await asyncio.sleep(1)  # Wait before reconnecting
             else:
                 break
@@ -67,13 +381,34 @@ async def producer_worker(
 def worker_entry(
     username: str,
     stream_name: str,
-    token: str,
+    token: TokenSource,
     q: Queue,
     stop_event=None,
     interval: float = 0.2,
+    batch_size: int = 1,
+    linger: float = 0.05,
+    counters: Optional[SharedCounters] = None,
+    codec: str = "json",
+    spool: Optional[Dict[str, Any]] = None,
+    stream_url: str = STREAM_URL,
 ):
     """Entry point for the producer worker process."""
     if stop_event is None:
         stop_event = MpEvent()
 
-    asyncio.run(producer_worker(username, stream_name, token, q, stop_event, interval))
+    run_worker(
+        producer_worker(
+            username,
+            stream_name,
+            token,
+            q,
+            stop_event,
+            interval,
+            batch_size=batch_size,
+            linger=linger,
+            counters=counters,
+            codec=codec,
+            spool=spool,
+            stream_url=stream_url,
+        )
+    )
@@ -0,0 +1,300 @@
+"""Shared-memory ring buffer transport between a stream and its worker process.
+
+Samples are written as fixed-width ``(key_id, flags, time, value)`` records into a
+``multiprocessing.shared_memory`` block. Key names are appended once to a key table
+in the same block, so a worker restarted on the ring, reader or writer, resolves
+the ids the previous one assigned. Each ring has one writing process, one reader
+and one semaphore used to wake the reader when it is idle; threads of the writing
+process (the event loop, ``produce_many`` callers, blocking puts moved off the
+loop) take turns through a lock.
+A semaphore is used rather than an ``Event`` because ``Event.set`` waits for the
+woken reader to acknowledge, which stalls the writer. Putting the stop message
+marks the ring closed; the reader gets it back once the records before it are read.
+
+``ShmRingQueue`` mimics the subset of the ``multiprocessing.Queue`` interface the
+stream and workers use, so either transport can be passed to the same worker code.
+"""
+
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from queue import Empty, Full
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .bootstrap import mp_context
+from .common import STOP_MESSAGE, is_stop
+
+RECORD = struct.Struct("<IIdd")
+RECORD_SIZE = RECORD.size
+HEADER_SIZE = 64
+
+# header slots (uint64)
+_HEAD = 0
+_TAIL = 1
+_CAPACITY = 2
+_WAITING = 3
+_CLOSED = 4
+_KEYS_USED = 5  # bytes of the key table in use
+
+FLAG_SAMPLE = 0
+
+KEY_LENGTH = struct.Struct("<I")
+
+Record = Tuple[str, float, float]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without letting this process's resource tracker unlink it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class ShmRingQueue:
+    """Ring of fixed-width sample records with one writing process and one reader."""
+
+    def __init__(self, capacity: int = 65536, key_bytes: int = 65536):
+        self.capacity = capacity
+        self.key_bytes = key_bytes
+        size = HEADER_SIZE + key_bytes + capacity * RECORD_SIZE
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._owner = True
+        self._wakeup = mp_context().Semaphore(0)
+        self._write_lock = threading.Lock()
+        self._bind()
+        self._header[_CAPACITY] = capacity
+
+    def _bind(self):
+        self._header = self._shm.buf[:HEADER_SIZE].cast("Q")
+        self._key_table = self._shm.buf[HEADER_SIZE : HEADER_SIZE + self.key_bytes]
+        self._data = self._shm.buf[HEADER_SIZE + self.key_bytes :]
+        self._key_ids: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+        self._keys_read = 0
+        self._load_keys()
+
+    # -----------------------------------------------------------------
+    # Pickling (process arguments): only the block name and the semaphore travel
+    # -----------------------------------------------------------------
+    def __getstate__(self):
+        return {"name": self._shm.name, "capacity": self.capacity, "key_bytes": self.key_bytes, "wakeup": self._wakeup}
+
+    def __setstate__(self, state):
+        self.capacity = state["capacity"]
+        self.key_bytes = state["key_bytes"]
+        self._wakeup = state["wakeup"]
+        self._shm = _attach(state["name"])
+        self._owner = False
+        self._write_lock = threading.Lock()
+        self._bind()
+
+    # -----------------------------------------------------------------
+    # Writer side
+    # -----------------------------------------------------------------
+    def free_slots(self) -> int:
+        return self.capacity - (self._header[_HEAD] - self._header[_TAIL])
+
+    def qsize(self) -> int:
+        return self._header[_HEAD] - self._header[_TAIL]
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def _load_keys(self):
+        """Read key table entries appended since the last call (by this or an earlier worker)."""
+        used = self._header[_KEYS_USED]
+        offset = self._keys_read
+        while offset < used:
+            (length,) = KEY_LENGTH.unpack_from(self._key_table, offset)
+            offset += KEY_LENGTH.size
+            key = bytes(self._key_table[offset : offset + length]).decode("utf-8")
+            offset += length
+            key_id = len(self._keys) + 1
+            self._keys[key_id] = key
+            self._key_ids.setdefault(key, key_id)
+        self._keys_read = offset
+
+    def _define(self, key: str) -> int:
+        """Append ``key`` to the key table; call with the write lock held."""
+        name = key.encode("utf-8")
+        used = self._header[_KEYS_USED]
+        end = used + KEY_LENGTH.size + len(name)
+        if end > self.key_bytes:
+            raise ValueError(f"Key table of {self.key_bytes} bytes is full, cannot define key {key!r}")
+        KEY_LENGTH.pack_into(self._key_table, used, len(name))
+        self._key_table[used + KEY_LENGTH.size : end] = name
+        # publish after the name is in place
+        self._header[_KEYS_USED] = end
+        self._load_keys()
+        return self._key_ids[key]
+
+    def _encode(self, records: Iterable[Record]) -> List[Tuple[int, float, float]]:
+        """Turn records into ``(key_id, time, value)`` slots, defining keys not seen before.
+
+        Every time and value is converted before any key is defined, so a record that
+        is not numeric fails the block without touching the key table.
+        """
+        converted = [(key, float(t), float(v)) for key, t, v in records]
+        key_ids = self._key_ids
+        return [(key_ids.get(key) or self._define(key), t, v) for key, t, v in converted]
+
+    def _write_slots(self, slots) -> None:
+        head = self._header[_HEAD]
+        capacity = self.capacity
+        data = self._data
+        for key_id, t, v in slots:
+            RECORD.pack_into(data, (head % capacity) * RECORD_SIZE, key_id, FLAG_SAMPLE, t, v)
+            head += 1
+        # publish after the records are in place
+        self._header[_HEAD] = head
+        if self._header[_WAITING]:
+            self._header[_WAITING] = 0
+            self._wakeup.release()
+
+    def put_records(self, records: Iterable[Record], block: bool = True, timeout: Optional[float] = None):
+        """Write records, waiting for space if ``block`` is set.
+
+        Up to ``capacity`` records are written as one unit. A larger block is written
+        in ring-sized parts as the reader makes room; without ``block`` it raises
+        ``Full`` like any block that does not fit, and ``timeout`` only bounds the
+        wait for the first part, so a block is never cut short once started.
+
+        Safe to call from several threads: encoding and writing happen under a lock,
+        which is released while waiting for space so other writers are not stalled.
+        """
+        with self._write_lock:
+            slots = self._encode(records)
+        capacity = self.capacity
+        if not block and len(slots) > capacity:
+            raise Full
+        self._write_part(slots[:capacity], block, timeout)
+        for start in range(capacity, len(slots), capacity):
+            self._write_part(slots[start : start + capacity], True, None)
+
+    def _write_part(self, slots, block: bool, timeout: Optional[float]):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._write_lock:
+                if self.free_slots() >= len(slots):
+                    self._write_slots(slots)
+                    return
+            if not block or (deadline is not None and time.monotonic() >= deadline):
+                raise Full
+            time.sleep(0.0005)
+
+    def put(self, item, block: bool = True, timeout: Optional[float] = None):
+        if is_stop(item):
+            with self._write_lock:
+                self._header[_CLOSED] = 1
+            self._wakeup.release()
+            return
+        self.put_records(_records_from_item(item), block, timeout)
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    # -----------------------------------------------------------------
+    # Reader side
+    # -----------------------------------------------------------------
+    def read_records(self, max_records: int = 65536) -> List[Record]:
+        """Read up to ``max_records`` samples that are already available."""
+        head = self._header[_HEAD]
+        tail = self._header[_TAIL]
+        capacity = self.capacity
+        data = self._data
+        keys = self._keys
+        out: List[Record] = []
+        while tail < head and len(out) < max_records:
+            key_id, _, t, v = RECORD.unpack_from(data, (tail % capacity) * RECORD_SIZE)
+            tail += 1
+            key = keys.get(key_id)
+            if key is None:
+                # defined after this reader last looked at the key table
+                self._load_keys()
+                key = keys.get(key_id, "Unknown")
+            out.append((key, t, v))
+        self._header[_TAIL] = tail
+        return out
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """Block until records are available, the ring is closed or ``timeout`` passes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._header[_HEAD] == self._header[_TAIL] and not self._header[_CLOSED]:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._header[_WAITING] = 1
+            # re-check after announcing, so a concurrent write cannot be missed
+            if self._header[_HEAD] != self._header[_TAIL]:
+                self._header[_WAITING] = 0
+                break
+            self._wakeup.acquire(True, remaining)
+            self._header[_WAITING] = 0
+        return True
+
+    def get(self, block: bool = True, timeout: Optional[float] = None, max_records: int = 65536) -> dict:
+        """Return every available record as one ``{"records": [...]}`` item, or the stop message once drained."""
+        if block and not self.wait(timeout):
+            raise Empty
+        records = self.read_records(max_records)
+        if not records:
+            if self._header[_CLOSED]:
+                return dict(STOP_MESSAGE)
+            raise Empty
+        return {"records": records}
+
+    def get_nowait(self) -> dict:
+        return self.get(block=False)
+
+    # -----------------------------------------------------------------
+    # Cleanup
+    # -----------------------------------------------------------------
+    def close(self):
+        # wake a reader blocked in wait() so it can observe shutdown
+        self._wakeup.release()
+        try:
+            self._header.release()
+            self._key_table.release()
+            self._data.release()
+            self._shm.close()
+        except Exception:
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def join_thread(self):
+        """No feeder thread to join; present for ``multiprocessing.Queue`` compatibility."""
+
+
+def _records_from_item(item) -> List[Record]:
+    """Translate a queue item (sample, consumer message, chunk or column block) into records."""
+    if isinstance(item, dict):
+        if "chunk" in item:
+            records: List[Record] = []
+            for sub in item["chunk"]:
+                try:
+                    records.extend(_records_from_item(sub))
+                except TypeError:
+                    # skip non-sample messages, keep the rest of the chunk
+                    continue
+            return records
+        if "columns" in item:
+            return [(key, t, v) for key, times, values in item["columns"] for t, v in zip(times, values)]
+        if "records" in item:
+            return item["records"]
+        data = item.get("payload", item) if item.get("type") == "message" else item
+        if isinstance(data, dict):
+            return [(str(data.get("key", "Unknown")), data.get("time", time.time()), data.get("value", 0))]
+    raise TypeError(f"Cannot encode {type(item).__name__} into a ring record")
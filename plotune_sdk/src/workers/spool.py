@@ -0,0 +1,246 @@
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .counters import SharedCounters
+
+# segment header: magic, version, end of written data, record count
+_HEADER = struct.Struct("<4sIQQ")
+HEADER_SIZE = 32
+MAGIC = b"PTSP"
+VERSION = 1
+
+# record: key length, key bytes, time, value
+_KEY_LEN = struct.Struct("<H")
+_SAMPLE = struct.Struct("<dd")
+
+# acknowledged position: segment id, offset
+_ACK = struct.Struct("<QQ")
+
+Cursor = Tuple[int, int]
+
+
+class _Segment:
+    """One preallocated, memory-mapped segment file."""
+
+    def __init__(self, path: str, seg_id: int, size: int, create: bool):
+        self.path = path
+        self.seg_id = seg_id
+        mode = "w+b" if create else "r+b"
+        with open(path, mode) as f:
+            if create:
+                f.truncate(size)
+            self.size = os.fstat(f.fileno()).st_size
+            self.mm = mmap.mmap(f.fileno(), self.size)
+        if create:
+            self._write_header(HEADER_SIZE, 0)
+        else:
+            magic, version, _, _ = _HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a plotune spool segment")
+        self.end, self.count = _HEADER.unpack_from(self.mm, 0)[2:]
+
+    def _write_header(self, end: int, count: int):
+        _HEADER.pack_into(self.mm, 0, MAGIC, VERSION, end, count)
+        self.end, self.count = end, count
+
+    def append(self, raw: bytes) -> bool:
+        if self.end + len(raw) > self.size:
+            return False
+        self.mm[self.end : self.end + len(raw)] = raw
+        self._write_header(self.end + len(raw), self.count + 1)
+        return True
+
+    def read(self, offset: int, max_records: int) -> Tuple[List[dict], int]:
+        out = []
+        mm = self.mm
+        while offset < self.end and len(out) < max_records:
+            (length,) = _KEY_LEN.unpack_from(mm, offset)
+            offset += _KEY_LEN.size
+            key = mm[offset : offset + length].decode("utf-8")
+            offset += length
+            t, v = _SAMPLE.unpack_from(mm, offset)
+            offset += _SAMPLE.size
+            out.append({"key": key, "time": t, "value": v})
+        return out, offset
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+
+
+def _encode(sample: dict) -> Optional[bytes]:
+    """Encode one record; None if its time or value is not a number or its key is too long."""
+    key = str(sample.get("key", "Unknown")).encode("utf-8")
+    try:
+        return _KEY_LEN.pack(len(key)) + key + _SAMPLE.pack(float(sample.get("time", 0)), float(sample.get("value", 0)))
+    except (TypeError, ValueError, OverflowError, struct.error):
+        return None
+
+
+class ProducerSpool:
+    """Append-only, memory-mapped spool of samples waiting to be sent by a producer.
+
+    Samples are appended to fixed-size segment files (``segment_bytes`` each) in
+    ``directory``. The sender reads from a cursor and calls :meth:`ack` once a batch
+    is on the wire; the acknowledged position is kept in a small mapped file, so a
+    new producer process replays everything sent-but-unacknowledged after a restart.
+    :meth:`rewind` moves the cursor back to that position after a disconnect.
+
+    Fully acknowledged segments are deleted. When the spool grows past ``max_bytes``
+    the oldest segment is dropped even if unsent, and its samples are counted as
+    ``spool_dropped``. Samples the spool cannot store are counted as ``spool_rejected``.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 16 * 1024 * 1024,
+        max_bytes: int = 256 * 1024 * 1024,
+        counters: Optional[SharedCounters] = None,
+    ):
+        if segment_bytes <= HEADER_SIZE + 1024:
+            raise ValueError("segment_bytes is too small")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max(max_bytes, segment_bytes)
+        self.counters = counters
+        self._lock = threading.Lock()
+
+        self._segments: Dict[int, _Segment] = {}
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".seg"):
+                seg_id = int(name[:-4])
+                self._segments[seg_id] = _Segment(self._path(seg_id), seg_id, segment_bytes, create=False)
+
+        ack_path = os.path.join(directory, "ack")
+        new_ack = not os.path.exists(ack_path)
+        with open(ack_path, "a+b") as f:
+            if new_ack:
+                f.truncate(_ACK.size)
+            self._ack_mm = mmap.mmap(f.fileno(), _ACK.size)
+
+        first = min(self._segments, default=1)
+        ack = _ACK.unpack_from(self._ack_mm, 0)
+        if new_ack or ack[0] < first:
+            ack = (first, HEADER_SIZE)
+        self._acked: Cursor = ack
+        self._cursor: Cursor = ack
+        if not self._segments:
+            self._open_segment(first)
+
+    def _path(self, seg_id: int) -> str:
+        return os.path.join(self.directory, f"{seg_id:012d}.seg")
+
+    def _open_segment(self, seg_id: int) -> _Segment:
+        seg = _Segment(self._path(seg_id), seg_id, self.segment_bytes, create=True)
+        self._segments[seg_id] = seg
+        return seg
+
+    # -----------------------------------------------------------------
+    # Writer side
+    # -----------------------------------------------------------------
+    def append(self, samples: List[dict]) -> int:
+        """Append samples; returns how many were written.
+
+        The whole batch is encoded before anything is written. A sample with a
+        non-numeric time or value, or whose record would not fit in a segment, is
+        left out and counted as ``spool_rejected``; the rest of the batch is kept.
+        """
+        limit = self.segment_bytes - HEADER_SIZE
+        records = [raw for raw in map(_encode, samples) if raw is not None and len(raw) <= limit]
+        with self._lock:
+            seg = self._segments[max(self._segments)]
+            for raw in records:
+                if not seg.append(raw):
+                    seg.mm.flush()
+                    seg = self._open_segment(seg.seg_id + 1)
+                    seg.append(raw)
+            self._enforce_cap()
+        if self.counters:
+            self.counters.add("spooled", len(records))
+            if len(records) < len(samples):
+                self.counters.add("spool_rejected", len(samples) - len(records))
+        return len(records)
+
+    def _enforce_cap(self):
+        while len(self._segments) > 1 and len(self._segments) * self.segment_bytes > self.max_bytes:
+            oldest = self._segments.pop(min(self._segments))
+            start = self._acked[1] if self._acked[0] == oldest.seg_id else HEADER_SIZE
+            if self._acked[0] <= oldest.seg_id:
+                dropped = len(oldest.read(start, oldest.count)[0])
+                if self.counters:
+                    self.counters.add("spool_dropped", dropped)
+                self._set_ack((oldest.seg_id + 1, HEADER_SIZE))
+            if self._cursor[0] <= oldest.seg_id:
+                self._cursor = (oldest.seg_id + 1, HEADER_SIZE)
+            oldest.close()
+            os.remove(oldest.path)
+
+    # -----------------------------------------------------------------
+    # Sender side
+    # -----------------------------------------------------------------
+    def read(self, max_records: int) -> Tuple[List[dict], Cursor]:
+        """Read up to ``max_records`` unsent samples; pass the returned cursor to :meth:`ack`."""
+        with self._lock:
+            out: List[dict] = []
+            seg_id, offset = self._cursor
+            last = max(self._segments)
+            while len(out) < max_records:
+                seg = self._segments.get(seg_id)
+                if seg is None:
+                    break
+                records, offset = seg.read(offset, max_records - len(out))
+                out.extend(records)
+                if offset < seg.end or seg_id == last:
+                    break
+                seg_id, offset = seg_id + 1, HEADER_SIZE
+            self._cursor = (seg_id, offset)
+            return out, self._cursor
+
+    def ack(self, cursor: Cursor):
+        """Mark everything before ``cursor`` as sent and delete segments that are done."""
+        with self._lock:
+            self._set_ack(cursor)
+            for seg_id in [s for s in self._segments if s < cursor[0]]:
+                seg = self._segments.pop(seg_id)
+                seg.close()
+                os.remove(seg.path)
+
+    def _set_ack(self, cursor: Cursor):
+        self._acked = cursor
+        _ACK.pack_into(self._ack_mm, 0, *cursor)
+
+    def rewind(self) -> int:
+        """Move the read cursor back to the last acknowledged position; returns samples to replay."""
+        with self._lock:
+            self._cursor = self._acked
+        return self.pending()
+
+    def pending(self) -> int:
+        """Number of samples after the acknowledged position."""
+        with self._lock:
+            total = 0
+            for seg_id, seg in self._segments.items():
+                if seg_id > self._acked[0]:
+                    total += seg.count
+                elif seg_id == self._acked[0]:
+                    total += len(seg.read(self._acked[1], seg.count)[0])
+            return total
+
+    def has_unread(self) -> bool:
+        with self._lock:
+            seg_id, offset = self._cursor
+            seg = self._segments.get(seg_id)
+            return bool(seg and offset < seg.end) or seg_id < max(self._segments)
+
+    def close(self):
+        with self._lock:
+            for seg in self._segments.values():
+                seg.close()
+            self._segments.clear()
+            self._ack_mm.flush()
+            self._ack_mm.close()
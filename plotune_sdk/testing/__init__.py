@@ -0,0 +1,5 @@
+"""Helpers for testing and benchmarking Plotune extensions offline."""
+
+from .broker import LocalBroker
+
+__all__ = ["LocalBroker"]
@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+from plotune_sdk.src.workers.codecs import (
+    BINARY_SUBPROTOCOL,
+    GORILLA_SUBPROTOCOL,
+    JSON_SUBPROTOCOL,
+    BinaryCodec,
+    GorillaCodec,
+    fastest_json_codec,
+)
+from plotune_sdk.utils import get_logger
+
+logger = get_logger("plotune_broker")
+
+
+class _Consumer:
+    """One connected consumer WebSocket and its outgoing buffer."""
+
+    def __init__(self, ws: web.WebSocketResponse, records: Optional[Any], max_buffer: int):
+        self.ws = ws
+        # binary codec negotiated with this consumer, None for JSON text frames
+        self.records = records
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        self.dropped = 0
+
+    def offer(self, samples: List[dict]):
+        for sample in samples:
+            try:
+                self.queue.put_nowait(sample)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+
+class LocalBroker:
+    """In-process stand-in for the Plotune stream service, for tests and benchmarks.
+
+    Implements the routes the SDK talks to:
+
+    * ``GET /auth/stream`` — returns ``{"token": ...}`` for any bearer license token.
+      With ``token_ttl`` every call issues a new token with ``"expires_in"``; once it
+      expires it is rejected and connections opened with it are closed, as the real
+      service does. ``token`` itself never expires.
+    * ``/ws/producer/{user}/{stream}`` — accepts single samples or arrays of samples,
+      as JSON text frames or, when negotiated, binary or gorilla record frames.
+    * ``/ws/consumer/{user}/{stream}/{group}`` — every group of a stream receives each
+      sample once; consumers that share a group take turns (round robin).
+
+    Consumers get one text frame per sample, or one binary frame per delivery when they
+    negotiate a binary subprotocol. Point a runtime at it with
+    ``PlotuneRuntime(api_url=broker.url, stream_url=broker.url)``.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token: str = "local-stream-token",
+        binary: bool = True,
+        max_buffer: int = 100_000,
+        token_ttl: Optional[float] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.token_ttl = token_ttl
+        self.binary = binary
+        self.max_buffer = max_buffer
+
+        self.received = 0
+        self.delivered = 0
+        # groups[(user, stream)][group] = connected consumers of that group
+        self._groups: Dict[tuple, Dict[str, List[_Consumer]]] = defaultdict(lambda: defaultdict(list))
+        self._turns: Dict[tuple, Any] = {}
+        # issued token -> expiry (monotonic), and the token each open WebSocket used
+        self._issued: Dict[str, float] = {}
+        self._issue_count = itertools.count(1)
+        self._sockets: Dict[web.WebSocketResponse, str] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self._json = fastest_json_codec()
+        self._binary = {BINARY_SUBPROTOCOL: BinaryCodec(), GORILLA_SUBPROTOCOL: GorillaCodec()}
+        self._runner: Optional[web.AppRunner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/auth/stream", self._auth)
+        self.app.router.add_get("/ws/producer/{user}/{stream}", self._producer)
+        self.app.router.add_get("/ws/consumer/{user}/{stream}/{group}", self._consumer)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # -----------------------------------------------------------------
+    # Lifecycle
+    # -----------------------------------------------------------------
+    async def start(self):
+        """Start serving on the current event loop; ``port=0`` picks a free port."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        if self.token_ttl:
+            self._reaper = asyncio.create_task(self._close_expired())
+        logger.info(f"Local broker listening on {self.url}")
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self, timeout: float = 5.0):
+        """Run the broker on its own event loop thread, e.g. to serve worker processes."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="plotune-local-broker", daemon=True)
+        self._thread.start()
+        if not ready.wait(timeout):
+            raise RuntimeError("Local broker did not start")
+
+    def stop_thread(self, timeout: float = 5.0):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # -----------------------------------------------------------------
+    # Routes
+    # -----------------------------------------------------------------
+    @staticmethod
+    def _bearer(request: web.Request) -> Optional[str]:
+        header = request.headers.get("Authorization", "")
+        return header[len("Bearer ") :] if header.startswith("Bearer ") else None
+
+    def _valid(self, token: Optional[str]) -> bool:
+        if token == self.token:
+            return True
+        return token in self._issued and time.monotonic() < self._issued[token]
+
+    async def _auth(self, request: web.Request):
+        if self._bearer(request) is None:
+            raise web.HTTPUnauthorized()
+        if not self.token_ttl:
+            return web.json_response({"token": self.token})
+        token = f"{self.token}-{next(self._issue_count)}"
+        self._issued[token] = time.monotonic() + self.token_ttl
+        return web.json_response({"token": token, "expires_in": self.token_ttl})
+
+    async def _close_expired(self):
+        while True:
+            await asyncio.sleep(self.token_ttl / 10)
+            for ws, token in list(self._sockets.items()):
+                if not self._valid(token):
+                    await ws.close(code=4001, message=b"token expired")
+
+    def _authorized(self, request: web.Request) -> Optional[str]:
+        """The request's bearer token if the broker accepts it, else None."""
+        token = self._bearer(request)
+        return token if self._valid(token) else None
+
+    def _websocket(self) -> web.WebSocketResponse:
+        if self.binary:
+            protocols = (GORILLA_SUBPROTOCOL, BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL)
+        else:
+            protocols = (JSON_SUBPROTOCOL,)
+        return web.WebSocketResponse(protocols=protocols, max_msg_size=0)
+
+    async def _producer(self, request: web.Request):
+        token = self._authorized(request)
+        if token is None:
+            raise web.HTTPUnauthorized()
+        stream = (request.match_info["user"], request.match_info["stream"])
+        ws = self._websocket()
+        await ws.prepare(request)
+        records = self._binary.get(ws.ws_protocol)
+        self._sockets[ws] = token
+
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                data = self._json.decode(msg.data)
+                samples = data if isinstance(data, list) else [data]
+            elif msg.type == WSMsgType.BINARY and records is not None:
+                samples = records.decode(msg.data)
+            else:
+                continue
+            self.received += len(samples)
+            self._publish(stream, samples)
+        self._sockets.pop(ws, None)
+        return ws
+
+    def _publish(self, stream: tuple, samples: List[dict]):
+        for group, consumers in self._groups.get(stream, {}).items():
+            if not consumers:
+                continue
+            key = stream + (group,)
+            turn = self._turns.setdefault(key, itertools.count())
+            consumers[next(turn) % len(consumers)].offer(samples)
+
+    async def _consumer(self, request: web.Request):
+        token = self._authorized(request)
+        if token is None:
+            raise web.HTTPUnauthorized()
+        stream = (request.match_info["user"], request.match_info["stream"])
+        group = request.match_info["group"]
+        ws = self._websocket()
+        await ws.prepare(request)
+
+        consumer = _Consumer(ws, self._binary.get(ws.ws_protocol), self.max_buffer)
+        members = self._groups[stream][group]
+        members.append(consumer)
+        self._sockets[ws] = token
+        sender = asyncio.create_task(self._send_to(consumer))
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self._sockets.pop(ws, None)
+            members.remove(consumer)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+        return ws
+
+    async def _send_to(self, consumer: _Consumer):
+        q = consumer.queue
+        while True:
+            samples = [await q.get()]
+            while not q.empty() and len(samples) < 1000:
+                samples.append(q.get_nowait())
+            if consumer.records is not None:
+                await consumer.ws.send_bytes(consumer.records.encode(samples))
+            else:
+                for sample in samples:
+                    await consumer.ws.send_str(self._json.encode(sample))
+            self.delivered += len(samples)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "delivered": self.delivered,
+            "consumers": {
+                f"{user}/{stream}/{group}": len(consumers)
+                for (user, stream), groups in self._groups.items()
+                for group, consumers in groups.items()
+            },
+        }
@@ -1,5 +1,13 @@
 """Utility module exports for Plotune SDK."""
 
 from .logger import get_logger, setup_uvicorn_logging
-from .server_helpers import AVAILABLE_PORT
-from .constants import get_cache, API_URL, STREAM_URL, PYSTRAY_HEADLESS
+from .constants import get_cache, get_spool_dir, websocket_url, API_URL, STREAM_URL, PYSTRAY_HEADLESS
+
+
+def __getattr__(name):
+    # picking a free port binds a socket; only the server needs it
+    if name == "AVAILABLE_PORT":
+        from .server_helpers import AVAILABLE_PORT
+
+        return AVAILABLE_PORT
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
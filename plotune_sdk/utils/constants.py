@@ -1,23 +1,54 @@
 import os
 from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from diskcache import Cache
-from platformdirs import user_cache_dir
+if TYPE_CHECKING:
+    from diskcache import Cache
 
-API_URL = "https://api.plotune.net"
-STREAM_URL = "https://stream.plotune.net"
+API_URL = os.getenv("PLOTUNE_API_URL", "https://api.plotune.net")
+STREAM_URL = os.getenv("PLOTUNE_STREAM_URL", "https://stream.plotune.net")
 
 PYSTRAY_HEADLESS = os.getenv("PYSTRAY_HEADLESS", "0") == "1"
 
 
 @lru_cache(maxsize=None)
-def get_cache(extension_id: str) -> Cache:
+def get_cache(extension_id: str) -> "Cache":
     """
     Returns a disk-backed cache for the given extension ID.
     Uses platform-specific cache directory.
     """
+    # imported here so stream workers, which only need the URL helpers, skip them
+    from diskcache import Cache
+    from platformdirs import user_cache_dir
+
     app_name = extension_id
     app_author = "BAKSI"
     cache_dir = user_cache_dir(app_name, app_author)
     cache = Cache(cache_dir)
     return cache
+
+
+def get_spool_dir(extension_id: str, stream_name: str) -> str:
+    """
+    Returns the default producer spool directory for a stream of the given extension.
+    Lives next to the extension's disk cache. Raises ValueError for stream names that
+    are not a single path segment, which would place the spool outside of it.
+    """
+    from platformdirs import user_cache_dir
+
+    separators = {"/", "\\", os.sep, os.altsep} - {None}
+    if stream_name in ("", ".", "..") or "\0" in stream_name or any(sep in stream_name for sep in separators):
+        raise ValueError(f"Stream name {stream_name!r} cannot be used as a spool directory name")
+    return os.path.join(user_cache_dir(extension_id, "BAKSI"), "spool", stream_name)
+
+
+def websocket_url(base_url: str) -> str:
+    """
+    Returns the WebSocket form of an http(s) base URL, e.g. https://host -> wss://host.
+    """
+    base_url = base_url.rstrip("/")
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://") :]
+    if base_url.startswith("http://"):
+        return "ws://" + base_url[len("http://") :]
+    return base_url
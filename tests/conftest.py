@@ -0,0 +1,66 @@
+# tests/conftest.py
+import asyncio
+import socket
+
+import pytest
+
+from plotune_sdk.src.stream_hub import StreamHub
+from plotune_sdk.src.streams import PlotuneStream
+from plotune_sdk.src.workers.bootstrap import mp_context
+
+
+class StubRuntime:
+    """Minimal runtime for a PlotuneStream: the event loop, a stop event, the endpoints, the worker mode
+    and, for "shared" streams, the stream hub."""
+
+    def __init__(self, url=None, worker_mode=None):
+        self.loop = asyncio.get_event_loop()
+        # from the configured start method, so it also reaches spawned workers
+        self._stop_event = mp_context().Event()
+        self.api_url = self.stream_url = url
+        if worker_mode is not None:
+            self.stream_worker_mode = worker_mode
+        self._stream_hub = None
+
+    def _get_stream_hub(self) -> StreamHub:
+        if self._stream_hub is None:
+            self._stream_hub = StreamHub(self._stop_event)
+        return self._stream_hub
+
+
+@pytest.fixture
+def dummy_runtime():
+    """Provide a runtime without endpoints."""
+    return StubRuntime()
+
+
+@pytest.fixture
+def make_stream():
+    """Provide a factory for stream "s" of user "user" on a stub runtime.
+
+    ``broker`` is a LocalBroker (or a base URL) the stream endpoints point at,
+    ``worker_mode`` becomes the runtime's default and ``attrs`` are set on the stream.
+    """
+
+    runtimes = []
+
+    def make(broker=None, worker_mode=None, **attrs) -> PlotuneStream:
+        runtime = StubRuntime(getattr(broker, "url", broker), worker_mode)
+        runtimes.append(runtime)
+        stream = PlotuneStream(runtime, "s", "user")
+        for name, value in attrs.items():
+            setattr(stream, name, value)
+        return stream
+
+    yield make
+    for runtime in runtimes:
+        if runtime._stream_hub is not None:
+            runtime._stream_hub.stop()
+
+
+@pytest.fixture
+def free_port() -> int:
+    """Provide a local TCP port nothing listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
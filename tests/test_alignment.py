@@ -0,0 +1,107 @@
+# tests/test_alignment.py
+import math
+
+import pytest
+
+from plotune_sdk.src.alignment import Aligner
+from plotune_sdk.src.expressions import compile_expression
+
+
+def test_asof_join_waits_for_every_key():
+    """Test that as-of rows follow the on key's times and are emitted once every key has caught up."""
+    a = Aligner(["x", "y"])
+    assert a.push("x", 1.0, 10.0) == []
+    assert a.push("x", 2.0, 20.0) == []
+    assert a.push("y", 0.5, 1.0) == []
+    assert a.push("y", 1.5, 2.0) == [(1.0, (10.0, 1.0))]
+    assert a.push("y", 3.0, 3.0) == [(2.0, (20.0, 2.0))]
+
+
+def test_asof_tolerance_and_missing_values_give_nan():
+    """Test that keys without a sample before the row, or only a stale one, give nan."""
+    a = Aligner(["x", "y"], tolerance=0.5)
+    rows = a.extend([("y", 1.0, 5.0), ("x", 0.5, 1.0), ("x", 1.2, 2.0), ("x", 3.0, 3.0), ("y", 4.0, 6.0)])
+    assert [t for t, _ in rows] == [0.5, 1.2, 3.0]
+    assert math.isnan(rows[0][1][1])
+    assert rows[1][1] == (2.0, 5.0)
+    assert math.isnan(rows[2][1][1])
+
+
+def test_linear_interpolates_between_neighbours():
+    """Test that linear alignment interpolates each key between the samples around the row time."""
+    a = Aligner(["x", "y"], method="linear")
+    rows = a.extend([("x", 1.0, 10.0), ("x", 2.0, 20.0), ("y", 0.0, 0.0), ("y", 4.0, 40.0)])
+    assert rows == [(1.0, (10.0, 10.0)), (2.0, (20.0, 20.0))]
+
+
+def test_resample_to_fixed_rate():
+    """Test that rate= emits rows on a fixed grid with interpolated values."""
+    a = Aligner(["x", "y"], method="linear", rate=2.0)
+    rows = a.extend([("x", 0.2, 0.0), ("y", 0.1, 0.0), ("x", 2.2, 2.0), ("y", 2.1, 20.0)])
+    assert [t for t, _ in rows] == [0.5, 1.0, 1.5, 2.0]
+    assert rows[0][1] == pytest.approx((0.3, 4.0))
+    assert rows[-1][1] == pytest.approx((1.8, 19.0))
+    assert a.flush() == []
+
+
+def test_max_delay_and_flush_release_rows_held_by_a_silent_key():
+    """Test that a key that stopped sending holds rows back only for max_delay, and flush emits the rest."""
+    a = Aligner(["x", "y"], max_delay=2.0)
+    a.push("y", 0.0, 7.0)
+    rows = a.extend(("x", float(t), float(t)) for t in range(1, 6))
+    assert rows == [(1.0, (1.0, 7.0)), (2.0, (2.0, 7.0)), (3.0, (3.0, 7.0))]
+    assert a.flush() == [(4.0, (4.0, 7.0)), (5.0, (5.0, 7.0))]
+
+
+def test_out_of_order_samples_are_dropped_and_other_keys_ignored():
+    """Test that samples going back in time are counted and dropped, and unknown keys ignored."""
+    a = Aligner(["x"])
+    assert a.push("x", 2.0, 1.0) == [(2.0, (1.0,))]
+    assert a.push("x", 1.0, 1.0) == []
+    assert a.push("z", 5.0, 1.0) == []
+    assert a.dropped == 1
+
+
+def test_buffers_stay_bounded_for_long_streams():
+    """Test that buffers shrink as rows are emitted, so each sample costs amortized constant work."""
+    a = Aligner(["fast", "slow"], on="slow", method="linear")
+    emitted = 0
+    for i in range(100_000):
+        emitted += len(a.push("fast", i * 0.001, float(i)))
+        if i % 100 == 0:
+            emitted += len(a.push("slow", i * 0.001, 0.0))
+        assert len(a._samples[0]) <= 101
+    assert emitted == 1000
+
+
+def test_full_buffers_emit_rows_early_and_count_what_they_discard():
+    """Test that a full buffer emits its oldest rows instead of losing them, and counts discarded samples."""
+    a = Aligner(["x", "y"], max_buffer=3)
+    rows = a.extend(("x", float(t), float(t)) for t in range(1, 7))
+    assert [t for t, _ in rows] == [1.0, 2.0, 3.0, 4.0]
+    assert all(math.isnan(y) for _, (_, y) in rows)
+    assert a.evicted == 0 and len(a.flush()) == 2
+
+    a = Aligner(["x", "y"], on="y", max_buffer=3)
+    assert a.extend(("x", float(t), float(t)) for t in range(1, 6)) == []
+    assert a.evicted == 2 and a.dropped == 0
+    assert a.push("y", 3.0, 0.0) == [(3.0, (3.0, 0.0))]
+
+
+def test_columns_feed_expressions():
+    """Test that aligned rows convert to columns an Expression can evaluate."""
+    a = Aligner(["volts", "amps"])
+    rows = a.extend([("volts", 1.0, 12.0), ("amps", 1.0, 2.0), ("volts", 2.0, 11.0), ("amps", 2.5, 3.0)])
+    times, columns = a.columns(rows)
+    assert list(times) == [1.0, 2.0]
+    assert compile_expression("volts * amps").evaluate(columns).tolist() == [24.0, 22.0]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"keys": []}, {"keys": ["a", "a"]}, {"keys": ["a"], "method": "cubic"}, {"keys": ["a"], "on": "b"}],
+)
+def test_invalid_configuration(kwargs):
+    """Test that invalid keys, methods or on= are rejected."""
+    with pytest.raises(ValueError):
+        Aligner(**kwargs)
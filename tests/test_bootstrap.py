@@ -0,0 +1,60 @@
+# tests/test_bootstrap.py
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from plotune_sdk.src.workers import bootstrap
+from plotune_sdk.testing import LocalBroker
+
+
+def test_worker_modules_skip_runtime_imports():
+    """Test that importing the worker modules loads none of the runtime's server and tray dependencies."""
+    code = (
+        "import sys\n"
+        "import plotune_sdk.src.workers.bootstrap, plotune_sdk.src.workers.consume_worker\n"
+        "import plotune_sdk.src.workers.producer_worker, plotune_sdk.src.workers.hub_worker\n"
+        "heavy = ('fastapi', 'uvicorn', 'httpx', 'PIL', 'pystray', 'diskcache', 'plotune_sdk.src.runtime')\n"
+        "print(','.join(m for m in heavy if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_unknown_start_method_is_rejected():
+    """Test that a start method the platform does not offer raises ValueError."""
+    with pytest.raises(ValueError):
+        bootstrap.set_start_method("teleport")
+
+
+@pytest.mark.asyncio
+async def test_spawned_workers_round_trip(make_stream):
+    """Test that producer and consumer workers started with "spawn" exchange samples through the broker."""
+    bootstrap.set_start_method("spawn")
+    try:
+        async with LocalBroker() as broker:
+            stream = make_stream(broker, worker_mode="process")
+            received = []
+
+            @stream.on_consume("g")
+            async def handler(msg):
+                received.append(msg["payload"]["value"])
+
+            await stream.start(broker.token)
+            try:
+                for _ in range(400):
+                    if broker.stats()["consumers"].get("user/s/g"):
+                        break
+                    await asyncio.sleep(0.05)
+                await stream.aproduce("A", 1.0, 3.0)
+                for _ in range(400):
+                    if received:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                await stream.stop()
+            assert received == [3.0]
+            assert stream.last_shutdown["forced"] == []
+    finally:
+        bootstrap.set_start_method(None)
@@ -0,0 +1,112 @@
+# tests/test_bounded_queue.py
+import queue
+import time
+
+import pytest
+
+from plotune_sdk.src.workers.bounded_queue import BoundedQueue
+from plotune_sdk.src.workers.common import is_stop
+
+
+def sample(key, t):
+    return {"type": "message", "payload": {"key": key, "time": t, "value": t}}
+
+
+def drain(bq):
+    items = []
+    while True:
+        try:
+            items.append(bq.get_nowait())
+        except queue.Empty:
+            return items
+
+
+def test_drop_newest_counts_drops():
+    """Test that drop-newest keeps the queued backlog and discards new items."""
+    bq = BoundedQueue(queue.Queue(maxsize=3), capacity=3, policy="drop-newest")
+    for t in range(5):
+        bq.put(sample("A", t))
+
+    assert [m["payload"]["time"] for m in drain(bq)] == [0, 1, 2]
+    assert bq.counters.get("dropped") == 2
+    assert bq.counters.get("high_water") == 3
+
+
+def test_drop_oldest_keeps_recent():
+    """Test that drop-oldest evicts the head of the queue."""
+    bq = BoundedQueue(queue.Queue(maxsize=3), capacity=3, policy="drop-oldest")
+    for t in range(5):
+        bq.put(sample("A", t))
+
+    assert [m["payload"]["time"] for m in drain(bq)] == [2, 3, 4]
+    assert bq.counters.get("dropped") == 2
+
+
+def test_keep_latest_per_key_parks_and_flushes():
+    """Test that overflow keeps only the newest sample per key until there is room."""
+    bq = BoundedQueue(queue.Queue(maxsize=2), capacity=2, policy="keep-latest-per-key")
+    for t in range(6):
+        bq.put(sample("A" if t % 2 else "B", t))
+
+    assert bq.counters.get("pending") == 2
+    assert [m["payload"]["time"] for m in drain(bq)] == [0, 1]
+
+    bq.flush()
+    assert [m["payload"]["time"] for m in drain(bq)] == [4, 5]
+    assert bq.counters.get("dropped") == 2
+    assert bq.counters.get("pending") == 0
+
+
+def test_block_policy_raises_full_without_blocking():
+    """Test that put_nowait under the block policy surfaces Full to the caller."""
+    bq = BoundedQueue(queue.Queue(maxsize=1), capacity=1, policy="block")
+    bq.put_nowait(sample("A", 0))
+    with pytest.raises(queue.Full):
+        bq.put_nowait(sample("A", 1))
+
+
+def test_put_stop_goes_behind_parked_samples():
+    """Test that put_stop queues the stop message after parked samples, and raises Full when there is no room."""
+    bq = BoundedQueue(queue.Queue(maxsize=3), capacity=3, policy="keep-latest-per-key")
+    for t in range(5):
+        bq.put(sample("A" if t % 2 else "B", t))
+    assert [m["payload"]["time"] for m in drain(bq)] == [0, 1, 2]
+    assert bq.counters.get("pending") == 2
+
+    bq.put_stop(timeout=1)
+    items = drain(bq)
+    assert [m["payload"]["time"] for m in items[:2]] == [3, 4]
+    assert is_stop(items[2])
+
+    full = BoundedQueue(queue.Queue(maxsize=1), capacity=1, policy="block")
+    full.put(sample("A", 0))
+    with pytest.raises(queue.Full):
+        full.put_stop(timeout=0.05)
+
+
+def test_keep_latest_flushes_parked_samples_without_further_puts():
+    """Test that parked samples reach the queue once there is room, even if nothing else is put."""
+    bq = BoundedQueue(queue.Queue(maxsize=2), capacity=2, policy="keep-latest-per-key", flush_interval=0.01)
+    for t in range(4):
+        bq.put(sample("A" if t % 2 else "B", t))
+    assert bq.counters.get("pending") == 2
+    assert [m["payload"]["time"] for m in drain(bq)] == [0, 1]
+
+    deadline = time.monotonic() + 5
+    received = []
+    while len(received) < 2 and time.monotonic() < deadline:
+        received.extend(m["payload"]["time"] for m in drain(bq))
+        time.sleep(0.01)
+    assert received == [2, 3]
+    assert bq.counters.get("pending") == 0
+
+
+def test_bounded_queue_pickles_without_its_lock():
+    """Test that a bounded queue handed to a worker process pickles and gets a lock of its own."""
+    bq = BoundedQueue(queue.Queue(), capacity=0, policy="keep-latest-per-key")
+    state = bq.__getstate__()
+    assert "_lock" not in state and "_flusher" not in state
+    clone = BoundedQueue.__new__(BoundedQueue)
+    clone.__setstate__(state)
+    clone.put(sample("A", 1))
+    assert clone.get_nowait()["payload"]["time"] == 1
@@ -0,0 +1,75 @@
+# tests/test_broker.py
+import asyncio
+
+import aiohttp
+import pytest
+
+from plotune_sdk.testing import LocalBroker
+
+
+async def wait_for(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_auth_route_returns_stream_token():
+    """Test that the broker hands out its stream token for a bearer license token."""
+    async with LocalBroker(token="abc") as broker:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{broker.url}/auth/stream") as resp:
+                assert resp.status == 401
+            async with session.get(f"{broker.url}/auth/stream", headers={"Authorization": "Bearer lic"}) as resp:
+                assert (await resp.json()) == {"token": "abc"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec", ["auto", "json", "gorilla"])
+async def test_stream_round_trip_through_broker(make_stream, codec):
+    """Test that samples produced on a stream reach its consume handler via the broker."""
+    async with LocalBroker() as broker:
+        stream = make_stream(broker, worker_mode="inline")
+        stream.codec = codec
+        stream.producer_batch_size = 50
+        received = []
+
+        @stream.on_consume("g", dispatch="inline")
+        async def handler(msg):
+            received.append(msg["payload"]["time"])
+
+        try:
+            await stream.start(broker.token)
+            await wait_for(lambda: broker.stats()["consumers"].get("user/s/g") == 1)
+            await stream.aproduce_many({"A": (list(range(100)), [0.5] * 100)})
+            await wait_for(lambda: len(received) == 100)
+            assert received == [float(t) for t in range(100)]
+            assert broker.received == 100
+        finally:
+            await stream.stop()
+
+
+@pytest.mark.asyncio
+async def test_group_members_share_messages():
+    """Test that consumers of one group split the messages and other groups get all of them."""
+    async with LocalBroker() as broker:
+        headers = {"Authorization": f"Bearer {broker.token}"}
+        base = broker.url.replace("http", "ws")
+        async with aiohttp.ClientSession() as session:
+            a1 = await session.ws_connect(f"{base}/ws/consumer/u/s/a", headers=headers)
+            a2 = await session.ws_connect(f"{base}/ws/consumer/u/s/a", headers=headers)
+            b = await session.ws_connect(f"{base}/ws/consumer/u/s/b", headers=headers)
+            await wait_for(lambda: len(broker.stats()["consumers"]) == 2)
+            producer = await session.ws_connect(f"{base}/ws/producer/u/s", headers=headers)
+            for t in range(4):
+                await producer.send_json({"key": "K", "time": t, "value": t})
+
+            assert sorted([(await b.receive_json())["time"] for _ in range(4)]) == [0, 1, 2, 3]
+            split = [(await a1.receive_json())["time"] for _ in range(2)] + [
+                (await a2.receive_json())["time"] for _ in range(2)
+            ]
+            assert sorted(split) == [0, 1, 2, 3]
+            for ws in (a1, a2, b, producer):
+                await ws.close()
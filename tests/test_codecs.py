@@ -0,0 +1,147 @@
+# tests/test_codecs.py
+import asyncio
+import queue
+import threading
+
+import pytest
+from aiohttp import web
+
+from plotune_sdk.src.streams import PlotuneStream
+from plotune_sdk.src.workers import consume_worker
+from plotune_sdk.src.workers.codecs import (
+    BINARY_SUBPROTOCOL,
+    GORILLA_SUBPROTOCOL,
+    BinaryCodec,
+    GorillaCodec,
+    JsonCodec,
+    encode_frame,
+    get_codec,
+    msgspec,
+    negotiated_codec,
+    orjson,
+)
+
+SAMPLES = [{"key": "A", "time": 1.5, "value": 2.0}, {"key": "B", "time": 1.5, "value": -1.0}]
+
+TEXT_CODECS = ["json"] + (["orjson"] if orjson else []) + (["msgspec"] if msgspec else [])
+
+
+@pytest.mark.parametrize("name", TEXT_CODECS)
+def test_text_codecs_share_the_wire_format(name):
+    """Test that every JSON backend writes frames the stdlib codec can read, and back."""
+    codec = get_codec(name)
+    frame = codec.encode(SAMPLES)
+    assert isinstance(frame, str)
+    assert JsonCodec().decode(frame) == SAMPLES
+    assert codec.decode(JsonCodec().encode(SAMPLES)) == SAMPLES
+
+
+def test_binary_codec_round_trip():
+    """Test that binary frames keep keys, times and values and store each key once."""
+    codec = BinaryCodec()
+    samples = SAMPLES + [{"key": "A", "time": 2.5, "value": 3.0}]
+    frame = codec.encode(samples)
+
+    assert codec.decode(frame) == samples
+    assert codec.decode_records(frame)[2] == ("A", 2.5, 3.0)
+    # header + two keys + three 18-byte records
+    assert len(frame) == 6 + 2 * 3 + 3 * 18
+    assert codec.decode(codec.encode({"key": "Ä", "time": 0.0, "value": 1.0})) == [
+        {"key": "Ä", "time": 0.0, "value": 1.0}
+    ]
+
+
+def test_negotiation_falls_back_to_json():
+    """Test that a server which accepts no subprotocol gets JSON frames."""
+    assert negotiated_codec("binary", None).binary is False
+    assert negotiated_codec("auto", BINARY_SUBPROTOCOL).binary is True
+    assert negotiated_codec("json", None).name == "json"
+    assert negotiated_codec("gorilla", GORILLA_SUBPROTOCOL).name == "gorilla"
+    assert negotiated_codec("gorilla", BINARY_SUBPROTOCOL).name == "binary"
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+
+def test_gorilla_codec_round_trip():
+    """Test that gorilla frames keep values exactly, times to the microsecond, and compress regular signals."""
+    codec = GorillaCodec()
+    records = [("A", 1_700_000_000 + i * 0.001, float(i // 100)) for i in range(1000)]
+    records += [("B", 5.0 + i * 0.37, v) for i, v in enumerate([0.1, -2.5, 1e300, -0.0, float("inf"), 0.1])]
+    frame = codec.encode_records(records)
+
+    decoded = codec.decode_records(frame)
+    assert [(k, v) for k, _, v in decoded] == [(k, v) for k, _, v in records]
+    assert all(abs(t - t0) < 1e-6 for (_, t, _), (_, t0, _) in zip(decoded, records))
+    # one bit per regular timestamp and repeated value versus 18 bytes per binary record
+    assert len(frame) < len(BinaryCodec().encode_records(records)) / 20
+
+    odd = [("C", float("nan"), 1.0), ("C", 2.0, float("nan"))]
+    out = codec.decode(codec.encode([{"key": k, "time": t, "value": v} for k, t, v in odd]))
+    assert out[1]["time"] == 2.0 and out[0]["time"] != out[0]["time"]
+
+
+@pytest.mark.asyncio
+async def test_consume_negotiates_binary_frames(monkeypatch):
+    """Test that a consumer offered binary frames puts each frame as one record block."""
+
+    async def ws_handler(request):
+        ws = web.WebSocketResponse(protocols=(BINARY_SUBPROTOCOL,))
+        await ws.prepare(request)
+        await ws.send_bytes(BinaryCodec().encode(SAMPLES))
+        await ws.receive()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws", ws_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(consume_worker, "build_url", lambda *args: f"ws://127.0.0.1:{port}/ws")
+
+    q = queue.Queue()
+    stop = threading.Event()
+    task = asyncio.create_task(consume_worker.consume("u", "s", "g", "t", q, stop, codec="auto"))
+    try:
+        item = await asyncio.to_thread(q.get, True, 5)
+        assert item == {"records": [("A", 1.5, 2.0), ("B", 1.5, -1.0)]}
+    finally:
+        stop.set()
+        await asyncio.wait_for(task, 5)
+        await runner.cleanup()
+
+
+@pytest.mark.parametrize("name", TEXT_CODECS[1:])
+def test_fast_codecs_encode_numpy_scalars(name):
+    """Test that samples holding NumPy scalars encode like plain numbers."""
+    np = pytest.importorskip("numpy")
+    codec = get_codec(name)
+    assert codec.decode(codec.encode({"key": "A", "time": np.float64(1.5), "value": np.int64(2)})) == {
+        "key": "A",
+        "time": 1.5,
+        "value": 2,
+    }
+
+
+@pytest.mark.parametrize("codec", [BinaryCodec(), GorillaCodec()])
+def test_binary_codecs_fall_back_to_json_for_non_numeric_batches(codec):
+    """Test that a batch with a non-numeric value goes as a JSON text frame instead of failing to encode."""
+    samples = SAMPLES + [{"key": "state", "time": 2.0, "value": "running"}]
+    frame = encode_frame(codec, samples)
+    assert isinstance(frame, str) and JsonCodec().decode(frame) == samples
+    assert isinstance(encode_frame(codec, SAMPLES), bytes)
+    assert encode_frame(JsonCodec(), SAMPLES) == JsonCodec().encode(SAMPLES)
+
+
+def test_gorilla_skips_empty_columns():
+    """Test that a key without samples is left out of a gorilla frame rather than breaking the encoder."""
+    codec = GorillaCodec()
+    frame = codec.encode_columns({"A": ([], []), "B": ([1.0, 2.0], [3.0, 4.0])})
+    assert codec.decode_records(frame) == [("B", 1.0, 3.0), ("B", 2.0, 4.0)]
+
+
+def test_json_is_the_default_codec(dummy_runtime):
+    """Test that streams keep the plain JSON wire format unless another codec is chosen."""
+    assert PlotuneStream(dummy_runtime, "s", "user").codec == "json"
+    assert negotiated_codec("json", None).name == "json"
@@ -0,0 +1,161 @@
+# tests/test_consume_worker.py
+import asyncio
+import pickle
+import queue
+import threading
+
+import pytest
+from aiohttp import web
+
+from plotune_sdk.src.streams import PlotuneStream
+from plotune_sdk.src.workers import consume_worker
+from plotune_sdk.src.workers.bounded_queue import BoundedQueue, make_bounded_queue
+from plotune_sdk.src.workers.filters import KeyFilter
+
+
+async def serve_frames(monkeypatch, frames):
+    """Serve ``frames`` as text frames to one consumer; return the runner to clean up."""
+
+    async def ws_handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for frame in frames:
+            await ws.send_json(frame)
+        await ws.receive()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws", ws_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(consume_worker, "build_url", lambda *args: f"ws://127.0.0.1:{port}/ws")
+    return runner
+
+
+@pytest.mark.asyncio
+async def test_consume_coalesces_frames_into_chunks(monkeypatch):
+    """Test that a burst of frames reaches the queue in a few chunked puts, in order."""
+    frames = [{"key": "A", "time": t, "value": t} for t in range(50)]
+    runner = await serve_frames(monkeypatch, frames)
+    q = queue.Queue()
+    stop = threading.Event()
+    task = asyncio.create_task(consume_worker.consume("u", "s", "g", "t", q, stop, chunk_size=20, chunk_wait=0.05))
+    try:
+        messages = []
+        puts = 0
+        while len(messages) < 50:
+            item = await asyncio.to_thread(q.get, True, 5)
+            puts += 1
+            messages.extend(PlotuneStream._expand_consumed(item))
+        assert [m["payload"]["time"] for m in messages] == list(range(50))
+        assert puts < 50
+    finally:
+        stop.set()
+        await asyncio.wait_for(task, 5)
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_consume_flushes_partial_chunk_after_wait(monkeypatch):
+    """Test that a lone frame is put on its own once chunk_wait has passed."""
+    runner = await serve_frames(monkeypatch, [{"key": "A", "time": 1, "value": 2}])
+    q = queue.Queue()
+    stop = threading.Event()
+    task = asyncio.create_task(consume_worker.consume("u", "s", "g", "t", q, stop, chunk_size=100, chunk_wait=0.01))
+    try:
+        item = await asyncio.to_thread(q.get, True, 5)
+        assert item == {"type": "message", "payload": {"key": "A", "time": 1, "value": 2}}
+    finally:
+        stop.set()
+        await asyncio.wait_for(task, 5)
+        await runner.cleanup()
+
+
+def test_keep_latest_policy_reduces_chunks():
+    """Test that keep-latest-per-key parks only the newest sample per key of a chunk."""
+    bq = BoundedQueue(queue.Queue(maxsize=1), capacity=1, policy="keep-latest-per-key")
+    bq.put({"type": "message", "payload": {"key": "X", "time": 0, "value": 0}})
+    bq.put(
+        consume_worker.chunk_item(
+            [{"type": "message", "payload": {"key": k, "time": t, "value": t}} for t in range(3) for k in "AB"]
+        )
+    )
+    assert {k: v["payload"]["time"] for k, v in bq._pending.items()} == {"A": 2, "B": 2}
+
+
+@pytest.mark.asyncio
+async def test_consume_drops_unsubscribed_keys(monkeypatch):
+    """Test that the worker puts only samples whose key passes the key filter."""
+    frames = [{"key": k, "time": t, "value": t} for t in range(10) for k in ("motor.1", "temp", "other")]
+    runner = await serve_frames(monkeypatch, frames)
+    q = queue.Queue()
+    stop = threading.Event()
+    key_filter = KeyFilter.from_spec(["temp", "motor.*"])
+    task = asyncio.create_task(
+        consume_worker.consume("u", "s", "g", "t", q, stop, chunk_size=100, chunk_wait=0.05, key_filter=key_filter)
+    )
+    try:
+        messages = []
+        while len(messages) < 20:
+            messages.extend(PlotuneStream._expand_consumed(await asyncio.to_thread(q.get, True, 5)))
+        await asyncio.sleep(0.1)
+        assert q.empty()
+        assert {m["payload"]["key"] for m in messages} == {"motor.1", "temp"}
+    finally:
+        stop.set()
+        await asyncio.wait_for(task, 5)
+        await runner.cleanup()
+
+
+def test_group_filter_is_the_union_of_handler_keys():
+    """Test that the worker filter covers every handler and each handler sees only its keys."""
+    stream = PlotuneStream(runtime=None, stream_name="s", username="u")
+    seen = {"a": [], "b": []}
+
+    @stream.on_consume("g", dispatch="inline", keys="A")
+    async def a(msg):
+        seen["a"].append(msg["payload"]["key"])
+
+    @stream.on_consume("g", dispatch="inline", keys=["B*"])
+    async def b(msg):
+        seen["b"].append(msg["payload"]["key"])
+
+    assert stream._consume_options("g")["key_filter"] == KeyFilter(["A"], ["B*"])
+    assert pickle.loads(pickle.dumps(KeyFilter(["A"], ["B*"]))).matches("Bx")
+
+    async def run():
+        stream._make_deliver("g")([{"records": [("A", 0.0, 1.0), ("Bx", 0.0, 2.0), ("C", 0.0, 3.0)]}], 0.0)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert seen == {"a": ["A"], "b": ["Bx"]}
+
+    @stream.on_consume("g")
+    async def everything(msg):
+        pass
+
+    assert stream._consume_options("g")["key_filter"] is None
+
+
+@pytest.mark.asyncio
+async def test_bad_item_does_not_drop_its_chunk_on_the_ring(monkeypatch):
+    """Test that a non-numeric sample is rejected alone and the rest of its chunk reaches the shm ring."""
+    frames = [{"key": "A", "time": t, "value": "bad" if t == 3 else t} for t in range(6)]
+    runner = await serve_frames(monkeypatch, frames)
+    q = make_bounded_queue(ring_capacity=256)
+    stop = threading.Event()
+    task = asyncio.create_task(consume_worker.consume("u", "s", "g", "t", q, stop, chunk_size=10, chunk_wait=0.05))
+    try:
+        records = []
+        while len(records) < 5:
+            records.extend((await asyncio.to_thread(q.get, True, 5))["records"])
+        assert [t for _, t, _ in records] == [0, 1, 2, 4, 5]
+        assert q.counters.get("rejected") == 1
+    finally:
+        stop.set()
+        await asyncio.wait_for(task, 5)
+        await runner.cleanup()
+        q.close()
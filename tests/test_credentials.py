@@ -0,0 +1,74 @@
+# tests/test_credentials.py
+import asyncio
+import base64
+import json
+
+import aiohttp
+import pytest
+
+from plotune_sdk.src.workers.credentials import SharedToken, token_expiry
+from plotune_sdk.testing import LocalBroker
+
+
+def test_shared_token_bumps_version_only_on_change():
+    """Test that SharedToken.set stores the new token and bumps the version only when it differs."""
+    token = SharedToken("a")
+    assert (token.get(), token.version) == ("a", 1)
+    token.set("a")
+    assert token.version == 1
+    token.set("bb")
+    assert (token.get(), token.version) == ("bb", 2)
+    with pytest.raises(ValueError):
+        SharedToken(capacity=4).set("too long")
+
+
+def test_token_expiry_from_response_or_jwt():
+    """Test that token_expiry reads expires_at, expires_in or a JWT exp claim."""
+    assert token_expiry({"token": "x", "expires_at": 50}) == 50.0
+    assert token_expiry({"token": "x", "expires_in": 30}, now=100.0) == 130.0
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": 1234}).encode()).rstrip(b"=").decode()
+    assert token_expiry({"token": f"h.{claims}.s"}) == 1234.0
+    assert token_expiry({"token": "opaque"}) is None
+
+
+async def fetch_token(url: str) -> str:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/auth/stream", headers={"Authorization": "Bearer license"}) as resp:
+            return (await resp.json())["token"]
+
+
+@pytest.mark.asyncio
+async def test_rotated_token_keeps_stream_running_past_expiry(make_stream):
+    """Test that workers pick up a token handed to update_token when the old one expires, without restarts."""
+    async with LocalBroker(token_ttl=2.0) as broker:
+        stream = make_stream(broker, worker_mode="inline")
+        received = []
+
+        @stream.on_consume("g", dispatch="inline")
+        async def handler(msg):
+            received.append(msg["payload"]["value"])
+
+        async def produce_and_wait(value):
+            for _ in range(100):
+                if broker.stats()["consumers"].get("user/s/g"):
+                    break
+                await asyncio.sleep(0.05)
+            await stream.aproduce("A", value, value)
+            for _ in range(100):
+                if value in received:
+                    return
+                await asyncio.sleep(0.05)
+
+        try:
+            await stream.start(await fetch_token(broker.url))
+            await produce_and_wait(1.0)
+            assert received == [1.0]
+
+            await asyncio.sleep(1.0)
+            stream.update_token(await fetch_token(broker.url))
+            await asyncio.sleep(1.5)  # the first token has expired and its connections were closed
+            await produce_and_wait(2.0)
+            assert received == [1.0, 2.0]
+            assert all(health["restarts"] == 0 for health in stream.stats()["supervisor"].values())
+        finally:
+            await stream.stop()
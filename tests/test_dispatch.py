@@ -0,0 +1,171 @@
+# tests/test_dispatch.py
+import asyncio
+import pytest
+
+from plotune_sdk.src.dispatch import BatchDispatcher, ColumnBatch, HandlerDispatcher
+
+
+def message(key, i):
+    return {"type": "message", "payload": {"key": key, "time": i, "value": i}}
+
+
+@pytest.mark.asyncio
+async def test_bounded_limits_concurrency():
+    """Test that bounded dispatch never runs more than max_concurrency handlers at once."""
+    running = 0
+    peak = 0
+
+    async def handler(msg):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+
+    dispatcher = HandlerDispatcher("g", handler, "bounded", max_concurrency=3)
+    for i in range(30):
+        dispatcher.submit(message("A", i))
+    assert dispatcher.in_flight == 30
+
+    await dispatcher.close(timeout=5)
+    assert peak == 3
+    assert dispatcher.handled == 30
+
+
+@pytest.mark.asyncio
+async def test_ordered_preserves_per_key_order():
+    """Test that ordered dispatch keeps messages of one key in arrival order."""
+    seen = {"A": [], "B": []}
+
+    async def handler(msg):
+        payload = msg["payload"]
+        # later messages finish sooner, which would reorder concurrent dispatch
+        await asyncio.sleep(0.001 * (20 - payload["time"] % 20))
+        seen[payload["key"]].append(payload["time"])
+
+    dispatcher = HandlerDispatcher("g", handler, "ordered", max_concurrency=4)
+    for i in range(20):
+        dispatcher.submit(message("A" if i % 2 else "B", i))
+
+    await dispatcher.close(timeout=5)
+    assert seen["A"] == list(range(1, 20, 2))
+    assert seen["B"] == list(range(0, 20, 2))
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_after_timeout():
+    """Test that close() cancels handlers still running after the drain timeout."""
+    cancelled = asyncio.Event()
+
+    async def handler(msg):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    dispatcher = HandlerDispatcher("g", handler, "concurrent")
+    dispatcher.submit(message("A", 0))
+    await asyncio.sleep(0)
+
+    await dispatcher.close(timeout=0.05)
+    assert cancelled.is_set()
+    assert dispatcher.in_flight == 0
+
+
+def test_unknown_mode_rejected():
+    """Test that an unknown dispatch mode fails at registration time."""
+
+    async def handler(msg):
+        pass
+
+    with pytest.raises(ValueError):
+        HandlerDispatcher("g", handler, "yolo")
+
+
+@pytest.mark.asyncio
+async def test_batch_flushes_on_size_and_wait():
+    """Test that batches close at max_size and the remainder after max_wait."""
+    batches = []
+
+    async def handler(batch):
+        batches.append([m["payload"]["time"] for m in batch])
+
+    dispatcher = BatchDispatcher("g", handler, max_size=4, max_wait=0.01)
+    for i in range(6):
+        dispatcher.submit(message("A", i))
+
+    await asyncio.sleep(0.05)
+    assert batches == [[0, 1, 2, 3], [4, 5]]
+    await dispatcher.close(timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_columnar_batch_by_key():
+    """Test that a columnar batch exposes numeric columns split per key."""
+    received = []
+
+    async def handler(batch):
+        received.append(batch)
+
+    dispatcher = BatchDispatcher("g", handler, max_size=3, columnar=True)
+    for i, key in enumerate(["A", "B", "A"]):
+        dispatcher.submit(message(key, i))
+    await dispatcher.close(timeout=1)
+
+    (batch,) = received
+    assert isinstance(batch, ColumnBatch)
+    assert len(batch) == 3
+    assert batch.keys == ["A", "B", "A"]
+    times, values = batch.by_key()["A"]
+    assert list(times) == [0.0, 2.0]
+    assert list(values) == [0.0, 2.0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["concurrent", "bounded", "ordered"])
+async def test_submit_after_close_is_rejected(mode):
+    """Test that messages submitted after close() are dropped instead of starting tasks nothing cancels."""
+    handled = []
+
+    async def handler(msg):
+        handled.append(msg)
+
+    dispatcher = HandlerDispatcher("g", handler, mode, max_concurrency=2)
+    await dispatcher.close(timeout=1)
+    dispatcher.submit(message("A", 1))
+    await asyncio.sleep(0)
+
+    assert handled == [] and dispatcher.in_flight == 0
+    assert dispatcher._lane_tasks == [] and not dispatcher._tasks
+    assert dispatcher.stats()["rejected"] == 1
+
+    batch = BatchDispatcher("g", handler, max_size=1)
+    await batch.close(timeout=1)
+    batch.submit(message("A", 1))
+    assert batch.in_flight == 0 and batch.stats()["rejected"] == 1
+
+
+def test_column_batch_ignores_non_dict_payloads():
+    """Test that messages whose payload is not a dict become empty rows instead of breaking the batch."""
+    batch = ColumnBatch([message("A", 1), {"type": "message", "payload": "text"}, {"payload": None}, 5])
+    assert batch.keys == ["A", None, None, None]
+    assert list(batch.values)[0] == 1.0
+    assert all(v != v for v in list(batch.values)[1:])
+
+
+@pytest.mark.asyncio
+async def test_batch_stats_count_handled_messages():
+    """Test that a batch dispatcher reports handled messages and handled batches separately."""
+
+    async def handler(batch):
+        pass
+
+    dispatcher = BatchDispatcher("g", handler, max_size=4, max_wait=0.01)
+    for i in range(6):
+        dispatcher.submit(message("A", i))
+    await dispatcher.close(timeout=1)
+
+    stats = dispatcher.stats()
+    assert stats["handled"] == 6
+    assert stats["handled_batches"] == stats["batches"] == 2
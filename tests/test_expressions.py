@@ -0,0 +1,123 @@
+# tests/test_expressions.py
+import math
+import pickle
+from array import array
+
+import pytest
+
+from plotune_sdk.models.variable_models import NewVariable, Variable
+from plotune_sdk.src import expressions
+from plotune_sdk.src.expressions import compile_expression, compile_variable
+
+
+def test_evaluates_over_columns_at_once():
+    """Test that an expression is evaluated element-wise over the referenced columns."""
+    np = pytest.importorskip("numpy")
+    expr = compile_expression("sqrt(ax**2 + ay**2) * 2")
+    assert expr.names == ("ax", "ay")
+    out = expr.evaluate({"ax": [3.0, 0.0, 6.0], "ay": np.array([4.0, 1.0, 8.0])})
+    assert out.dtype == np.float64
+    assert out.tolist() == [10.0, 2.0, 20.0]
+
+
+def test_scalars_broadcast_and_scalar_inputs_give_a_float():
+    """Test that scalar values broadcast against columns and alone give a plain float."""
+    expr = compile_expression("x * gain + 1")
+    assert expr.evaluate({"x": [1.0, 2.0], "gain": 10}).tolist() == [11.0, 21.0]
+    assert expr(x=2, gain=3) == 7.0
+
+
+def test_functions_constants_and_conditions():
+    """Test that whitelisted functions, constants and where() with comparisons work on arrays."""
+    expr = compile_expression("where((x > 0) & (x < 10), clip(x, 2, 5), -1) + max(x, 0, -x) * 0 + floor(pi)")
+    assert expr.evaluate({"x": [-3.0, 1.0, 4.0, 12.0]}).tolist() == [2.0, 5.0, 7.0, 2.0]
+
+
+def test_backticks_reference_names_that_are_not_identifiers():
+    """Test that backticked names map to variables that are not Python identifiers or clash with constants."""
+    expr = compile_expression("`engine.rpm` / 60 + `e`")
+    assert expr.names == ("engine.rpm", "e")
+    assert expr.evaluate({"engine.rpm": [600.0], "e": [1.0]}).tolist() == [11.0]
+
+
+def test_compiled_form_is_cached_and_pickles_by_source():
+    """Test that compiling the same string returns the cached expression, also after pickling."""
+    expr = compile_expression("a + b")
+    assert compile_expression("a + b") is expr
+    assert pickle.loads(pickle.dumps(expr)) is expr
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "__import__('os').system('true')",
+        "x.__class__",
+        "x[0]",
+        "lambda: 1",
+        "'text'",
+        "[x for x in y]",
+        "0 < x < 1",
+        "not x",
+        "x if y else z",
+        "open('f')",
+        "sqrt",
+        "sqrt(x, y)",
+        "min(x)",
+        "sqrt(x=1)",
+        "__builtins__",
+        "`x",
+        "x +",
+        "x & y",
+        "(x > 1) & 1",
+        "-" * 3000 + "x",
+    ],
+)
+def test_rejects_anything_outside_the_whitelist(source):
+    """Test that syntax errors and non-whitelisted constructs are rejected at compile time."""
+    with pytest.raises(ValueError):
+        compile_expression(source)
+
+
+def test_integer_powers_do_not_grow_without_bound():
+    """Test that integer literals are evaluated as floats, so huge powers overflow to inf instead of hanging."""
+    assert compile_expression("9**9**9").evaluate({}) == math.inf
+    assert compile_expression("9**9**9 + x").evaluate({"x": [1.0]}).tolist() == [math.inf]
+
+
+@pytest.mark.parametrize("source", ["a / b", "a // b", "a % b", "(a - 3) ** 0.5", "b ** -1", "a ** 1e300"])
+def test_backends_agree_on_division_by_zero_and_overflow(source, monkeypatch):
+    """Test that the NumPy and per-row backends give the same inf and nan for float errors."""
+    np = pytest.importorskip("numpy")
+    columns = {"a": [1.0, -1.0, 0.0, 2.0], "b": [0.0, 0.0, 0.0, 3.0]}
+    expr = compile_expression(source)
+    vectorized = expr.evaluate(columns)
+    monkeypatch.setattr(expressions, "np", None)
+    rows = expr.evaluate({name: array("d", column) for name, column in columns.items()})
+    np.testing.assert_array_equal(np.asarray(rows), vectorized)
+
+
+def test_missing_values_raise():
+    """Test that evaluating without a referenced variable raises KeyError naming it."""
+    with pytest.raises(KeyError, match="b"):
+        compile_expression("a + b").evaluate({"a": [1.0]})
+
+
+def test_compile_variable_checks_ref_variables():
+    """Test that a NewVariable's expression may only reference its ref_variables."""
+    refs = [Variable(name=n, source_ip="127.0.0.1", source_port=8000) for n in ("volts", "amps")]
+    expr = compile_variable(NewVariable(ref_variables=refs, expr="volts * amps"))
+    assert expr.evaluate({"volts": [12.0], "amps": [2.0]}).tolist() == [24.0]
+    with pytest.raises(ValueError, match="ohms"):
+        compile_variable(NewVariable(ref_variables=refs, expr="volts / ohms"))
+
+
+def test_row_fallback_without_numpy(monkeypatch):
+    """Test that without NumPy expressions are evaluated per row with math, giving nan for domain errors."""
+    monkeypatch.setattr(expressions, "np", None)
+    expr = compile_expression("sqrt(x) + where(x > 4, 1, 0) + y")
+    out = expr.evaluate({"x": array("d", [4.0, 9.0, -1.0]), "y": 0.5})
+    assert isinstance(out, array)
+    assert out[:2].tolist() == [2.5, 4.5] and math.isnan(out[2])
+    assert expr(x=16.0, y=0.0) == 5.0
+    with pytest.raises(ValueError):
+        expr.evaluate({"x": [1.0, 2.0], "y": [1.0]})
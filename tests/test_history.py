@@ -0,0 +1,68 @@
+# tests/test_history.py
+import pytest
+
+from plotune_sdk.src import history as history_module
+from plotune_sdk.src.history import KeyHistory, StreamHistory
+from plotune_sdk.src.streams import PlotuneStream
+
+
+@pytest.fixture(params=["numpy", "array"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(history_module, "np", None)
+    return request.param
+
+
+def test_ring_keeps_the_last_depth_samples(backend):
+    """Test that the ring wraps around and windows stay contiguous, oldest first."""
+    h = KeyHistory(depth=4)
+    assert h.latest() is None
+    for t in range(10):
+        h.append(float(t), t * 10.0)
+
+    assert h.latest() == (9.0, 90.0)
+    times, values = h.window()
+    assert list(times) == [6.0, 7.0, 8.0, 9.0]
+    assert list(values) == [60.0, 70.0, 80.0, 90.0]
+    times, values = h.window(6.5, 8.0)
+    assert list(times) == [7.0, 8.0] and list(values) == [70.0, 80.0]
+    assert len(h.window(20.0)[0]) == 0
+
+
+def test_window_is_a_view(backend):
+    """Test that windows share memory with the ring instead of copying it."""
+    h = KeyHistory(depth=8)
+    h.extend([float(t) for t in range(20)], [0.0] * 20)
+    times, _ = h.window(15.0)
+    h.append(20.0, 0.0)
+    h.append(21.0, 0.0)
+    assert list(h.window(15.0)[0]) == [15.0, 16.0, 17.0, 18.0, 19.0, 20.0, 21.0]
+    if backend == "numpy":
+        assert times.base is not None
+    else:
+        assert isinstance(times, memoryview)
+
+
+def test_stream_history_from_consumed_messages():
+    """Test that the stream feeds consumed messages of its history group into the history."""
+    stream = PlotuneStream(runtime=None, stream_name="s", username="u")
+    with pytest.raises(RuntimeError):
+        stream.latest("A")
+    stream.enable_history(depth=3, group="g")
+
+    stream._make_deliver("g")(
+        [
+            {"records": [("A", 1.0, 1.5), ("A", 2.0, 2.5), ("B", 1.0, -1.0)]},
+            {"type": "message", "payload": {"key": "A", "time": 3, "value": 3}},
+        ],
+        0.0,
+    )
+    stream._make_deliver("other")([{"type": "message", "payload": {"key": "A", "time": 9, "value": 9}}], 0.0)
+
+    assert stream.latest("A") == (3.0, 3.0)
+    assert stream.latest("missing") is None
+    assert list(stream.window("A", 2.0)[1]) == [2.5, 3.0]
+    assert sorted(stream.history.keys()) == ["A", "B"]
+    assert len(StreamHistory().window("missing")[0]) == 0
@@ -0,0 +1,186 @@
+# tests/test_operators.py
+import asyncio
+import json
+import math
+import pickle
+import queue
+import threading
+
+import pytest
+from aiohttp import web
+
+from plotune_sdk.src.workers import consume_worker
+from plotune_sdk.src.workers.operators import Deadband, Filter, Map, Pipeline, Scale, Window, sample_record
+from plotune_sdk.testing import LocalBroker
+
+
+def test_scale_filter_and_map_apply_per_sample():
+    """Test that Scale, Filter and Map transform values and keep keys and times."""
+    records = [("A", 0.0, 1.0), ("A", 1.0, 5.0), ("A", 2.0, 9.0)]
+    pipeline = Pipeline(Scale(2.0, 1.0), Filter(low=5.0, high=15.0), Map(math.sqrt))
+    assert pipeline.process(records) == [("A", 1.0, math.sqrt(11.0))]
+
+
+def test_operator_keys_select_the_samples_it_applies_to():
+    """Test that an operator with keys leaves samples of other keys untouched."""
+    op = Scale(10.0, keys="temp.*")
+    assert op.process([("temp.a", 0.0, 1.0), ("rpm", 0.0, 1.0)]) == [("temp.a", 0.0, 10.0), ("rpm", 0.0, 1.0)]
+
+
+def test_deadband_drops_small_changes_per_key():
+    """Test that Deadband passes a sample only when it moved at least threshold from the last one passed."""
+    op = Deadband(0.5)
+    records = [("A", 0, 1.0), ("B", 0, 1.0), ("A", 1, 1.2), ("A", 2, 1.6), ("B", 1, 0.4)]
+    assert op.process(records) == [("A", 0, 1.0), ("B", 0, 1.0), ("A", 2, 1.6), ("B", 1, 0.4)]
+
+
+@pytest.mark.parametrize(
+    "agg, expected",
+    [
+        ("mean", [("A", 0.0, 2.0), ("A", 1.0, 6.0)]),
+        ("count", [("A", 0.0, 3.0), ("A", 1.0, 1.0)]),
+        ("rate", [("A", 0.0, 8.0)]),
+        ("minmax", [("A", 0.0, 0.0), ("A", 0.5, 4.0), ("A", 1.2, 6.0)]),
+    ],
+)
+def test_window_aggregates_per_tumbling_window(agg, expected):
+    """Test that Window emits one aggregate per closed window and the open one on flush."""
+    op = Window(1.0, agg)
+    out = op.process([("A", 0.0, 0.0), ("A", 0.25, 2.0), ("A", 0.5, 4.0)])
+    assert out == []
+    out += op.process([("A", 1.2, 6.0)])
+    out += op.flush()
+    assert out == expected
+
+
+def test_pipeline_flush_feeds_later_operators():
+    """Test that samples flushed by one operator still pass through the operators after it."""
+    pipeline = Pipeline(Window(1.0, "sum"), Scale(10.0))
+    assert pipeline.process([("A", 0.0, 1.0), ("A", 0.5, 2.0)]) == []
+    assert pipeline.flush() == [("A", 0.0, 30.0)]
+
+
+def test_pipeline_pickles_and_rejects_non_operators():
+    """Test that pipelines of operators pickle with their settings and that other objects are refused."""
+    copy = pickle.loads(pickle.dumps(Pipeline(Window(2.0, "max", keys=["A"]), Filter(high=1.0))))
+    assert copy.operators[0].seconds == 2.0 and copy.operators[0].keys.keys == {"A"}
+    with pytest.raises(TypeError):
+        Pipeline(object())
+    assert sample_record({"key": "A", "time": "1", "value": 2}) == ("A", 1.0, 2.0)
+    assert sample_record({"event": "start"}) is None
+
+
+def test_set_pipeline_requires_picklable_operators_outside_inline_mode(make_stream):
+    """Test that a lambda is refused for worker processes but allowed inline."""
+    with pytest.raises(TypeError):
+        make_stream(worker_mode="process").set_pipeline("g", Map(lambda v: v + 1))
+    make_stream(worker_mode="inline").set_pipeline("g", Map(lambda v: v + 1))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("worker_mode", ["inline", "process"])
+async def test_handlers_receive_pipeline_output(make_stream, worker_mode):
+    """Test that a group's handler gets the windowed means computed in its worker."""
+    async with LocalBroker() as broker:
+        stream = make_stream(broker, worker_mode=worker_mode)
+        stream.set_pipeline("g", Scale(2.0), Window(1.0, "mean"))
+        received = []
+
+        @stream.on_consume("g", dispatch="inline")
+        async def handler(msg):
+            payload = msg["payload"]
+            received.append((payload["time"], payload["value"]))
+
+        await stream.start(broker.token)
+        try:
+            for _ in range(200):
+                if broker.stats()["consumers"].get("user/s/g"):
+                    break
+                await asyncio.sleep(0.05)
+            await stream.aproduce_many({"A": ([0.0, 0.5, 1.0, 1.5, 2.0], [1.0, 3.0, 5.0, 7.0, 9.0])})
+            for _ in range(200):
+                if len(received) >= 2:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await stream.stop()
+        assert received[:2] == [(0.0, 4.0), (1.0, 12.0)]
+
+
+async def serve_text_frames(monkeypatch, frames):
+    """Run a WebSocket server that sends ``frames`` as JSON text frames to every consumer."""
+
+    async def ws_handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for frame in frames:
+            await ws.send_str(json.dumps(frame))
+        await ws.receive()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws", ws_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(consume_worker, "build_url", lambda *args: f"ws://127.0.0.1:{port}/ws")
+    return runner
+
+
+@pytest.mark.asyncio
+async def test_pipeline_output_keeps_other_payload_fields(monkeypatch):
+    """Test that fields of a sample besides key, time and value reach the pipeline output of its key."""
+    runner = await serve_text_frames(
+        monkeypatch,
+        [{"key": "A", "time": 1.0, "value": 2.0, "unit": "V"}, {"key": "B", "time": 1.0, "value": 3.0}],
+    )
+    q = queue.Queue()
+    stop = threading.Event()
+    pipeline = Pipeline(Scale(10.0))
+    task = asyncio.create_task(consume_worker.consume("u", "s", "g", "t", q, stop, chunk_size=1, pipeline=pipeline))
+    try:
+        first = await asyncio.to_thread(q.get, True, 5)
+        second = await asyncio.to_thread(q.get, True, 5)
+        assert first == {"type": "message", "payload": {"key": "A", "time": 1.0, "value": 20.0, "unit": "V"}}
+        assert second == {"records": [("B", 1.0, 30.0)]}
+    finally:
+        stop.set()
+        await asyncio.wait_for(task, 5)
+        await runner.cleanup()
+
+
+class GatedQueue(queue.Queue):
+    """Queue whose first put waits until ``gate`` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.waiting = threading.Event()
+
+    def put(self, item, block=True, timeout=None):
+        if not self.waiting.is_set():
+            self.waiting.set()
+            self.gate.wait(5)
+        super().put(item, block, timeout)
+
+
+@pytest.mark.asyncio
+async def test_consumer_cancelled_during_a_put_still_flushes_its_pipeline(monkeypatch):
+    """Test that what a pipeline holds is put on the queue even when the consumer is cancelled outside receive."""
+    runner = await serve_text_frames(monkeypatch, [{"key": "A", "time": 0.0, "value": 4.0}, {"type": "note"}])
+    q = GatedQueue()
+    stop = threading.Event()
+    pipeline = Pipeline(Window(10.0, "max"))
+    task = asyncio.create_task(consume_worker.consume("u", "s", "g", "t", q, stop, chunk_size=1, pipeline=pipeline))
+    try:
+        assert await asyncio.to_thread(q.waiting.wait, 5)
+        task.cancel()
+        q.gate.set()
+        await asyncio.gather(task, return_exceptions=True)
+        assert q.get(timeout=2) == {"type": "message", "payload": {"type": "note"}}
+        assert q.get(timeout=2) == {"records": [("A", 0.0, 4.0)]}
+    finally:
+        stop.set()
+        await runner.cleanup()
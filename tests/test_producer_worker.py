@@ -0,0 +1,120 @@
+# tests/test_producer_worker.py
+import json
+import queue
+from array import array
+from collections import deque
+import pytest
+from unittest.mock import AsyncMock
+
+from plotune_sdk.src.workers.common import STOP_MESSAGE
+from plotune_sdk.src.workers.counters import producer_counters, summarize_producer
+from plotune_sdk.src.workers.producer_worker import (
+    drain_batch,
+    expand_item,
+    frame_from_queue,
+    stop_requested,
+    _send_batches,
+)
+
+
+class OneShotEvent:
+    """Stop event that reports set after a number of checks."""
+
+    def __init__(self, checks: int):
+        self.checks = checks
+
+    def is_set(self):
+        self.checks -= 1
+        return self.checks < 0
+
+
+def test_drain_batch_respects_max_size():
+    """Test that a batch never exceeds the configured size."""
+    q = queue.Queue()
+    for i in range(10):
+        q.put({"key": "A", "time": i, "value": i * 2})
+
+    batch = drain_batch(q, max_size=4, linger=0.0, first_timeout=0.1)
+    assert [m["time"] for m in batch] == [0, 1, 2, 3]
+    assert q.qsize() == 6
+
+
+def test_drain_batch_ends_at_stop_message():
+    """Test that a batch stops at the stop message and leaves it at the head of pending."""
+    q = queue.Queue()
+    q.put({"columns": [("A", array("d", [1, 2, 3]), array("d", [4, 5, 6]))]})
+    q.put(dict(STOP_MESSAGE))
+    pending = deque()
+
+    batch = drain_batch(q, max_size=2, linger=0.5, first_timeout=0.1, pending=pending)
+    assert [m["time"] for m in batch] == [1, 2]
+    assert not stop_requested(pending)
+
+    batch = drain_batch(q, max_size=10, linger=0.5, first_timeout=0.1, pending=pending)
+    assert [m["time"] for m in batch] == [3]
+    assert stop_requested(pending)
+    assert drain_batch(q, max_size=10, linger=0.5, first_timeout=0.1, pending=pending) == []
+
+
+def test_frame_from_queue_sends_blocks_as_arrays():
+    """Test that without batching a sample goes alone and a column block goes as array frames."""
+    q = queue.Queue()
+    q.put({"key": "A", "time": 0, "value": 1})
+    q.put({"columns": [("B", array("d", range(5)), array("d", range(5)))]})
+    q.put(dict(STOP_MESSAGE))
+    pending = deque()
+
+    assert frame_from_queue(q, pending, max_size=3) == {"key": "A", "time": 0, "value": 1}
+    assert [m["time"] for m in frame_from_queue(q, pending, max_size=3)] == [0, 1, 2]
+    assert [m["time"] for m in frame_from_queue(q, pending, max_size=3)] == [3, 4]
+    assert frame_from_queue(q, pending, max_size=3) is None
+    assert stop_requested(pending)
+
+
+def test_drain_batch_empty_queue_returns_nothing():
+    """Test that an idle queue yields an empty batch after the first timeout."""
+    assert drain_batch(queue.Queue(), max_size=4, linger=0.0, first_timeout=0.01) == []
+
+
+@pytest.mark.asyncio
+async def test_send_batches_one_frame_per_batch():
+    """Test that batching mode sends samples as one JSON array and records counters."""
+    q = queue.Queue()
+    for i in range(5):
+        q.put({"key": "A", "time": i, "value": i})
+
+    ws = AsyncMock()
+    counters = producer_counters()
+    await _send_batches(ws, q, OneShotEvent(1), 0.01, 100, 0.0, counters, deque())
+
+    ws.send_str.assert_awaited_once()
+    frame = json.loads(ws.send_str.await_args.args[0])
+    assert len(frame) == 5
+    assert frame[0] == {"key": "A", "time": 0, "value": 0}
+
+    summary = summarize_producer(counters.snapshot())
+    assert summary["batches"] == 1
+    assert summary["samples"] == 5
+    assert summary["avg_batch_size"] == 5
+
+
+def test_drain_batch_splits_column_blocks():
+    """Test that a column block larger than the batch is carried over in pending."""
+    q = queue.Queue()
+    q.put({"columns": [("A", array("d", range(6)), array("d", range(6)))]})
+    pending = deque()
+
+    first = drain_batch(q, max_size=4, linger=0.0, first_timeout=0.1, pending=pending)
+    second = drain_batch(q, max_size=4, linger=0.0, first_timeout=0.01, pending=pending)
+    assert [m["time"] for m in first] == [0, 1, 2, 3]
+    assert [m["time"] for m in second] == [4, 5]
+
+
+def test_expand_item_multiple_keys():
+    """Test expanding a column block that carries several keys."""
+    item = {"columns": [("A", [1.0], [10.0]), ("B", [2.0, 3.0], [20.0, 30.0])]}
+    assert expand_item(item) == [
+        {"key": "A", "time": 1.0, "value": 10.0},
+        {"key": "B", "time": 2.0, "value": 20.0},
+        {"key": "B", "time": 3.0, "value": 30.0},
+    ]
@@ -0,0 +1,165 @@
+# tests/test_reducers.py
+import asyncio
+import math
+import time
+from array import array
+from multiprocessing import Queue
+
+import pytest
+
+from plotune_sdk.src.reducers import LTTB, Decimate, MinMax, ReductionStage, lttb_indices
+
+
+def cols(times, values=None):
+    return array("d", times), array("d", values if values is not None else times)
+
+
+def test_decimate_keeps_phase_across_pushes():
+    """Test that decimation keeps every n-th sample regardless of how input is split."""
+    d = Decimate(3)
+    out = []
+    for chunk in ([0, 1, 2, 3], [4], [5, 6, 7, 8, 9]):
+        out.extend(d.push(*cols(chunk))[0])
+    assert out == [0, 3, 6, 9]
+
+
+def test_minmax_emits_extremes_per_bucket_in_time_order():
+    """Test that min/max keeps both extremes of each bucket and emits closed buckets only."""
+    m = MinMax(bucket=1.0)
+    times, values = m.push(*cols([0.0, 0.2, 0.5, 0.9, 1.1], [5, 9, -1, 3, 7]))
+    assert list(zip(times, values)) == [(0.2, 9.0), (0.5, -1.0)]
+    times, values = m.flush()
+    assert list(zip(times, values)) == [(1.1, 7.0)]
+
+
+def test_lttb_keeps_peaks_and_ends():
+    """Test that LTTB keeps the first, last and spike samples of a window."""
+    values = [0.0] * 100
+    values[37] = 50.0
+    idx = list(lttb_indices(list(range(100)), values, 10))
+    assert len(idx) == 10
+    assert idx[0] == 0 and idx[-1] == 99
+    assert 37 in idx
+
+    lttb = LTTB(ratio=10, window=100)
+    times, _ = lttb.push(*cols(range(250)))
+    assert len(times) == 20
+    assert len(lttb.flush()[0]) == 5
+
+
+def test_stage_uses_key_reducer_over_default():
+    """Test that per-key reducers override the stream default and other keys pass through."""
+    stage = ReductionStage()
+    stage.configure("decimate", factor=2)
+    stage.configure("decimate", key="fast", factor=5)
+    out = stage.apply({"fast": cols(range(10)), "slow": cols(range(4))})
+    assert list(out["fast"][0]) == [0, 5]
+    assert list(out["slow"][0]) == [0, 2]
+
+    stage.configure(None)
+    assert stage.apply({"other": cols([1.0])})["other"][0].tolist() == [1.0]
+    with pytest.raises(ValueError):
+        stage.configure("median")
+
+
+@pytest.mark.asyncio
+async def test_stream_reduces_before_producer_queue(make_stream):
+    """Test that produced samples are reduced before they are queued for the producer."""
+    stream = make_stream()
+    stream.producer_enabled = True
+    stream.producer_queue = Queue()
+    stream.set_reducer("minmax", bucket=10.0)
+
+    await stream.aproduce_many({"A": (list(range(25)), [math.sin(t) for t in range(25)])})
+    block = stream.producer_queue.get(timeout=1)
+    key, times, values = block["columns"][0]
+    assert key == "A" and len(times) == 4
+    assert stream.stats()["reduction"]["samples_in"] == 25
+
+    for t in range(3):
+        await stream.aproduce("B", 100.0 + t, float(t))
+    assert stream.producer_queue.empty()
+
+
+def test_reconfigure_returns_what_replaced_reducers_held():
+    """Test that replacing reducers hands back their held samples instead of discarding them."""
+    stage = ReductionStage()
+    stage.configure("minmax", bucket=10.0)
+    stage.apply({"A": cols([0.0, 1.0, 2.0], [5.0, 9.0, 1.0]), "B": cols([0.0], [3.0])})
+
+    held = stage.configure("minmax", key="A", bucket=1.0)
+    assert list(held) == ["A"]
+    assert list(zip(*held["A"])) == [(1.0, 9.0), (2.0, 1.0)]
+
+    held = stage.configure("decimate", factor=2)
+    assert list(held) == ["B"]
+    assert stage.configure(None) == {}
+
+
+@pytest.mark.asyncio
+async def test_set_reducer_queues_held_samples(make_stream):
+    """Test that set_reducer queues what the replaced reducer held for the producer."""
+    stream = make_stream()
+    stream.producer_enabled = True
+    stream.producer_queue = Queue()
+    stream.set_reducer("minmax", bucket=10.0)
+    await stream.aproduce_many({"A": ([0.0, 1.0, 2.0], [5.0, 9.0, 1.0])})
+    assert stream.producer_queue.empty()
+
+    stream.set_reducer(None)
+    await asyncio.gather(*stream._held_puts)
+    key, times, values = stream.producer_queue.get(timeout=1)["columns"][0]
+    assert key == "A" and list(zip(times, values)) == [(1.0, 9.0), (2.0, 1.0)]
+
+
+def test_stage_flushes_samples_held_past_max_latency():
+    """Test that held samples are flushed once older than max_latency, on apply or by flush_expired."""
+    stage = ReductionStage()
+    stage.configure("minmax", bucket=100.0, max_latency=0.05)
+    assert stage.apply({"A": cols([0.0, 1.0], [5.0, 9.0]), "B": cols([0.0], [3.0])}) == {}
+    assert stage.flush_interval() == 0.025
+    assert stage.flush_expired() == {}
+
+    time.sleep(0.06)
+    out = stage.apply({"A": cols([2.0], [1.0])})
+    # A's bucket, now with the new sample in it
+    assert list(zip(*out["A"])) == [(1.0, 9.0), (2.0, 1.0)]
+    # B received nothing, its bucket is flushed by age alone
+    assert list(zip(*out["B"])) == [(0.0, 3.0)]
+
+    stage.configure("minmax", bucket=100.0, max_latency=None)
+    stage.apply({"A": cols([0.0], [5.0])})
+    time.sleep(0.06)
+    assert stage.flush_interval() is None
+    assert stage.flush_expired() == {}
+    with pytest.raises(ValueError):
+        stage.configure("minmax", bucket=1.0, max_latency=0)
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_held_samples_after_max_latency(make_stream):
+    """Test that samples a reducer holds reach the producer queue within max_latency without further input."""
+    stream = make_stream()
+    stream.producer_enabled = True
+    stream.producer_queue = Queue()
+    stream.set_reducer("lttb", ratio=10, window=1000, max_latency=0.1)
+
+    await stream.aproduce_many({"A": (list(range(50)), [float(t) for t in range(50)])})
+    assert stream.producer_queue.empty()
+    block = await asyncio.to_thread(stream.producer_queue.get, True, 2)
+    key, times, values = block["columns"][0]
+    assert key == "A" and times[0] == 0.0 and times[-1] == 49.0
+    stream._reduction_task.cancel()
+    await asyncio.gather(stream._reduction_task, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_non_numeric_samples_bypass_reducers(make_stream):
+    """Test that aproduce sends a non-numeric value unreduced instead of failing in the reducer."""
+    stream = make_stream()
+    stream.producer_enabled = True
+    stream.producer_queue = Queue()
+    stream.set_reducer("minmax", bucket=10.0)
+
+    await stream.aproduce("state", 1.0, "running")
+    assert stream.producer_queue.get(timeout=1) == {"key": "state", "time": 1.0, "value": "running"}
@@ -0,0 +1,187 @@
+# tests/test_shm_ring.py
+import sys
+import threading
+import time
+
+import pytest
+from multiprocessing import Process
+from queue import Empty, Full
+
+from plotune_sdk.src.workers import bootstrap
+from plotune_sdk.src.workers.common import STOP_MESSAGE, is_stop
+from plotune_sdk.src.workers.shm_ring import ShmRingQueue
+
+
+def _child_writer(ring: ShmRingQueue, count: int):
+    for i in range(count):
+        ring.put({"type": "message", "payload": {"key": f"K{i % 3}", "time": i, "value": i * 0.5}})
+
+
+def _child_reader(ring: ShmRingQueue, out):
+    out.put(ring.get(timeout=5)["records"])
+
+
+@pytest.fixture
+def ring():
+    r = ShmRingQueue(capacity=64)
+    yield r
+    r.close()
+
+
+@pytest.fixture
+def spawned_ring():
+    """A ring for workers started with "spawn", which attach to the block instead of inheriting a copy."""
+    bootstrap.set_start_method("spawn")
+    r = ShmRingQueue(capacity=64)
+    yield r
+    r.close()
+    bootstrap.set_start_method(None)
+
+
+def test_roundtrip_defines_keys_once(ring):
+    """Test that records survive the ring and key names are resolved on the reader side."""
+    ring.put({"key": "Voltage", "time": 1.0, "value": 3.3})
+    ring.put({"columns": [("Current", [2.0, 3.0], [0.1, 0.2])]})
+
+    item = ring.get(timeout=0.1)
+    assert item["records"] == [("Voltage", 1.0, 3.3), ("Current", 2.0, 0.1), ("Current", 3.0, 0.2)]
+    with pytest.raises(Empty):
+        ring.get_nowait()
+
+
+def test_full_ring_raises_and_redefines_key(ring):
+    """Test that a rejected block does not leave the reader without its key definition."""
+    ring.put({"columns": [("A", range(60), range(60))]})
+    with pytest.raises(Full):
+        ring.put_nowait({"columns": [("LongKeyName", range(10), range(10))]})
+
+    assert len(ring.get_nowait()["records"]) == 60
+    ring.put_nowait({"key": "LongKeyName", "time": 1.0, "value": 2.0})
+    assert ring.get_nowait()["records"] == [("LongKeyName", 1.0, 2.0)]
+
+
+def test_cross_process_reader_wakes(ring):
+    """Test that a writer in another process wakes a blocked reader."""
+    p = Process(target=_child_writer, args=(ring, 40))
+    p.start()
+    received = []
+    while len(received) < 40:
+        received.extend(ring.get(timeout=5)["records"])
+    p.join(timeout=5)
+
+    assert [r[1] for r in received] == list(range(40))
+    assert received[4] == ("K1", 4.0, 2.0)
+
+
+def test_restarted_reader_resolves_keys_defined_before_it(spawned_ring):
+    """Test that a new reader on the ring resolves a key its predecessor already saw defined."""
+    ring = spawned_ring
+    ring.put({"key": "A", "time": 1.0, "value": 2.0})
+    assert ring.get(timeout=1)["records"] == [("A", 1.0, 2.0)]
+    ring.put({"key": "A", "time": 3.0, "value": 4.0})
+
+    out = bootstrap.mp_context().Queue()
+    p = bootstrap.mp_context().Process(target=_child_reader, args=(ring, out))
+    p.start()
+    try:
+        assert out.get(timeout=10) == [("A", 3.0, 4.0)]
+    finally:
+        p.join(timeout=5)
+
+
+def test_restarted_writer_reuses_key_ids(spawned_ring):
+    """Test that a new writer on the ring keeps the ids its predecessor gave to keys."""
+    ring = spawned_ring
+    for _ in range(2):
+        p = bootstrap.mp_context().Process(target=_child_writer, args=(ring, 30))
+        p.start()
+        p.join(timeout=10)
+        received = ring.get(timeout=1)["records"]
+        assert [key for key, _, _ in received] == [f"K{i % 3}" for i in range(30)]
+
+
+def test_block_larger_than_the_ring_is_written_in_parts(ring):
+    """Test that a blocking put of more records than the ring holds waits for the reader part by part."""
+    with pytest.raises(Full):
+        ring.put_nowait({"columns": [("A", range(100), range(100))]})
+    assert ring.empty()
+
+    received = []
+
+    def read():
+        while len(received) < 200:
+            received.extend(ring.get(timeout=5)["records"])
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    ring.put({"columns": [("A", range(200), range(200))]}, timeout=5)
+    reader.join(timeout=5)
+    assert [t for _, t, _ in received] == list(range(200))
+
+
+def test_full_key_table_rejects_new_keys():
+    """Test that a key that no longer fits the key table is refused while known keys keep working."""
+    ring = ShmRingQueue(capacity=8, key_bytes=16)
+    try:
+        ring.put({"key": "abcdefgh", "time": 1.0, "value": 1.0})
+        with pytest.raises(ValueError, match="full"):
+            ring.put({"key": "xy", "time": 2.0, "value": 2.0})
+        ring.put({"key": "abcdefgh", "time": 3.0, "value": 3.0})
+        assert [t for _, t, _ in ring.get_nowait()["records"]] == [1.0, 3.0]
+    finally:
+        ring.close()
+
+
+def test_stop_message_follows_queued_records(ring):
+    """Test that a reader gets the records written before the stop message, then the stop message."""
+    ring.put({"key": "A", "time": 1.0, "value": 2.0})
+    ring.put(dict(STOP_MESSAGE))
+    assert ring.get(timeout=1)["records"] == [("A", 1.0, 2.0)]
+    assert is_stop(ring.get(timeout=1))
+
+
+def test_bad_sample_does_not_leave_key_undefined(ring):
+    """Test that a non-numeric sample is rejected without assigning its new key an id."""
+    with pytest.raises(ValueError):
+        ring.put({"key": "Fresh", "time": 1.0, "value": "not a number"})
+    ring.put({"key": "Fresh", "time": 2.0, "value": 4.0})
+    assert ring.get_nowait()["records"] == [("Fresh", 2.0, 4.0)]
+
+
+def test_concurrent_writers_keep_records_intact():
+    """Test that threads writing to one ring at once neither overwrite records nor lose key definitions."""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often, so unserialized writes would interleave
+    ring = ShmRingQueue(capacity=256)
+    writers, count = 4, 2000
+
+    def write(w):
+        for i in range(count):
+            key = f"W{w}-{i % 7}"
+            if i % 2:
+                ring.put({"key": key, "time": i, "value": w}, timeout=30)
+            else:
+                ring.put_records([(key, i, w), (f"W{w}-extra", i, w)], timeout=30)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    received = []
+    deadline = time.monotonic() + 30
+    try:
+        while (any(t.is_alive() for t in threads) or not ring.empty()) and time.monotonic() < deadline:
+            try:
+                received.extend(ring.get(timeout=0.1)["records"])
+            except Empty:
+                pass
+    finally:
+        for t in threads:
+            t.join(timeout=30)
+        ring.close()
+        sys.setswitchinterval(interval)
+
+    assert len(received) == writers * count * 3 // 2
+    for w in range(writers):
+        times = [t for key, t, v in received if key.startswith(f"W{w}-") and not key.endswith("extra")]
+        assert times == list(range(count))
+        assert all(v == w for key, t, v in received if key.startswith(f"W{w}-"))
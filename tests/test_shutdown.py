@@ -0,0 +1,101 @@
+# tests/test_shutdown.py
+import asyncio
+from array import array
+
+import pytest
+
+from plotune_sdk.src.workers.operators import Window
+from plotune_sdk.testing import LocalBroker
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "worker_mode, transport",
+    [("inline", "queue"), ("process", "queue"), ("process", "shm")],
+)
+async def test_stop_sends_everything_still_queued(make_stream, worker_mode, transport):
+    """Test that stop() lets the producer send every queued sample and all workers exit without being forced."""
+    async with LocalBroker() as broker:
+        stream = make_stream(broker, worker_mode=worker_mode)
+        stream.transport = transport
+        stream.producer_batch_size = 500
+        stream.producer_interval = 0.05
+
+        @stream.on_consume("g")
+        async def handler(msg):
+            pass
+
+        await stream.start(broker.token)
+        try:
+            for block in range(10):
+                times = array("d", range(block * 500, (block + 1) * 500))
+                await stream.aproduce_many({"A": (times, times)})
+        finally:
+            await stream.stop()
+
+        for _ in range(100):
+            if broker.received >= 5000:
+                break
+            await asyncio.sleep(0.02)
+        assert broker.received == 5000
+        shutdown = stream.stats()["shutdown"]
+        assert shutdown["producer_flushed"] is True
+        assert shutdown["forced"] == []
+        assert shutdown["duration"] < stream.shutdown_timeout
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("worker_mode", ["inline", "process"])
+async def test_stop_sends_column_blocks_with_default_producer_settings(make_stream, worker_mode):
+    """Test that without batching configured, bulk-produced blocks are still sent in full before stop returns."""
+    async with LocalBroker() as broker:
+        stream = make_stream(broker, worker_mode=worker_mode)
+
+        @stream.on_consume("g")
+        async def handler(msg):
+            pass
+
+        await stream.start(broker.token)
+        try:
+            times = array("d", range(3000))
+            await stream.aproduce_many({"A": (times, times)})
+            await stream.aproduce("B", 1.0, 2.0)
+        finally:
+            await stream.stop()
+
+        for _ in range(100):
+            if broker.received >= 3001:
+                break
+            await asyncio.sleep(0.02)
+        assert broker.received == 3001
+        assert stream.stats()["shutdown"]["producer_flushed"] is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("worker_mode", ["inline", "process", "shared"])
+async def test_stop_delivers_what_consumer_pipelines_hold(make_stream, worker_mode):
+    """Test that output a consumer's pipeline flushes at stop still reaches the group's handler."""
+    async with LocalBroker() as broker:
+        stream = make_stream(broker, worker_mode=worker_mode)
+        stream.set_pipeline("g", Window(10.0, "mean"))
+        received = []
+
+        @stream.on_consume("g", dispatch="inline")
+        async def handler(msg):
+            received.append((msg["payload"]["time"], msg["payload"]["value"]))
+
+        await stream.start(broker.token)
+        try:
+            for _ in range(200):
+                if broker.stats()["consumers"].get("user/s/g"):
+                    break
+                await asyncio.sleep(0.05)
+            # the second window closes the first one, and is then held by the pipeline
+            await stream.aproduce_many({"A": ([0.0, 1.0, 10.5], [1.0, 3.0, 5.0])})
+            for _ in range(200):
+                if received:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await stream.stop()
+        assert received == [(0.0, 2.0), (10.0, 5.0)]
@@ -0,0 +1,135 @@
+# tests/test_spool.py
+import os
+import queue
+from collections import deque
+from unittest.mock import AsyncMock
+
+import pytest
+
+from plotune_sdk.src.workers.counters import producer_counters
+from plotune_sdk.src.workers.producer_worker import _send_batches, spool_queued
+from plotune_sdk.src.workers.spool import ProducerSpool
+from plotune_sdk.utils.constants import get_spool_dir
+
+
+def samples(start, n, key="A"):
+    return [{"key": key, "time": float(t), "value": t * 0.5} for t in range(start, start + n)]
+
+
+class OneShotEvent:
+    """Stop event that reports set after ``n`` checks."""
+
+    def __init__(self, n):
+        self.n = n
+
+    def is_set(self):
+        self.n -= 1
+        return self.n < 0
+
+
+def test_spool_read_ack_and_rewind(tmp_path):
+    """Test that unacknowledged samples are read again after a rewind."""
+    spool = ProducerSpool(str(tmp_path), segment_bytes=4096)
+    spool.append(samples(0, 10))
+
+    first, cursor = spool.read(4)
+    assert [s["time"] for s in first] == [0, 1, 2, 3]
+    spool.ack(cursor)
+    second, _ = spool.read(4)
+    assert [s["time"] for s in second] == [4, 5, 6, 7]
+
+    assert spool.rewind() == 6
+    again, _ = spool.read(100)
+    assert [s["time"] for s in again] == [4, 5, 6, 7, 8, 9]
+    spool.close()
+
+
+def test_spool_survives_restart_and_rotates(tmp_path):
+    """Test that a reopened spool replays unsent samples across segments and drops acked ones."""
+    spool = ProducerSpool(str(tmp_path), segment_bytes=2048)
+    spool.append(samples(0, 300))
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) > 1
+    batch, cursor = spool.read(200)
+    spool.ack(cursor)
+    spool.close()
+
+    reopened = ProducerSpool(str(tmp_path), segment_bytes=2048)
+    assert reopened.pending() == 100
+    rest, cursor = reopened.read(1000)
+    assert [s["time"] for s in rest] == [float(t) for t in range(200, 300)]
+    reopened.ack(cursor)
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) == 1
+    reopened.close()
+
+
+def test_spool_cap_drops_oldest_segment(tmp_path):
+    """Test that the size cap drops the oldest unsent segment and counts its samples."""
+    counters = producer_counters()
+    spool = ProducerSpool(str(tmp_path), segment_bytes=2048, max_bytes=4096, counters=counters)
+    spool.append(samples(0, 400))
+
+    kept, _ = spool.read(1000)
+    assert counters.get("spooled") == 400
+    assert counters.get("spool_dropped") + len(kept) == 400
+    assert kept[-1]["time"] == 399.0
+    spool.close()
+
+
+@pytest.mark.asyncio
+async def test_send_batches_acks_spool_after_send(tmp_path):
+    """Test that spooled samples are acknowledged only after their frame is sent."""
+    spool = ProducerSpool(str(tmp_path), segment_bytes=4096)
+    q = queue.Queue()
+    for s in samples(0, 5):
+        q.put(s)
+
+    failing = AsyncMock()
+    failing.send_str.side_effect = ConnectionResetError
+    with pytest.raises(ConnectionResetError):
+        await _send_batches(failing, q, OneShotEvent(1), 0.01, 100, 0.0, None, deque(), spool=spool)
+    assert spool.rewind() == 5
+
+    ws = AsyncMock()
+    await _send_batches(ws, q, OneShotEvent(1), 0.01, 2, 0.0, None, deque(), spool=spool, replay=5)
+    assert len(ws.send_str.await_args.args[0]) > 0
+    assert spool.pending() == 0
+    spool.close()
+
+
+def test_spool_queued_moves_queue_to_disk(tmp_path):
+    """Test that queued samples are written to the spool while disconnected."""
+    spool = ProducerSpool(str(tmp_path), segment_bytes=4096)
+    q = queue.Queue()
+    q.put({"columns": [("B", [1.0, 2.0], [3.0, 4.0])]})
+    spool_queued(q, spool, deque())
+    assert spool.pending() == 2
+    spool.close()
+
+
+@pytest.mark.parametrize("name", ["../escape", "a/b", "a\\b", "..", ".", ""])
+def test_spool_dir_rejects_names_that_leave_the_cache(name):
+    """Test that stream names with path separators or dot segments are refused as spool directories."""
+    with pytest.raises(ValueError):
+        get_spool_dir("ext", name)
+
+
+def test_spool_dir_is_one_segment_under_the_cache():
+    """Test that a plain stream name becomes one directory below the extension's spool directory."""
+    path = get_spool_dir("ext", "sensors-1")
+    assert os.path.basename(path) == "sensors-1"
+    assert os.path.basename(os.path.dirname(path)) == "spool"
+
+
+def test_spool_rejects_bad_records_and_keeps_the_rest(tmp_path):
+    """Test that non-numeric and oversized samples are counted as rejected without losing the rest of the batch."""
+    counters = producer_counters()
+    spool = ProducerSpool(str(tmp_path), segment_bytes=2048, counters=counters)
+    batch = samples(0, 3) + [{"key": "A", "time": 3.0, "value": "text"}, {"key": "x" * 4096, "time": 4.0, "value": 1.0}]
+    batch += samples(5, 2)
+
+    assert spool.append(batch) == 5
+    kept, _ = spool.read(100)
+    assert [s["time"] for s in kept] == [0.0, 1.0, 2.0, 5.0, 6.0]
+    assert counters.get("spooled") == 5
+    assert counters.get("spool_rejected") == 2
+    spool.close()
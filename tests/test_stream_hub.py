@@ -0,0 +1,139 @@
+# tests/test_stream_hub.py
+import queue
+import threading
+import time
+from multiprocessing import Event, Queue
+
+import pytest
+
+from plotune_sdk.src.stream_hub import OUT_QUEUE_SIZE, StreamHub
+from plotune_sdk.src.streams import PlotuneStream
+from plotune_sdk.src.workers.bounded_queue import BoundedQueue
+from plotune_sdk.src.workers.counters import producer_counters
+from plotune_sdk.src.workers.hub_worker import STATS_ROUTE, RoutedQueue, consumer_route, producer_route
+
+
+def test_routed_queue_tags_items():
+    """Test that a routed queue wraps every item with its route."""
+    q = Queue()
+    rq = RoutedQueue(q, producer_route("s"))
+    rq.put_nowait({"key": "A", "time": 1, "value": 2})
+
+    assert q.get(timeout=1) == (("produce", "s"), {"key": "A", "time": 1, "value": 2})
+
+
+def test_demux_routes_items_and_stats():
+    """Test that the hub demultiplexer feeds local queues and producer counters."""
+    hub = StreamHub(Event())
+    local = queue.Queue()
+    route = consumer_route("s", "g")
+    hub._routes[route] = local
+    counters = producer_counters()
+    hub._counters[producer_route("s")] = counters
+
+    hub.out_q.put((route, {"type": "message", "payload": {"key": "A"}}))
+    hub.out_q.put((consumer_route("s", "unknown"), {"type": "message"}))
+    hub.out_q.put((STATS_ROUTE, producer_route("s"), {"batches": 3.0, "samples": 30.0}))
+
+    thread = threading.Thread(target=hub._demux, daemon=True)
+    thread.start()
+    try:
+        assert local.get(timeout=2)["payload"]["key"] == "A"
+        deadline = time.time() + 2
+        while counters.get("batches") != 3.0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert counters.get("samples") == 30.0
+        assert local.empty()
+    finally:
+        hub._closing.set()
+        thread.join(2)
+
+
+def test_shared_mode_rejects_shm_transport(make_stream):
+    """Test that shared worker mode only accepts the queue transport."""
+    stream = make_stream(worker_mode="shared")
+    assert stream.worker_mode == "shared"
+    stream.transport = "shm"
+    with pytest.raises(ValueError):
+        stream._make_queue("g", local=True)
+
+
+def test_unknown_worker_mode():
+    """Test that an unknown worker mode is rejected."""
+    with pytest.raises(ValueError):
+        PlotuneStream(object(), "s", "user", worker_mode="threads")
+
+
+def test_demux_does_not_block_on_a_full_group():
+    """Test that a full "block" group waits in its own backlog, in order, while other groups keep receiving."""
+    hub = StreamHub(Event())
+    slow = BoundedQueue(queue.Queue(maxsize=2), capacity=2, policy="block")
+    fast = queue.Queue()
+    slow_route, fast_route = consumer_route("s", "slow"), consumer_route("s", "fast")
+    hub._routes[slow_route] = slow
+    hub._routes[fast_route] = fast
+    for i in range(4):
+        hub.out_q.put((slow_route, i))
+    for i in range(3):
+        hub.out_q.put((fast_route, i))
+
+    thread = threading.Thread(target=hub._demux, daemon=True)
+    thread.start()
+    try:
+        assert [fast.get(timeout=2) for _ in range(3)] == [0, 1, 2]
+        assert slow.counters.get("pending") == 2
+        received = []
+        deadline = time.time() + 2
+        while len(received) < 4 and time.time() < deadline:
+            try:
+                received.append(slow.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        assert received == [0, 1, 2, 3]
+        assert slow.counters.get("pending") == 0
+    finally:
+        hub._closing.set()
+        thread.join(2)
+
+
+def test_shared_mode_rejects_producer_queue_limit(make_stream):
+    """Test that limiting the producer queue is refused in shared mode, where the hub queue is shared."""
+    stream = make_stream(worker_mode="shared")
+    stream.set_queue_limit(10, "drop-newest", group="g")
+    with pytest.raises(ValueError):
+        stream.set_queue_limit(10, "drop-newest", group="@producer@")
+
+
+def test_demux_backlog_is_capped_at_the_group_queue_capacity():
+    """Test that a stuck group's backlog stops at its queue capacity and the rest waits in the bounded hub queue."""
+    hub = StreamHub(Event())
+    slow = BoundedQueue(queue.Queue(maxsize=5), capacity=5, policy="block")
+    route = consumer_route("s", "slow")
+    hub._routes[route] = slow
+    for i in range(50):
+        hub.out_q.put((route, i))
+
+    thread = threading.Thread(target=hub._demux, daemon=True)
+    thread.start()
+    try:
+        deadline = time.time() + 2
+        while slow.counters.get("pending") < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        # 5 in the group queue, 5 in its backlog, 1 held by the waiting demultiplexer
+        assert slow.counters.get("pending") == 5
+        assert hub.out_q.qsize() == 50 - 11
+        received = [slow.get(timeout=2) for _ in range(50)]
+        assert received == list(range(50))
+    finally:
+        hub._closing.set()
+        thread.join(2)
+
+
+def test_hub_output_queue_is_bounded():
+    """Test that the hub process cannot queue an unbounded amount of output for the demultiplexer."""
+    hub = StreamHub(Event())
+    for i in range(OUT_QUEUE_SIZE):
+        hub.out_q.put_nowait((consumer_route("s", "g"), i))
+    with pytest.raises(queue.Full):
+        hub.out_q.put_nowait((consumer_route("s", "g"), OUT_QUEUE_SIZE))
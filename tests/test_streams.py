@@ -2,31 +2,20 @@
 import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch
-from multiprocessing import Queue, Event as MpEvent
+from multiprocessing import Queue
 
 from plotune_sdk.src.streams import PlotuneStream
 from plotune_sdk.src.runtime import PlotuneRuntime
 
 
-class DummyRuntime:
-    """Minimal dummy runtime with a running loop and stop event."""
-
-    def __init__(self):
-        self.loop = asyncio.get_event_loop()
-        self._stop_event = MpEvent()
-
-
-@pytest.fixture
-def dummy_runtime():
-    """Provide a dummy runtime."""
-    return DummyRuntime()
-
-
 @pytest.fixture
 def plotune_stream(dummy_runtime):
     """Provide a PlotuneStream instance with dummy runtime."""
     stream = PlotuneStream(runtime=dummy_runtime, stream_name="dummy_stream")
     stream.username = "testuser"
+    # workers here are mocks and the stream is never stopped: a supervisor task
+    # would outlive the test's event loop
+    stream.supervise = False
     return stream
 
 
@@ -71,7 +60,9 @@ async def test_aproduce(plotune_stream):
 @pytest.mark.asyncio
 async def test_enable_producer_sets_queue(plotune_stream):
     """Test that enabling producer sets the queue and worker."""
-    with patch("plotune_sdk.src.streams.Process") as mock_process, patch("multiprocessing.Queue") as mock_queue:
+    with patch("plotune_sdk.src.streams.start_worker") as mock_process, patch(
+        "plotune_sdk.src.streams.make_bounded_queue"
+    ) as mock_queue:
         mock_proc_instance = mock_process.return_value
         mock_proc_instance.is_alive.return_value = True
 
@@ -80,3 +71,157 @@ async def test_enable_producer_sets_queue(plotune_stream):
         assert plotune_stream.producer_enabled is True
         assert plotune_stream.producer_queue == mock_queue.return_value
         assert plotune_stream.workers["@producer@"] == mock_proc_instance
+
+
+@pytest.mark.asyncio
+async def test_aproduce_many_puts_one_block(plotune_stream):
+    """Test that bulk produce hands all keys to the producer queue as one item."""
+    plotune_stream.producer_enabled = True
+    plotune_stream.producer_queue = AsyncMock()
+
+    await plotune_stream.aproduce_many({"A": ([1.0, 2.0], [10.0, 20.0]), "B": ([3.0], [30.0])})
+
+    plotune_stream.producer_queue.put_nowait.assert_called_once()
+    block = plotune_stream.producer_queue.put_nowait.call_args.args[0]
+    assert [(k, list(t), list(v)) for k, t, v in block["columns"]] == [
+        ("A", [1.0, 2.0], [10.0, 20.0]),
+        ("B", [3.0], [30.0]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_aproduce_array_rejects_mismatched_lengths(plotune_stream):
+    """Test that timestamps and values must have the same length."""
+    plotune_stream.producer_enabled = True
+    plotune_stream.producer_queue = AsyncMock()
+
+    with pytest.raises(ValueError):
+        await plotune_stream.aproduce_array("A", [1.0, 2.0], [10.0])
+
+
+def test_make_queue_selects_transport(plotune_stream):
+    """Test that the transport option chooses between a Queue and a shared-memory ring."""
+    from plotune_sdk.src.workers.shm_ring import ShmRingQueue
+
+    plotune_stream.transport = "shm"
+    plotune_stream.ring_capacity = 128
+    ring = plotune_stream._make_queue("group1")
+    try:
+        assert isinstance(ring.q, ShmRingQueue)
+        assert ring.q.capacity == 128
+    finally:
+        ring.close()
+
+    plotune_stream.transport = "carrier-pigeon"
+    with pytest.raises(ValueError):
+        plotune_stream._make_queue("group1")
+
+
+@pytest.mark.asyncio
+async def test_queue_reader_dispatches_burst(plotune_stream):
+    """Test that a burst queued before the reader starts is delivered and timed."""
+    received = []
+    done = asyncio.Event()
+
+    @plotune_stream.on_consume("burst")
+    async def handler(msg):
+        received.append(msg["payload"]["value"])
+        if len(received) == 50:
+            done.set()
+
+    q = Queue()
+    for i in range(50):
+        q.put({"type": "message", "payload": {"key": "A", "time": i, "value": i}})
+
+    task = asyncio.create_task(plotune_stream._queue_reader("burst", q))
+    await asyncio.wait_for(done.wait(), timeout=5)
+    task.cancel()
+    await task
+
+    assert sorted(received) == list(range(50))
+    group_stats = plotune_stream.stats()["groups"]["burst"]
+    assert group_stats["messages"] == 50
+    assert group_stats["batches"] < 50
+    assert group_stats["max_dispatch_latency"] < 0.1
+
+
+def test_queue_limits_per_group(plotune_stream):
+    """Test that a group limit overrides the stream default and shows up in stats."""
+    plotune_stream.set_queue_limit(100, "drop-newest")
+    plotune_stream.set_queue_limit(5, "keep-latest-per-key", group="slow")
+
+    fast, slow = plotune_stream._make_queue("fast"), plotune_stream._make_queue("slow")
+    assert (fast.capacity, fast.policy) == (100, "drop-newest")
+    assert (slow.capacity, slow.policy) == (5, "keep-latest-per-key")
+    assert plotune_stream.stats()["queues"]["slow"]["capacity"] == 5
+
+    with pytest.raises(ValueError):
+        plotune_stream.set_queue_limit(5, "drop-everything")
+
+
+@pytest.mark.asyncio
+async def test_on_consume_batch_receives_lists(plotune_stream):
+    """Test that a batch handler registered on a stream gets the burst in batches."""
+    batches = []
+    done = asyncio.Event()
+
+    @plotune_stream.on_consume_batch("batched", max_size=10, max_wait=0.01)
+    async def handler(batch):
+        batches.append(len(batch))
+        if sum(batches) == 25:
+            done.set()
+
+    q = Queue()
+    for i in range(25):
+        q.put({"type": "message", "payload": {"key": "A", "time": i, "value": i}})
+
+    plotune_stream._queue_tasks["batched"] = asyncio.create_task(plotune_stream._queue_reader("batched", q))
+    await asyncio.wait_for(done.wait(), timeout=5)
+    await plotune_stream.stop()
+
+    assert max(batches) == 10
+
+
+@pytest.mark.asyncio
+async def test_inline_mode_consumes_without_worker_process(dummy_runtime, monkeypatch):
+    """Test that an inline stream runs consume() on the loop and delivers messages to handlers."""
+    from aiohttp import web
+    from plotune_sdk.src.workers import consume_worker
+
+    async def ws_handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for t in range(3):
+            await ws.send_json({"key": "A", "time": t, "value": t * 2})
+        await ws.receive()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws", ws_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(consume_worker, "build_url", lambda *args: f"ws://127.0.0.1:{port}/ws")
+
+    stream = PlotuneStream(dummy_runtime, "dummy_stream", "testuser", worker_mode="inline")
+    received = []
+    done = asyncio.Event()
+
+    @stream.on_consume("g", dispatch="inline")
+    async def handler(msg):
+        received.append(msg["payload"]["value"])
+        if len(received) == 3:
+            done.set()
+
+    try:
+        await stream.start("token")
+        await asyncio.wait_for(done.wait(), timeout=5)
+        assert received == [0, 2, 4]
+        assert not stream.workers
+        assert stream.is_running("g")
+        assert stream.stats()["groups"]["g"]["messages"] == 3
+    finally:
+        await stream.stop()
+        await runner.cleanup()
@@ -0,0 +1,75 @@
+# tests/test_supervisor.py
+import asyncio
+
+import pytest
+
+from plotune_sdk.src.supervisor import WorkerHealth
+from plotune_sdk.testing import LocalBroker
+
+
+def test_restarts_back_off_exponentially():
+    """Test that consecutive failures wait backoff, 2 * backoff, ... capped at backoff_max."""
+    health = WorkerHealth(backoff=1.0, backoff_max=4.0)
+    delays = []
+    now = 0.0
+    for _ in range(5):
+        assert health.observe(alive=False, now=now) == (health.delay() == 0)
+        delays.append(health.next_restart - now)
+        now = health.next_restart
+        assert health.observe(alive=False, now=now)
+        health.restarted(now=now)
+    assert delays == [0.0, 1.0, 2.0, 4.0, 4.0]
+    assert health.restarts == 5
+    assert health.downtime == pytest.approx(11.0)
+
+    # staying up for backoff_max seconds resets the backoff
+    assert not health.observe(alive=True, now=now + 5)
+    assert health.delay() == 0.0
+
+
+def test_stall_is_detected_from_missing_progress():
+    """Test that a live worker without progress for stall_timeout seconds is restarted."""
+    health = WorkerHealth(stall_timeout=10.0)
+    assert not health.observe(alive=True, progress=1, now=0.0)
+    assert not health.observe(alive=True, progress=2, now=8.0)
+    assert not health.observe(alive=True, progress=2, now=17.0)
+    assert health.observe(alive=True, progress=2, now=18.5)
+    assert health.stats(now=19.0)["last_reason"] == "stalled"
+    assert health.stats(now=19.0)["up"] is False
+    assert health.stalls == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_consumer_is_restarted_once_the_broker_is_up(make_stream, free_port):
+    """Test that a consumer which cannot connect is restarted with backoff and shows it in stats."""
+    stream = make_stream(f"http://127.0.0.1:{free_port}", worker_mode="inline")
+    stream.supervise_interval = 0.05
+    stream.restart_backoff = 0.05
+    stream.restart_backoff_max = 0.2
+    received = []
+
+    @stream.on_consume("g", dispatch="inline")
+    async def handler(msg):
+        received.append(msg["payload"]["value"])
+
+    await stream.start("local-stream-token")
+    await asyncio.sleep(0.5)
+    assert stream.stats()["supervisor"]["g"]["restarts"] >= 2
+
+    async with LocalBroker(port=free_port) as broker:
+        try:
+            for _ in range(100):
+                if broker.stats()["consumers"].get("user/s/g"):
+                    break
+                await asyncio.sleep(0.05)
+            await stream.aproduce("A", 1.0, 7.0)
+            for _ in range(100):
+                if received:
+                    break
+                await asyncio.sleep(0.05)
+            assert received == [7.0]
+            health = stream.stats()["supervisor"]["g"]
+            assert health["up"] is True
+            assert health["downtime"] > 0
+        finally:
+            await stream.stop()